@@ -0,0 +1,672 @@
+"""Local HTTP/JSON API for RACI matrices, for automation that runs without a browser.
+
+Uses the same import, validation and export code as the Streamlit app (raci_core)
+and the same storage: the Snowflake tables configured in .streamlit/secrets.toml,
+or Arrow files in a local directory.
+
+    python raci_api.py --port 8502
+
+    GET    /matrices                            list saved matrices
+    POST   /matrices                            create from JSON, or from a file body (?file_name=team.xlsx&name=Team)
+    GET    /matrices/<id>                       functions, stakeholders and assignments
+    PATCH  /matrices/<id>/cells                 set many cells at once
+    DELETE /matrices/<id>?version=<n>           delete (only if still at that version)
+    GET    /matrices/<id>/validate              validation errors
+    POST   /validate                            validate a matrix without saving it (optionally against posted "rules")
+    GET    /matrices/<id>/export?format=xlsx    streamed download: xlsx, csv, pptx, parquet or arrow (&native=1: editable xlsx)
+    POST   /batch                               run many create/patch/delete operations in one request
+    GET    /changes?matrix_id=&user=&since=&until=   change log, newest first (times in UTC, ISO 8601)
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from raci_core import (
+    AUDIT_QUERY_LIMIT, RACI_CODES, RACI_OPTIONS, assign_cells, audit_events_from_frames, build_raci_arrow_table,
+    compile_raci_rules, create_raci_matrix, current_run_metrics, delete_from_snowflake, diff_raci_frames,
+    encode_raci_codes, export_to_arrow, export_to_excel, export_to_parquet, export_to_powerpoint,
+    list_snowflake_matrices, load_matrix_record, parse_uploaded_file, query_audit_log, read_columnar_matrix,
+    record_audit_events, reset_run_metrics, save_to_snowflake, update_snowflake_matrix, validate_raci_matrix
+)
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+# RACI_API_STORE picks the storage: 'snowflake', 'local', or 'auto' (Snowflake when
+# credentials are configured, the local directory otherwise)
+API_STORE = os.environ.get('RACI_API_STORE', 'auto')
+API_STORE_DIR = os.environ.get('RACI_API_STORE_DIR', '.raci_api_store')
+API_TOKEN = os.environ.get('RACI_API_TOKEN', '')
+API_CACHE_ENTRIES = int(os.environ.get('RACI_API_CACHE_ENTRIES', '256'))
+API_CACHE_TTL_SECONDS = float(os.environ.get('RACI_API_CACHE_TTL', '30'))
+API_EXPORT_CACHE_ENTRIES = int(os.environ.get('RACI_API_EXPORT_CACHE_ENTRIES', '16'))
+API_BATCH_WORKERS = int(os.environ.get('RACI_API_BATCH_WORKERS', '8'))
+API_MAX_BODY_BYTES = int(os.environ.get('RACI_API_MAX_BODY_MB', '50')) * 1024 * 1024
+
+EXPORT_CHUNK_BYTES = 64 * 1024
+EXPORT_CSV_CHUNK_ROWS = 2000
+EXPORT_FORMATS = {
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', lambda df, name: export_to_excel(df)),
+    'pptx': ('application/vnd.openxmlformats-officedocument.presentationml.presentation', lambda df, name: export_to_powerpoint(df)),
+    'parquet': ('application/vnd.apache.parquet', lambda df, name: export_to_parquet(df, name)),
+    'arrow': ('application/vnd.apache.arrow.file', lambda df, name: export_to_arrow(df, name)),
+    'csv': ('text/csv', None),
+}
+MATRIX_ID_PATTERN = re.compile(r'^[A-Za-z0-9-]{1,64}$')
+
+api_logger = logging.getLogger('raci_api')
+
+# ============================================================================
+# Storage and Cache
+# ============================================================================
+
+# Records are dicts with matrix_id, matrix_name, functions, stakeholders,
+# raci_data (DataFrame), version and updated_by. Writes are compare-and-swap on
+# version in both stores, so concurrent clients (or the app) never overwrite each other.
+_store_lock = threading.Lock()
+_cache_lock = threading.Lock()
+_record_cache = OrderedDict()
+_export_cache = OrderedDict()
+_use_snowflake = None
+
+def use_snowflake():
+    """Whether matrices are stored in Snowflake (decided once per process)"""
+    global _use_snowflake
+    if _use_snowflake is None:
+        if API_STORE in ('snowflake', 'local'):
+            _use_snowflake = API_STORE == 'snowflake'
+        else:
+            try:
+                import streamlit as st
+                _use_snowflake = 'snowflake' in st.secrets
+            except Exception:
+                _use_snowflake = False
+    return _use_snowflake
+
+def _cache_get(cache, key, ttl=None):
+    with _cache_lock:
+        entry = cache.get(key)
+        if entry is None or (ttl is not None and time.time() - entry[0] > ttl):
+            return None
+        cache.move_to_end(key)
+        return entry[1]
+
+def _cache_put(cache, key, value, max_entries):
+    with _cache_lock:
+        cache[key] = (time.time(), value)
+        cache.move_to_end(key)
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
+
+def _cache_evict(matrix_id):
+    with _cache_lock:
+        _record_cache.pop(matrix_id, None)
+        for key in [key for key in _export_cache if key[0] == matrix_id]:
+            del _export_cache[key]
+
+def _local_path(matrix_id):
+    return os.path.join(API_STORE_DIR, f"{matrix_id}.arrow")
+
+def _read_local_record(matrix_id):
+    path = _local_path(matrix_id)
+    if not os.path.exists(path):
+        return None
+    functions, stakeholders, raci_df, metadata = read_columnar_matrix(path)
+    return {
+        'matrix_id': matrix_id,
+        'matrix_name': metadata.get('raci:matrix_name', ''),
+        'functions': functions,
+        'stakeholders': stakeholders,
+        'raci_data': raci_df,
+        'version': int(metadata.get('raci:matrix_version', '1')),
+        'updated_by': metadata.get('raci:updated_by', '')
+    }
+
+def _write_local_record(record):
+    """Write a record as an Arrow IPC file (temp file + rename, so readers never see a partial file)"""
+    import pyarrow as pa
+
+    table = build_raci_arrow_table(record['raci_data'], record['matrix_name'])
+    metadata = dict(table.schema.metadata or {})
+    metadata.update({b'raci:matrix_version': str(record['version']).encode('utf-8'),
+                     b'raci:updated_by': str(record['updated_by']).encode('utf-8')})
+    table = table.replace_schema_metadata(metadata)
+    os.makedirs(API_STORE_DIR, exist_ok=True)
+    path = _local_path(record['matrix_id'])
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, path)
+
+def list_matrices():
+    """List saved matrices; returns (success, message, matrices)"""
+    if use_snowflake():
+        success, message, matrices = list_snowflake_matrices()
+        return success, message, [
+            {key: str(value) if key in ('created_at', 'updated_at') else value for key, value in matrix.items()}
+            for matrix in matrices
+        ]
+    import pyarrow as pa
+
+    matrices = []
+    if os.path.isdir(API_STORE_DIR):
+        for file_name in sorted(os.listdir(API_STORE_DIR)):
+            if not file_name.endswith('.arrow'):
+                continue
+            path = os.path.join(API_STORE_DIR, file_name)
+            try:
+                # Only the schema (with its metadata) is read, not the cells
+                with pa.memory_map(path, 'r') as mapped:
+                    metadata = {key.decode('utf-8'): value.decode('utf-8')
+                                for key, value in (pa.ipc.open_file(mapped).schema.metadata or {}).items()}
+            except (OSError, pa.ArrowInvalid):
+                continue
+            matrices.append({
+                'matrix_id': file_name[:-len('.arrow')],
+                'matrix_name': metadata.get('raci:matrix_name', ''),
+                'updated_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(os.path.getmtime(path))),
+                'version': int(metadata.get('raci:matrix_version', '1')),
+                'updated_by': metadata.get('raci:updated_by', '')
+            })
+    matrices.sort(key=lambda matrix: matrix['updated_at'], reverse=True)
+    return True, None, matrices
+
+def get_matrix(matrix_id, fresh=False):
+    """Load a matrix record, from the cache unless fresh; returns (success, message, record)"""
+    if not fresh:
+        record = _cache_get(_record_cache, matrix_id, API_CACHE_TTL_SECONDS)
+        if record is not None:
+            return True, None, record
+    if use_snowflake():
+        success, message, record = load_matrix_record(matrix_id)
+        if not success:
+            return False, message, None
+        record['raci_data'] = record['raci_data'].reindex(
+            index=record['functions'], columns=record['stakeholders']
+        ).fillna('')
+    else:
+        record = _read_local_record(matrix_id)
+        if record is None:
+            return False, "Matrix not found", None
+    _cache_put(_record_cache, matrix_id, record, API_CACHE_ENTRIES)
+    return True, None, record
+
+def create_matrix(matrix_name, raci_df, created_by):
+    """Save a new matrix at version 1; returns (success, message, record)"""
+    functions, stakeholders = [str(f) for f in raci_df.index], [str(s) for s in raci_df.columns]
+    if use_snowflake():
+        success, message, matrix_id = save_to_snowflake(matrix_name, functions, stakeholders, raci_df, created_by=created_by)
+        if not success:
+            return False, message, None
+    else:
+        matrix_id = str(uuid.uuid4())
+    record = {'matrix_id': matrix_id, 'matrix_name': matrix_name, 'functions': functions,
+              'stakeholders': stakeholders, 'raci_data': raci_df, 'version': 1, 'updated_by': created_by}
+    if not use_snowflake():
+        with _store_lock:
+            _write_local_record(record)
+    _cache_put(_record_cache, matrix_id, record, API_CACHE_ENTRIES)
+    return True, f"Created '{matrix_name}'", record
+
+def replace_matrix(record, raci_df, updated_by):
+    """Save raci_df over record if the stored matrix is still at record's version.
+
+    Returns (success, message, new_record, conflict).
+    """
+    new_record = dict(record, raci_data=raci_df, version=record['version'] + 1, updated_by=updated_by)
+    if use_snowflake():
+        success, message, _, conflict = update_snowflake_matrix(
+            record['matrix_id'], record['version'], record['matrix_name'],
+            record['functions'], record['stakeholders'], raci_df, updated_by=updated_by
+        )
+        if not success:
+            if conflict:
+                _cache_evict(record['matrix_id'])
+            return False, message, None, conflict
+    else:
+        with _store_lock:
+            current = _read_local_record(record['matrix_id'])
+            if current is None:
+                _cache_evict(record['matrix_id'])
+                return False, "Matrix not found", None, True
+            if current['version'] != record['version']:
+                _cache_evict(record['matrix_id'])
+                return (False, f"This matrix was changed by {current['updated_by']} (now version {current['version']}; "
+                        f"you sent version {record['version']}).", None, True)
+            _write_local_record(new_record)
+    _cache_evict(record['matrix_id'])
+    _cache_put(_record_cache, record['matrix_id'], new_record, API_CACHE_ENTRIES)
+    return True, f"Updated '{record['matrix_name']}' (version {new_record['version']})", new_record, False
+
+def delete_matrix(matrix_id, expected_version=None):
+    """Delete a matrix (only if still at expected_version, when given); returns (success, message, conflict)"""
+    _cache_evict(matrix_id)
+    if use_snowflake():
+        success, message = delete_from_snowflake(matrix_id, expected_version)
+        return success, message, not success and expected_version is not None and 'changed by' in message
+    with _store_lock:
+        current = _read_local_record(matrix_id)
+        if current is None:
+            return False, "Matrix not found", False
+        if expected_version is not None and current['version'] != expected_version:
+            return False, f"This matrix was changed by {current['updated_by']} (now version {current['version']}).", True
+        os.remove(_local_path(matrix_id))
+    return True, "Matrix deleted successfully", False
+
+# ============================================================================
+# Operations
+# ============================================================================
+
+# Each operation returns (status, payload) so single requests and /batch share them
+
+def record_api_changes(matrix_id, matrix_name, user, events):
+    """Add an operation's changes to the shared change log (buffered, written in the background)"""
+    record_audit_events({'matrix_id': matrix_id, 'matrix_name': matrix_name, 'user_name': user,
+                         'session_id': '', 'source': 'api'}, events)
+
+def matrix_to_json(record):
+    """A record as JSON, with only the assigned cells (as role letters) listed"""
+    df = record['raci_data']
+    codes = encode_raci_codes(df)
+    assignments = {}
+    for row_idx, col_idx in zip(*np.nonzero(codes)):
+        assignments.setdefault(str(df.index[row_idx]), {})[str(df.columns[col_idx])] = RACI_CODES[codes[row_idx, col_idx]]
+    return {
+        'matrix_id': record['matrix_id'],
+        'matrix_name': record['matrix_name'],
+        'version': record['version'],
+        'updated_by': record['updated_by'],
+        'functions': [str(f) for f in df.index],
+        'stakeholders': [str(s) for s in df.columns],
+        'assignments': assignments
+    }
+
+# Roles the API accepts: a bare letter or its exact label; '' clears a cell
+API_ROLE_VALUES = {**RACI_OPTIONS, **{label: label for label in RACI_OPTIONS.values()}}
+
+def parse_cells(df, cells):
+    """Turn [[function, stakeholder, role], ...] into {(function, stakeholder): label}.
+
+    Roles must be a letter or its label ('R' or 'R - Responsible'); '' or null clears a cell.
+    Returns (cells, unknown, invalid) where unknown lists labels missing from the matrix and
+    invalid lists cells whose role is anything else.
+    """
+    parsed, unknown, invalid = {}, [], []
+    functions, stakeholders = set(df.index), set(df.columns)
+    for cell in cells:
+        if not isinstance(cell, (list, tuple)) or len(cell) != 3:
+            raise ValueError("Each cell must be [function, stakeholder, role].")
+        function, stakeholder, role = str(cell[0]).strip(), str(cell[1]).strip(), cell[2]
+        if function not in functions or stakeholder not in stakeholders:
+            unknown.append([function, stakeholder])
+            continue
+        label = API_ROLE_VALUES.get('' if role is None else role) if role is None or isinstance(role, str) else None
+        if label is None:
+            invalid.append([function, stakeholder, role])
+            continue
+        parsed[(function, stakeholder)] = label
+    return parsed, unknown, invalid
+
+def matrix_from_json(body):
+    """Build (matrix_name, raci_df) from {"name", "functions", "stakeholders", "assignments"}"""
+    functions = [str(f).strip() for f in body.get('functions') or []]
+    stakeholders = [str(s).strip() for s in body.get('stakeholders') or []]
+    if not functions or not stakeholders:
+        raise ValueError("A matrix needs at least one function and one stakeholder.")
+    if len(set(functions)) != len(functions) or len(set(stakeholders)) != len(stakeholders):
+        raise ValueError("Function and stakeholder names must be unique.")
+    raci_df = create_raci_matrix(functions, stakeholders)
+    cells = [[function, stakeholder, role]
+             for function, roles in (body.get('assignments') or {}).items()
+             for stakeholder, role in roles.items()]
+    parsed, unknown, invalid = parse_cells(raci_df, cells)
+    if unknown:
+        raise ValueError(f"Assignments refer to unknown functions or stakeholders: {unknown[:10]}")
+    if invalid:
+        raise ValueError(f"Assignments have roles other than R, A, C, I or their labels: {invalid[:10]}")
+    return str(body.get('name') or 'Untitled matrix'), assign_cells(raci_df, parsed)
+
+def op_create(body, user):
+    try:
+        matrix_name, raci_df = matrix_from_json(body)
+    except (ValueError, AttributeError) as e:
+        return 400, {'error': str(e)}
+    success, message, record = create_matrix(matrix_name, raci_df, user)
+    if not success:
+        return 502, {'error': message}
+    record_api_changes(record['matrix_id'], matrix_name, user,
+                       [('create_matrix', '', '', '', f"{raci_df.shape[0]} x {raci_df.shape[1]}")])
+    return 201, {'matrix_id': record['matrix_id'], 'version': 1, 'message': message,
+                 'errors': validate_raci_matrix(raci_df)}
+
+def op_import(file_name, data, matrix_name, user):
+    success, message, functions, stakeholders, raci_df = parse_uploaded_file(file_name, BytesIO(data))
+    if not success:
+        return 400, {'error': message}
+    raci_df = raci_df.set_axis([str(f).strip() for f in raci_df.index], axis=0).set_axis(
+        [str(s).strip() for s in raci_df.columns], axis=1
+    )
+    name = matrix_name or os.path.splitext(os.path.basename(file_name))[0]
+    success, create_message, record = create_matrix(name, raci_df, user)
+    if not success:
+        return 502, {'error': create_message}
+    record_api_changes(record['matrix_id'], name, user,
+                       [('create_matrix', '', '', file_name, f"{raci_df.shape[0]} x {raci_df.shape[1]}")])
+    return 201, {'matrix_id': record['matrix_id'], 'version': 1, 'message': message,
+                 'errors': validate_raci_matrix(raci_df)}
+
+def op_patch(matrix_id, body, user):
+    """Apply a batch of cell edits in one versioned write.
+
+    With "version" the patch fails (409) if the matrix changed since; without it the
+    patch is applied to the latest version, retrying once if another write wins the race.
+    """
+    cells = body.get('cells')
+    if not isinstance(cells, list):
+        return 400, {'error': "Expected {\"cells\": [[function, stakeholder, role], ...]}."}
+    expected_version = body.get('version')
+    for attempt in range(1 if expected_version is not None else 2):
+        success, message, record = get_matrix(matrix_id, fresh=attempt > 0)
+        if not success:
+            return (404 if message == "Matrix not found" else 502), {'error': message}
+        if expected_version is not None and record['version'] != int(expected_version):
+            # The cached copy may simply be older than the client's
+            success, message, record = get_matrix(matrix_id, fresh=True)
+            if not success:
+                return (404 if message == "Matrix not found" else 502), {'error': message}
+            if record['version'] != int(expected_version):
+                return 409, {'error': f"Matrix is at version {record['version']}, not {expected_version}.",
+                             'version': record['version']}
+        try:
+            parsed, unknown, invalid = parse_cells(record['raci_data'], cells)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        if unknown:
+            return 422, {'error': "Cells refer to unknown functions or stakeholders.", 'unknown': unknown[:100]}
+        if invalid:
+            return 422, {'error': "Cells have roles other than R, A, C, I or their labels.", 'invalid': invalid[:100]}
+        new_df = assign_cells(record['raci_data'], parsed)
+        changed_mask = diff_raci_frames(record['raci_data'], new_df)
+        changed_cells = int(changed_mask.sum()) if changed_mask is not None else len(parsed)
+        if changed_cells == 0:
+            return 200, {'matrix_id': matrix_id, 'version': record['version'], 'changed_cells': 0,
+                         'errors': validate_raci_matrix(new_df)}
+        success, message, new_record, conflict = replace_matrix(record, new_df, user)
+        if success:
+            record_api_changes(matrix_id, record['matrix_name'], user,
+                               audit_events_from_frames(record['raci_data'], new_df, changed_mask))
+            return 200, {'matrix_id': matrix_id, 'version': new_record['version'], 'changed_cells': changed_cells,
+                         'errors': validate_raci_matrix(new_df)}
+        if not conflict:
+            return 502, {'error': message}
+    return 409, {'error': message}
+
+def op_delete(matrix_id, expected_version, user):
+    success, message, conflict = delete_matrix(matrix_id, expected_version)
+    if success:
+        record_api_changes(matrix_id, '', user, [('delete_matrix', '', '', '', '')])
+        return 200, {'matrix_id': matrix_id, 'message': message}
+    if conflict:
+        return 409, {'error': message}
+    return (404 if message == "Matrix not found" else 502), {'error': message}
+
+def op_batch(body, user):
+    """Run {"operations": [{"op": "create" | "patch" | "delete", ...}, ...]}.
+
+    Operations on the same matrix run one after another in request order, so they don't
+    race each other into version conflicts; different matrices run concurrently. Each
+    operation succeeds or fails on its own; results keep the request's order.
+    """
+    operations = body.get('operations')
+    if not isinstance(operations, list):
+        return 400, {'error': "Expected {\"operations\": [...]}."}
+
+    def run(operation):
+        reset_run_metrics()
+        if not isinstance(operation, dict):
+            return 400, {'error': "Each operation must be an object."}
+        kind = operation.get('op', 'patch')
+        matrix_id = str(operation.get('matrix_id', ''))
+        if kind == 'create':
+            return op_create(operation, user)
+        if not MATRIX_ID_PATTERN.match(matrix_id):
+            return 400, {'error': "Invalid or missing matrix_id."}
+        if kind == 'patch':
+            return op_patch(matrix_id, operation, user)
+        if kind == 'delete':
+            return op_delete(matrix_id, operation.get('version'), user)
+        return 400, {'error': f"Unknown op '{kind}'."}
+
+    groups = {}
+    for position, operation in enumerate(operations):
+        matrix_id = operation.get('matrix_id') if isinstance(operation, dict) and operation.get('op') != 'create' else None
+        groups.setdefault(str(matrix_id) if matrix_id is not None else position, []).append(position)
+
+    def run_group(positions):
+        return [(position, run(operations[position])) for position in positions]
+
+    results = [None] * len(operations)
+    with ThreadPoolExecutor(max_workers=API_BATCH_WORKERS) as executor:
+        for group in executor.map(run_group, groups.values()):
+            for position, result in group:
+                results[position] = result
+    return 200, {'results': [dict(payload, status=status) for status, payload in results],
+                 'failed': sum(1 for status, _ in results if status >= 400)}
+
+def export_chunks(record, export_format, native=False):
+    """Yield an export in chunks; CSV is rendered a slice of rows at a time.
+
+    native selects the editable Excel layout (role codes, dropdown, conditional colors).
+    """
+    df = record['raci_data']
+    if export_format == 'csv':
+        for start in range(0, max(len(df.index), 1), EXPORT_CSV_CHUNK_ROWS):
+            yield df.iloc[start:start + EXPORT_CSV_CHUNK_ROWS].to_csv(header=start == 0).encode('utf-8')
+        return
+    key = (record['matrix_id'], record['version'], export_format, native)
+    data = _cache_get(_export_cache, key)
+    if data is None:
+        if native:
+            data = export_to_excel(df, native=True).getvalue()
+        else:
+            data = EXPORT_FORMATS[export_format][1](df, record['matrix_name']).getvalue()
+        _cache_put(_export_cache, key, data, API_EXPORT_CACHE_ENTRIES)
+    view = memoryview(data)
+    for start in range(0, len(view), EXPORT_CHUNK_BYTES):
+        yield view[start:start + EXPORT_CHUNK_BYTES]
+
+# ============================================================================
+# HTTP Server
+# ============================================================================
+
+class RaciApiHandler(BaseHTTPRequestHandler):
+    """Routes requests to the operations above"""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'RaciApi/1.0'
+
+    def log_message(self, format, *args):
+        api_logger.info(format % args)
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, content_type, file_name, chunks):
+        """Send chunks with chunked transfer encoding, so large exports are never buffered whole.
+
+        The first chunk is produced before the status line, so a failed export still gets a JSON error.
+        """
+        chunks = iter(chunks)
+        first_chunk = next(chunks, b'')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Disposition', f'attachment; filename="{file_name}"')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.stream_started = True
+        for chunk in itertools.chain([first_chunk], chunks):
+            if len(chunk):
+                self.wfile.write(f"{len(chunk):X}\r\n".encode('ascii'))
+                self.wfile.write(chunk)
+                self.wfile.write(b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > API_MAX_BODY_BYTES:
+            raise ValueError(f"Request body is larger than {API_MAX_BODY_BYTES // (1024 * 1024)} MB.")
+        return self.rfile.read(length) if length else b''
+
+    def read_json(self):
+        body = json.loads(self.read_body() or b'{}')
+        if not isinstance(body, dict):
+            raise ValueError("Expected a JSON object.")
+        return body
+
+    def handle_request(self, method):
+        start = time.perf_counter()
+        reset_run_metrics()
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split('/') if part]
+        user = self.headers.get('X-Raci-User') or 'api'
+        self.stream_started = False
+        try:
+            if API_TOKEN and self.headers.get('Authorization') != f"Bearer {API_TOKEN}":
+                self.send_json(401, {'error': "Missing or invalid API token."})
+                return
+            if len(parts) > 1 and parts[0] == 'matrices' and not MATRIX_ID_PATTERN.match(parts[1]):
+                self.send_json(400, {'error': "Invalid matrix id."})
+                return
+            route = (method, tuple('<id>' if index == 1 and parts[0] == 'matrices' else part for index, part in enumerate(parts)))
+
+            if route == ('GET', ('matrices',)):
+                success, message, matrices = list_matrices()
+                self.send_json(200 if success else 502, {'matrices': matrices} if success else {'error': message})
+            elif route == ('POST', ('matrices',)):
+                if 'file_name' in query:
+                    self.send_json(*op_import(query['file_name'], self.read_body(), query.get('name', ''), user))
+                else:
+                    self.send_json(*op_create(self.read_json(), user))
+            elif route == ('GET', ('matrices', '<id>')):
+                success, message, record = get_matrix(parts[1], fresh=query.get('fresh') == '1')
+                if success:
+                    self.send_json(200, matrix_to_json(record))
+                else:
+                    self.send_json(404 if message == "Matrix not found" else 502, {'error': message})
+            elif route == ('PATCH', ('matrices', '<id>', 'cells')):
+                self.send_json(*op_patch(parts[1], self.read_json(), user))
+            elif route == ('DELETE', ('matrices', '<id>')):
+                version = int(query['version']) if 'version' in query else None
+                self.send_json(*op_delete(parts[1], version, user))
+            elif route == ('GET', ('matrices', '<id>', 'validate')):
+                success, message, record = get_matrix(parts[1])
+                if success:
+                    errors = validate_raci_matrix(record['raci_data'])
+                    self.send_json(200, {'matrix_id': parts[1], 'version': record['version'], 'valid': not errors, 'errors': errors})
+                else:
+                    self.send_json(404 if message == "Matrix not found" else 502, {'error': message})
+            elif route == ('POST', ('validate',)):
+                body = self.read_json()
+                rules = None
+                if body.get('rules') is not None:
+                    success, message, rules = compile_raci_rules(str(body['rules']))
+                    if not success:
+                        self.send_json(400, {'error': message})
+                        return
+                _, raci_df = matrix_from_json(body)
+                errors = validate_raci_matrix(raci_df, rules)
+                self.send_json(200, {'valid': not errors, 'errors': errors})
+            elif route == ('GET', ('matrices', '<id>', 'export')):
+                export_format = query.get('format', 'xlsx').lower()
+                if export_format not in EXPORT_FORMATS:
+                    self.send_json(400, {'error': f"Unknown format '{export_format}'. Use one of: {', '.join(EXPORT_FORMATS)}."})
+                    return
+                success, message, record = get_matrix(parts[1])
+                if not success:
+                    self.send_json(404 if message == "Matrix not found" else 502, {'error': message})
+                    return
+                file_name = re.sub(r'[^A-Za-z0-9_. -]', '_', record['matrix_name'] or 'raci_matrix') + f".{export_format}"
+                native = export_format == 'xlsx' and query.get('native', '').lower() in ('1', 'true')
+                self.send_stream(EXPORT_FORMATS[export_format][0], file_name, export_chunks(record, export_format, native))
+            elif route == ('POST', ('batch',)):
+                self.send_json(*op_batch(self.read_json(), user))
+            elif route == ('GET', ('changes',)):
+                success, message, events = query_audit_log(
+                    matrix_id=query.get('matrix_id') or None, user=query.get('user') or None,
+                    start=datetime.fromisoformat(query['since']) if query.get('since') else None,
+                    end=datetime.fromisoformat(query['until']) if query.get('until') else None,
+                    limit=min(int(query.get('limit', AUDIT_QUERY_LIMIT)), AUDIT_QUERY_LIMIT)
+                )
+                self.send_json(200 if success else 502, {'changes': events} if success else {'error': message})
+            else:
+                self.send_json(404, {'error': f"No route for {method} {url.path}"})
+        except Exception as e:
+            if self.stream_started:
+                # The status line is already out; end the connection so the client sees a truncated body
+                api_logger.exception("Export stream failed")
+                self.close_connection = True
+            elif isinstance(e, (ValueError, AttributeError)):
+                self.send_json(400, {'error': str(e)})
+            else:
+                api_logger.exception("Request failed")
+                self.send_json(500, {'error': f"Error handling request: {str(e)}"})
+        finally:
+            api_logger.debug(json.dumps({'method': method, 'path': url.path,
+                                         'seconds': round(time.perf_counter() - start, 6),
+                                         'counters': current_run_metrics()['counters']}))
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+def make_server(host='127.0.0.1', port=8502):
+    """A threaded API server (one thread per connection); call serve_forever() on it"""
+    return ThreadingHTTPServer((host, port), RaciApiHandler)
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON API for RACI matrices")
+    parser.add_argument('--host', default=os.environ.get('RACI_API_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('RACI_API_PORT', '8502')))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(message)s')
+
+    server = make_server(args.host, args.port)
+    api_logger.info(f"Serving RACI API on http://{args.host}:{args.port} "
+                    f"(storage: {'Snowflake' if use_snowflake() else os.path.abspath(API_STORE_DIR)})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,26 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from io import BytesIO
-from pptx import Presentation
-from pptx.util import Inches, Pt
-from pptx.enum.text import PP_ALIGN
-from pptx.dml.color import RGBColor
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
+# Matrix model, import/export, analytics, collaboration and storage live in raci_core
+# so they can also be used without the UI (see raci_api.py)
+from raci_core import (
+    AUDIT_COLUMNS, COLLAB_POLL_SECONDS, FUNCTION_GROUP_SEPARATOR, MERGE_RULES, PERF_PANEL_ENABLED, RACI_COLORS,
+    RACI_LABELS, RACI_OPTIONS, RULE_MAX_DISPLAYED, apply_grid_edits, autosave_session_snapshot,
+    backfill_matrix_index, begin_rerun_metrics, build_grid_args, bulk_assign_role, cached_matrix_export,
+    cached_parse_upload, cached_parse_workbook, cached_workbook_export, check_session_rules, clear_assignments,
+    collab_has_updates, commit_raci_edits, compact_saved_matrices, compile_raci_rules, compute_raci_analytics,
+    copy_row_assignments, current_audit_user, default_rules_text, delete_from_snowflake, diff_raci_frames,
+    find_name_merge_suggestions, finish_rerun_metrics, function_group, function_path, get_grid_component,
+    get_group_rollups, get_name_index, get_raci_codes, get_template_library, group_member_rows, group_rollup_frame,
+    import_from_spreadsheet, instantiate_template, join_collab_room, leave_collab_room, list_snowflake_matrices,
+    load_from_snowflake, load_matrices_from_snowflake, merge_matrices, merge_names, merge_view_edits,
+    new_name_warning, query_audit_log, raci_cell_styles, render_import_report, render_name_manager,
+    render_performance_panel, restore_session_snapshot, save_matrix_as_template, save_to_snowflake,
+    search_matrix_index, session_audit_context, session_function_errors, store_active_sheet, switch_active_sheet,
+    sync_collab_room, sync_matrix_structure, timed_stage, update_snowflake_matrix, upload_digest,
+    workbook_sheet_digests
+)
 
 # Initialize session state
 if 'raci_data' not in st.session_state:
@@ -27,754 +40,17 @@ if 'refocus_stakeholder' not in st.session_state:
 if 'last_raci_data_hash' not in st.session_state:
     st.session_state.last_raci_data_hash = None
 
-# RACI options - keys are what get stored, values are what display in dropdown
-RACI_OPTIONS = {
-    '': '',
-    'R': 'R - Responsible',
-    'A': 'A - Accountable',
-    'C': 'C - Consulted',
-    'I': 'I - Informed'
-}
-
-# RACI labels for display (maps letter to full label)
-RACI_LABELS = {
-    'R': 'R - Responsible',
-    'A': 'A - Accountable',
-    'C': 'C - Consulted',
-    'I': 'I - Informed'
-}
-
-# Color scheme for RACI
-RACI_COLORS = {
-    'R': '#FFE5B4',  # Light orange
-    'A': '#FFB6C1',  # Light pink
-    'C': '#B0E0E6',  # Powder blue
-    'I': '#E0E0E0'   # Light gray
-}
-
-def create_raci_matrix(functions, stakeholders):
-    """Create an empty RACI matrix DataFrame"""
-    if not functions or not stakeholders:
-        return pd.DataFrame()
-    
-    # Create matrix with functions as rows and stakeholders as columns
-    matrix = pd.DataFrame(
-        index=functions,
-        columns=stakeholders,
-        data=''
-    )
-    return matrix
-
-def validate_raci_row(row_data):
-    """Validate that a row has at most one 'A' (Accountable) role"""
-    accountable_count = sum(1 for val in row_data if str(val).strip() == 'A')
-    return accountable_count <= 1
-
-def validate_raci_matrix(df):
-    """Validate the entire RACI matrix for correctness"""
-    errors = []
-    for function in df.index:
-        row_data = df.loc[function].values
-        # Extract letter from value (could be 'A' or 'A - Accountable')
-        accountable_count = 0
-        for val in row_data:
-            val_str = str(val).strip()
-            # Check if it starts with 'A' (could be 'A' or 'A - Accountable')
-            if val_str and (val_str == 'A' or val_str.startswith('A -')):
-                accountable_count += 1
-        if accountable_count > 1:
-            errors.append(f"Function '{function}' has {accountable_count} Accountable stakeholders. Only 1 is allowed.")
-    return errors
-
-def parse_raci_value(value):
-    """Parse RACI value from imported file - handles both formats"""
-    if pd.isna(value) or value == '':
-        return ''
-    
-    val_str = str(value).strip().upper()
-    
-    # If it's just a single letter, return it
-    if len(val_str) == 1 and val_str in ['R', 'A', 'C', 'I']:
-        return RACI_LABELS.get(val_str, val_str)
-    
-    # If it starts with a RACI letter, extract it
-    if val_str and val_str[0] in ['R', 'A', 'C', 'I']:
-        letter = val_str[0]
-        return RACI_LABELS.get(letter, letter)
-    
-    # Try to match full labels
-    val_lower = val_str.lower()
-    if 'responsible' in val_lower:
-        return RACI_LABELS['R']
-    elif 'accountable' in val_lower:
-        return RACI_LABELS['A']
-    elif 'consulted' in val_lower:
-        return RACI_LABELS['C']
-    elif 'informed' in val_lower:
-        return RACI_LABELS['I']
-    
-    return ''
-
-def import_from_spreadsheet(uploaded_file):
-    """Import RACI matrix from Excel or CSV file"""
-    try:
-        # Reset file pointer to beginning
-        uploaded_file.seek(0)
-        
-        # Determine file type and read accordingly
-        if uploaded_file.name.endswith('.csv'):
-            df = pd.read_csv(uploaded_file, index_col=0)
-        elif uploaded_file.name.endswith(('.xlsx', '.xls')):
-            # Try to read the first sheet
-            uploaded_file.seek(0)  # Reset again for Excel
-            df = pd.read_excel(uploaded_file, index_col=0, sheet_name=0)
-        else:
-            return False, "Unsupported file format. Please use Excel (.xlsx, .xls) or CSV (.csv) files."
-        
-        # Check if DataFrame is empty
-        if df.empty:
-            return False, "The uploaded file appears to be empty."
-        
-        # Drop rows where the index is NaN or empty
-        df = df[df.index.notna()]
-        df = df[df.index.astype(str).str.strip() != '']
-        
-        # Filter out legend rows and unnamed rows
-        # Legend rows typically have index starting with "Legend" or contain "=" or are in common legend formats
-        legend_patterns = ['legend', 'r =', 'a =', 'c =', 'i =', 'responsible', 'accountable', 'consulted', 'informed']
-        
-        def is_legend_row(idx):
-            """Check if a row index looks like a legend row"""
-            idx_str = str(idx).strip().lower()
-            # Check if index contains legend patterns
-            if any(pattern in idx_str for pattern in legend_patterns):
-                return True
-            # Check if index contains "=" (common in legends like "R = Responsible")
-            if '=' in idx_str:
-                return True
-            return False
-        
-        def is_unnamed_row(idx):
-            """Check if a row index is an unnamed/empty row"""
-            idx_str = str(idx).strip()
-            # Check for "Unnamed" pattern (case-insensitive) - handles "Unnamed: 3", "Unnamed: 4", etc.
-            if 'unnamed' in idx_str.lower():
-                return True
-            # Check for empty or NaN values
-            if not idx_str or idx_str.lower() in ['nan', 'none', '']:
-                return True
-            return False
-        
-        # Filter out legend rows and unnamed rows from the DataFrame
-        df_filtered = df[~df.index.map(lambda idx: is_legend_row(idx) or is_unnamed_row(idx))]
-        
-        # Also check if row has mostly empty cells or legend-like content in cells
-        # (Sometimes legend is in a row with mixed content)
-        def row_looks_like_legend(row):
-            """Check if a row looks like a legend row based on cell content"""
-            row_str = ' '.join([str(val).strip().lower() for val in row.values if pd.notna(val)])
-            # If row contains legend patterns, it's likely a legend
-            if any(pattern in row_str for pattern in ['r =', 'a =', 'c =', 'i =', 'responsible', 'accountable', 'consulted', 'informed']):
-                return True
-            return False
-        
-        def row_is_empty_or_unnamed(row, row_idx):
-            """Check if a row is mostly empty or has no meaningful data"""
-            # First check if the index itself is unnamed
-            if is_unnamed_row(row_idx):
-                return True
-            
-            # Count non-empty, non-NaN values
-            non_empty_values = [val for val in row.values if pd.notna(val) and str(val).strip() != '']
-            non_empty_count = len(non_empty_values)
-            
-            # If row has no non-empty values, it's empty
-            if non_empty_count == 0:
-                return True
-            
-            # Check if all values in the row are empty strings or NaN
-            all_empty = all(pd.isna(val) or str(val).strip() == '' for val in row.values)
-            if all_empty:
-                return True
-            
-            # Check if the row index is empty/NaN but row has some data (might be a data row)
-            # But if index is unnamed and row has minimal data, it's likely still an unwanted row
-            idx_str = str(row_idx).strip()
-            if 'unnamed' in idx_str.lower() and non_empty_count <= 1:
-                return True
-            
-            return False
-        
-        # Additional filter: remove rows that look like legends or are empty/unnamed
-        mask = ~df_filtered.apply(lambda row: row_looks_like_legend(row) or row_is_empty_or_unnamed(row, row.name), axis=1)
-        df_filtered = df_filtered[mask]
-        
-        if df_filtered.empty:
-            return False, "No valid data rows found after filtering legend. Please ensure your file contains function names in the first column."
-        
-        # Extract functions from index (first column) - now filtered
-        functions = [str(idx).strip() for idx in df_filtered.index if str(idx).strip() and str(idx).strip().lower() not in ['nan', 'none', '']]
-        
-        # Extract stakeholders from column headers - filter out blank/empty/unnamed columns
-        def is_valid_stakeholder(col):
-            """Check if a column header is a valid stakeholder name"""
-            col_str = str(col).strip()
-            # Check for empty or NaN
-            if not col_str or col_str.lower() in ['nan', 'none', '']:
-                return False
-            # Check for "Unnamed" pattern
-            if 'unnamed' in col_str.lower():
-                return False
-            return True
-        
-        # Filter columns by header name (removes blank/unnamed columns)
-        valid_cols = [col for col in df_filtered.columns if is_valid_stakeholder(col)]
-        df_filtered = df_filtered[valid_cols]
-        
-        # Also filter out columns that are completely empty (all NaN or empty values)
-        # This catches columns with valid headers but no data
-        cols_with_data = []
-        for col in df_filtered.columns:
-            col_data = df_filtered[col]
-            # Check if column has any non-empty, non-NaN values
-            has_values = any(pd.notna(val) and str(val).strip() != '' for val in col_data.values)
-            if has_values:
-                cols_with_data.append(col)
-        
-        # Use columns with data (or at least valid headers)
-        df_filtered = df_filtered[cols_with_data] if cols_with_data else df_filtered[valid_cols]
-        
-        # Extract stakeholders from remaining valid columns
-        stakeholders = [str(col).strip() for col in df_filtered.columns if is_valid_stakeholder(col)]
-        
-        if not functions:
-            return False, "No functions found in the file. Please ensure the first column contains function names."
-        
-        if not stakeholders:
-            return False, "No stakeholders found in the file. Please ensure the first row contains stakeholder names."
-        
-        # Parse RACI values - convert to full label format
-        raci_df = df_filtered.copy()
-        for col in raci_df.columns:
-            for idx in raci_df.index:
-                original_value = raci_df.loc[idx, col]
-                parsed_value = parse_raci_value(original_value)
-                raci_df.loc[idx, col] = parsed_value
-        
-        # Update session state
-        st.session_state.functions = functions
-        st.session_state.stakeholders = stakeholders
-        st.session_state.raci_data = raci_df.fillna('')
-        
-        return True, f"Successfully imported {len(functions)} functions and {len(stakeholders)} stakeholders!"
-        
-    except Exception as e:
-        return False, f"Error importing file: {str(e)}"
-
-def export_to_excel(df, filename='raci_matrix.xlsx'):
-    """Export RACI matrix to Excel with formatting"""
-    if df.empty:
-        raise ValueError("Cannot export empty matrix. Please add functions and stakeholders first.")
-    
-    output = BytesIO()
-    
-    try:
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='RACI Matrix', index=True)
-            worksheet = writer.sheets['RACI Matrix']
-            
-            # Set column widths
-            worksheet.column_dimensions['A'].width = 25
-            for col in range(2, len(df.columns) + 2):
-                worksheet.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 15
-            
-            # Style header row
-            header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-            header_font = Font(color='FFFFFF', bold=True, size=11)
-            border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
-            )
-            
-            # Format header
-            for cell in worksheet[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-                cell.border = border
-            
-            # Format index column
-            index_fill = PatternFill(start_color='D9E1F2', end_color='D9E1F2', fill_type='solid')
-            index_font = Font(bold=True, size=11)
-            
-            for row in range(2, len(df) + 2):
-                cell = worksheet[f'A{row}']
-                cell.fill = index_fill
-                cell.font = index_font
-                cell.alignment = Alignment(horizontal='left', vertical='center')
-                cell.border = border
-            
-            # Format data cells with RACI colors
-            for row_idx, row in enumerate(df.index, start=2):
-                for col_idx, col in enumerate(df.columns, start=2):
-                    cell = worksheet.cell(row=row_idx, column=col_idx)
-                    value = str(df.loc[row, col]).strip()
-                    
-                    # Extract letter and convert to label for display
-                    raci_letter = ''
-                    display_value = value
-                    if value:
-                        if value.startswith('R -') or value == 'R':
-                            raci_letter = 'R'
-                            display_value = 'R - Responsible'
-                        elif value.startswith('A -') or value == 'A':
-                            raci_letter = 'A'
-                            display_value = 'A - Accountable'
-                        elif value.startswith('C -') or value == 'C':
-                            raci_letter = 'C'
-                            display_value = 'C - Consulted'
-                        elif value.startswith('I -') or value == 'I':
-                            raci_letter = 'I'
-                            display_value = 'I - Informed'
-                        elif len(value) == 1 and value in ['R', 'A', 'C', 'I']:
-                            raci_letter = value
-                            display_value = RACI_LABELS.get(value, value)
-                        else:
-                            raci_letter = value[0] if len(value) > 0 else ''
-                            if raci_letter in RACI_LABELS:
-                                display_value = RACI_LABELS[raci_letter]
-                    
-                    cell.value = display_value
-                    
-                    if raci_letter in RACI_COLORS:
-                        hex_color = RACI_COLORS[raci_letter].replace('#', '')
-                        cell.fill = PatternFill(
-                            start_color=hex_color,
-                            end_color=hex_color,
-                            fill_type='solid'
-                        )
-                    
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                    cell.border = border
-                    cell.font = Font(size=11, bold=(raci_letter in ['R', 'A']))
-            
-            # Add legend
-            legend_row = len(df) + 3
-            worksheet.cell(row=legend_row, column=1, value='Legend:')
-            worksheet.cell(row=legend_row, column=1).font = Font(bold=True, size=11)
-            
-            legend_items = ['R = Responsible', 'A = Accountable', 'C = Consulted', 'I = Informed']
-            for idx, item in enumerate(legend_items, start=2):
-                cell = worksheet.cell(row=legend_row, column=idx, value=item)
-                cell.font = Font(size=10)
-    except Exception as e:
-        st.error(f"Error exporting to Excel: {str(e)}")
-        raise
-    
-    output.seek(0)
-    return output
-
-def export_to_powerpoint(df, filename='raci_matrix.pptx'):
-    """Export RACI matrix to PowerPoint presentation"""
-    if df.empty:
-        raise ValueError("Cannot export empty matrix. Please add functions and stakeholders first.")
-    
-    try:
-        prs = Presentation()
-        prs.slide_width = Inches(10)
-        prs.slide_height = Inches(7.5)
-        
-        # Use blank layout
-        slide = prs.slides.add_slide(prs.slide_layouts[6])
-        
-        # Add title
-        title_left = Inches(0.5)
-        title_top = Inches(0.3)
-        title_width = Inches(9)
-        title_height = Inches(0.5)
-        
-        title_box = slide.shapes.add_textbox(title_left, title_top, title_width, title_height)
-        title_frame = title_box.text_frame
-        title_frame.text = "RACI Matrix"
-        title_para = title_frame.paragraphs[0]
-        title_para.font.size = Pt(24)
-        title_para.font.bold = True
-        title_para.alignment = PP_ALIGN.CENTER
-        
-        # Calculate table dimensions
-        table_left = Inches(0.5)
-        table_top = Inches(1)
-        table_width = Inches(9)
-        table_height = Inches(5)
-        
-        # Create table
-        num_rows = len(df) + 1  # +1 for header
-        num_cols = len(df.columns) + 1  # +1 for index column
-        
-        table = slide.shapes.add_table(num_rows, num_cols, table_left, table_top, table_width, table_height).table
-        
-        # Set column widths
-        index_col_width = table_width / num_cols * 1.5
-        data_col_width = (table_width - index_col_width) / (num_cols - 1)
-        
-        # Fill header row
-        table.cell(0, 0).text = "Function"
-        table.cell(0, 0).fill.solid()
-        table.cell(0, 0).fill.fore_color.rgb = RGBColor(54, 96, 146)
-        
-        for col_idx, stakeholder in enumerate(df.columns, start=1):
-            cell = table.cell(0, col_idx)
-            cell.text = stakeholder
-            cell.fill.solid()
-            cell.fill.fore_color.rgb = RGBColor(54, 96, 146)
-        
-        # Fill data rows
-        for row_idx, function in enumerate(df.index, start=1):
-            # Index column
-            table.cell(row_idx, 0).text = function
-            table.cell(row_idx, 0).fill.solid()
-            table.cell(row_idx, 0).fill.fore_color.rgb = RGBColor(217, 225, 242)
-            
-            # Data cells
-            for col_idx, stakeholder in enumerate(df.columns, start=1):
-                cell = table.cell(row_idx, col_idx)
-                value = str(df.loc[function, stakeholder]).strip()
-                
-                # Value could be just letter ('R') or full label ('R - Responsible')
-                # Extract the letter for color matching
-                raci_letter = ''
-                display_text = value
-                
-                if value:
-                    # Check if it's a full label format
-                    if value.startswith('R -') or value == 'R - Responsible':
-                        raci_letter = 'R'
-                        display_text = 'R - Responsible'
-                    elif value.startswith('A -') or value == 'A - Accountable':
-                        raci_letter = 'A'
-                        display_text = 'A - Accountable'
-                    elif value.startswith('C -') or value == 'C - Consulted':
-                        raci_letter = 'C'
-                        display_text = 'C - Consulted'
-                    elif value.startswith('I -') or value == 'I - Informed':
-                        raci_letter = 'I'
-                        display_text = 'I - Informed'
-                    elif len(value) == 1 and value in ['R', 'A', 'C', 'I']:
-                        # Just the letter - convert to full label
-                        raci_letter = value
-                        display_text = RACI_LABELS.get(value, value)
-                    else:
-                        # Try to extract first character
-                        raci_letter = value[0] if len(value) > 0 else ''
-                        if raci_letter in RACI_LABELS:
-                            display_text = RACI_LABELS[raci_letter]
-                
-                cell.text = display_text
-                
-                # Apply color based on the letter
-                if raci_letter in RACI_COLORS:
-                    color = RACI_COLORS[raci_letter]
-                    rgb = tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
-                    cell.fill.solid()
-                    cell.fill.fore_color.rgb = RGBColor(*rgb)
-        
-        # Format all cells with larger font
-        for row in range(num_rows):
-            for col in range(num_cols):
-                cell = table.cell(row, col)
-                # Increased font size for data cells (was Pt(10), now Pt(14))
-                # Header and index keep larger size
-                if row == 0 or col == 0:
-                    # Header and index cells
-                    cell.text_frame.paragraphs[0].font.size = Pt(12)
-                    cell.text_frame.paragraphs[0].font.bold = True
-                    if row == 0:
-                        cell.text_frame.paragraphs[0].font.color.rgb = RGBColor(255, 255, 255)
-                    else:
-                        cell.text_frame.paragraphs[0].font.color.rgb = RGBColor(0, 0, 0)
-                else:
-                    # Data cells - larger font
-                    cell.text_frame.paragraphs[0].font.size = Pt(14)
-                    cell.text_frame.paragraphs[0].font.bold = False
-                cell.text_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
-        
-        # Add legend
-        legend_top = Inches(6.5)
-        legend_left = Inches(0.5)
-        legend_width = Inches(9)
-        legend_height = Inches(0.5)
-        
-        legend_box = slide.shapes.add_textbox(legend_left, legend_top, legend_width, legend_height)
-        legend_frame = legend_box.text_frame
-        legend_frame.text = "Legend: R = Responsible | A = Accountable | C = Consulted | I = Informed"
-        legend_para = legend_frame.paragraphs[0]
-        legend_para.font.size = Pt(9)
-        legend_para.alignment = PP_ALIGN.CENTER
-        
-        output = BytesIO()
-        prs.save(output)
-        output.seek(0)
-        return output
-    except Exception as e:
-        st.error(f"Error exporting to PowerPoint: {str(e)}")
-        raise
-
-# ============================================================================
-# Snowflake Integration Functions
-# ============================================================================
-
-def get_snowflake_connection():
-    """Get Snowflake connection using Streamlit secrets (supports password or key pair auth)"""
-    try:
-        import snowflake.connector
-        from cryptography.hazmat.primitives import serialization
-        
-        # Get credentials from Streamlit secrets
-        # Supports both password and key pair authentication
-        if 'snowflake' not in st.secrets:
-            return None, "Snowflake credentials not found in Streamlit secrets. Please configure secrets.toml"
-        
-        snowflake_config = st.secrets['snowflake']
-        
-        # Build connection parameters
-        conn_params = {
-            'account': snowflake_config['account'],
-            'user': snowflake_config['user'],
-            'warehouse': snowflake_config.get('warehouse', ''),
-            'database': snowflake_config.get('database', ''),
-            'schema': snowflake_config.get('schema', ''),
-            'role': snowflake_config.get('role', '')
-        }
-        
-        # Check for key pair authentication (preferred)
-        if 'private_key' in snowflake_config or 'private_key_path' in snowflake_config:
-            # Key pair authentication
-            private_key = None
-            
-            if 'private_key_path' in snowflake_config:
-                # Read private key from file
-                with open(snowflake_config['private_key_path'], 'rb') as key_file:
-                    private_key = serialization.load_pem_private_key(
-                        key_file.read(),
-                        password=None,
-                    )
-            elif 'private_key' in snowflake_config:
-                # Read private key from string content
-                private_key_content = snowflake_config['private_key']
-                # Handle multi-line strings with triple quotes
-                if isinstance(private_key_content, str):
-                    private_key = serialization.load_pem_private_key(
-                        private_key_content.encode('utf-8'),
-                        password=None,
-                    )
-            
-            if private_key:
-                # Convert to PEM format for Snowflake connector
-                pkb = private_key.private_bytes(
-                    encoding=serialization.Encoding.PEM,
-                    format=serialization.PrivateFormat.PKCS8,
-                    encryption_algorithm=serialization.NoEncryption()
-                )
-                conn_params['private_key'] = pkb
-            else:
-                return None, "Failed to load private key for key pair authentication"
-        elif 'password' in snowflake_config:
-            # Password authentication (fallback)
-            conn_params['password'] = snowflake_config['password']
-        else:
-            return None, "Either 'password' or 'private_key'/'private_key_path' must be provided in Snowflake secrets"
-        
-        conn = snowflake.connector.connect(**conn_params)
-        
-        return conn, None
-    except ImportError as e:
-        missing_module = str(e)
-        if 'cryptography' in missing_module:
-            return None, "cryptography package required for key pair auth. Install: pip install cryptography"
-        return None, "snowflake-connector-python not installed. Please install it: pip install snowflake-connector-python"
-    except Exception as e:
-        return None, f"Error connecting to Snowflake: {str(e)}"
-
-def initialize_snowflake_table(conn):
-    """Initialize/create the RACI matrices table in Snowflake"""
-    try:
-        cursor = conn.cursor()
-        
-        # Create table if it doesn't exist
-        # Use fully qualified name if database/schema are specified
-        create_table_sql = """
-        CREATE TABLE IF NOT EXISTS raci_matrices (
-            matrix_id VARCHAR(255),
-            matrix_name VARCHAR(500),
-            functions VARIANT,
-            stakeholders VARIANT,
-            raci_data VARIANT,
-            created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
-            updated_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
-            created_by VARCHAR(255),
-            PRIMARY KEY (matrix_id)
-        )
-        """
-        
-        cursor.execute(create_table_sql)
-        cursor.close()
-        return True, None
-    except Exception as e:
-        return False, f"Error initializing Snowflake table: {str(e)}"
-
-def save_to_snowflake(matrix_name, functions, stakeholders, raci_data, created_by="user"):
-    """Save RACI matrix to Snowflake"""
-    try:
-        conn, error = get_snowflake_connection()
-        if error:
-            return False, error
-        
-        # Initialize table
-        success, error = initialize_snowflake_table(conn)
-        if not success:
-            conn.close()
-            return False, error
-        
-        # Generate unique matrix ID
-        import uuid
-        import json
-        from datetime import datetime
-        
-        matrix_id = str(uuid.uuid4())
-        
-        # Convert data to JSON for VARIANT storage
-        functions_json = json.dumps(functions)
-        stakeholders_json = json.dumps(stakeholders)
-        
-        # Convert DataFrame to JSON
-        raci_data_dict = raci_data.to_dict(orient='index')
-        raci_data_json = json.dumps(raci_data_dict)
-        
-        cursor = conn.cursor()
-        
-        # Check if matrix with this name already exists (optional: allow updates by name)
-        # For now, always insert new (each save creates a new matrix_id)
-        # If you want to update by name, you'd need to query first
-        
-        # Insert new record
-        insert_sql = """
-        INSERT INTO raci_matrices (matrix_id, matrix_name, functions, stakeholders, raci_data, created_by)
-        VALUES (%s, %s, PARSE_JSON(%s), PARSE_JSON(%s), PARSE_JSON(%s), %s)
-        """
-        
-        cursor.execute(insert_sql, (
-            matrix_id, matrix_name, functions_json, stakeholders_json, raci_data_json, created_by
-        ))
-        
-        # Snowflake auto-commits, no need for explicit commit
-        cursor.close()
-        conn.close()
-        
-        return True, f"Successfully saved '{matrix_name}' to Snowflake (ID: {matrix_id})"
-    except Exception as e:
-        return False, f"Error saving to Snowflake: {str(e)}"
-
-def load_from_snowflake(matrix_id):
-    """Load RACI matrix from Snowflake"""
-    try:
-        import json
-        
-        conn, error = get_snowflake_connection()
-        if error:
-            return False, error, None, None, None
-        
-        cursor = conn.cursor()
-        
-        select_sql = """
-        SELECT matrix_name, functions, stakeholders, raci_data
-        FROM raci_matrices
-        WHERE matrix_id = %s
-        """
-        
-        cursor.execute(select_sql, (matrix_id,))
-        result = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if not result:
-            return False, "Matrix not found", None, None, None
-        
-        matrix_name, functions_json, stakeholders_json, raci_data_json = result
-        
-        # Parse JSON data
-        functions = json.loads(functions_json) if functions_json else []
-        stakeholders = json.loads(stakeholders_json) if stakeholders_json else []
-        raci_data_dict = json.loads(raci_data_json) if raci_data_json else {}
-        
-        # Convert dict back to DataFrame
-        raci_data = pd.DataFrame.from_dict(raci_data_dict, orient='index')
-        raci_data.index.name = 'Function'
-        
-        return True, f"Successfully loaded '{matrix_name}'", functions, stakeholders, raci_data
-    except Exception as e:
-        return False, f"Error loading from Snowflake: {str(e)}", None, None, None
-
-def list_snowflake_matrices():
-    """List all saved RACI matrices from Snowflake"""
-    try:
-        conn, error = get_snowflake_connection()
-        if error:
-            return False, error, []
-        
-        cursor = conn.cursor()
-        
-        select_sql = """
-        SELECT matrix_id, matrix_name, created_at, updated_at, created_by
-        FROM raci_matrices
-        ORDER BY updated_at DESC
-        """
-        
-        cursor.execute(select_sql)
-        results = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
-        # Format results as list of dicts
-        matrices = []
-        for row in results:
-            matrices.append({
-                'matrix_id': row[0],
-                'matrix_name': row[1],
-                'created_at': row[2],
-                'updated_at': row[3],
-                'created_by': row[4]
-            })
-        
-        return True, None, matrices
-    except Exception as e:
-        return False, f"Error listing matrices: {str(e)}", []
-
-def delete_from_snowflake(matrix_id):
-    """Delete a RACI matrix from Snowflake"""
-    try:
-        conn, error = get_snowflake_connection()
-        if error:
-            return False, error
-        
-        cursor = conn.cursor()
-        
-        delete_sql = "DELETE FROM raci_matrices WHERE matrix_id = %s"
-        cursor.execute(delete_sql, (matrix_id,))
-        
-        # Snowflake auto-commits, no need for explicit commit
-        cursor.close()
-        conn.close()
-        
-        return True, "Matrix deleted successfully"
-    except Exception as e:
-        return False, f"Error deleting matrix: {str(e)}"
-
 # Streamlit UI
 st.set_page_config(page_title="RACI Matrix Builder", page_icon="📊", layout="wide")
+begin_rerun_metrics()
+
+# Resume an autosaved matrix when a dropped session reconnects with its URL
+snapshot_message = restore_session_snapshot()
+if snapshot_message:
+    st.toast(snapshot_message)
+
+# Pick up other sessions' edits before anything reads the matrix
+sync_collab_room()
 
 # Version and author info
 VERSION = "1.1.0"
@@ -804,7 +80,7 @@ st.markdown(f"""
     </div>
 """, unsafe_allow_html=True)
 
-# Custom CSS and JavaScript to change cell selection color from red to light blue
+# Custom CSS to change the classic editor's cell selection color from red to light blue
 st.markdown("""
     <style>
     /* Override Streamlit's default red selection color - change to light blue */
@@ -858,40 +134,6 @@ st.markdown("""
         background-color: #e3f2fd !important;
     }
     </style>
-    <script>
-    // Watch for red background colors and change them to light blue
-    function fixRedSelection() {
-        var cells = document.querySelectorAll('div[data-baseweb="data-table"] tbody tr td');
-        cells.forEach(function(cell) {
-            var style = window.getComputedStyle(cell);
-            var bgColor = style.backgroundColor;
-            // Check if it's red or red-like (rgb(255, ...) or similar)
-            if (bgColor.includes('rgb(255') || bgColor.includes('rgb(255, 0, 0)') || 
-                bgColor.includes('rgb(255,0,0)') || bgColor.includes('rgba(255')) {
-                if (cell === document.activeElement || cell.contains(document.activeElement)) {
-                    cell.style.backgroundColor = '#e3f2fd';
-                    cell.style.borderColor = '#2196f3';
-                    cell.style.borderWidth = '2px';
-                }
-            }
-        });
-    }
-    
-    // Run on load and periodically
-    setInterval(fixRedSelection, 100);
-    
-    // Also watch for focus events
-    document.addEventListener('focusin', function(e) {
-        var cell = e.target.closest('td');
-        if (cell && cell.closest('[data-baseweb="data-table"]')) {
-            setTimeout(function() {
-                cell.style.backgroundColor = '#e3f2fd';
-                cell.style.borderColor = '#2196f3';
-                cell.style.borderWidth = '2px';
-            }, 10);
-        }
-    }, true);
-    </script>
 """, unsafe_allow_html=True)
 
 # Custom CSS to reduce header spacing
@@ -927,32 +169,78 @@ col_import, col_function, col_stakeholder = st.columns(3)
 with col_import:
     st.markdown("**📥 Import from Spreadsheet**")
     uploaded_file = st.file_uploader(
-        "Upload Excel or CSV",
-        type=['xlsx', 'xls', 'csv'],
-        help="Upload a spreadsheet with functions in the first column and stakeholders as column headers. RACI values (R, A, C, I) should be in the matrix cells.",
+        "Upload Excel, CSV, Parquet or Arrow",
+        type=['xlsx', 'xls', 'csv', 'parquet', 'arrow', 'feather'],
+        help="Upload a spreadsheet with functions in the first column and stakeholders as column headers. RACI values (R, A, C, I) should be in the matrix cells. Parquet/Arrow files exported from this app are imported losslessly.",
         label_visibility="collapsed"
     )
     
     if uploaded_file is not None:
         if st.button("🔄 Import Data", use_container_width=True, type="primary"):
-            success, message = import_from_spreadsheet(uploaded_file)
+            with timed_stage('import_spreadsheet'):
+                success, message = import_from_spreadsheet(uploaded_file)
             if success:
                 st.success(message)
                 st.rerun()
             else:
                 st.error(message)
+        
+        if uploaded_file.name.lower().endswith(('.xlsx', '.xls')):
+            if st.button("📚 Import All Sheets", use_container_width=True, help="Import every sheet of the workbook as a separate matrix"):
+                with timed_stage('import_workbook'):
+                    try:
+                        sheet_results = cached_parse_workbook(upload_digest(uploaded_file), uploaded_file.getvalue())
+                    except Exception as e:
+                        sheet_results = []
+                        st.error(f"Error importing file: {str(e)}")
+                imported_sheets = {
+                    result['sheet']: {key: result[key] for key in ('functions', 'stakeholders', 'raci_data')}
+                    for result in sheet_results if result['success']
+                }
+                if sheet_results:
+                    st.session_state.last_import_report = {
+                        'file_name': uploaded_file.name,
+                        'sheets': [result['report'] for result in sheet_results]
+                    }
+                for result in sheet_results:
+                    if not result['success']:
+                        st.warning(f"Sheet '{result['sheet']}' skipped: {result['message']}")
+                if imported_sheets:
+                    st.session_state.workbook_sheets = imported_sheets
+                    st.session_state.active_sheet_select = next(iter(imported_sheets))
+                    st.session_state.active_sheet = None
+                    switch_active_sheet()
+                    st.success(f"Imported {len(imported_sheets)} sheet(s) from the workbook!")
+                    st.rerun()
+    
+    # Switch between the matrices of an imported workbook
+    if st.session_state.get('workbook_sheets'):
+        st.selectbox(
+            "Workbook sheet",
+            options=list(st.session_state.workbook_sheets.keys()),
+            key="active_sheet_select",
+            on_change=switch_active_sheet,
+            help="Edits are kept per sheet when switching"
+        )
+
+    # Diagnostics for the most recent import
+    if st.session_state.get('last_import_report'):
+        with st.expander("🧾 Import Report"):
+            render_import_report(st.session_state.last_import_report)
 
 # Add functions - Middle column
 with col_function:
     st.markdown("**➕ Add Function (Row)**")
     with st.form("add_function_form", clear_on_submit=False):
         new_function = st.text_input("Add new function", key=f"function_input_{st.session_state.function_input_key}", label_visibility="collapsed")
+        allow_similar_function = st.checkbox("Add anyway", key="allow_similar_function", help="Add the function even if a similarly named one exists")
         submitted_func = st.form_submit_button("➕ Add Function", use_container_width=True)
         if submitted_func:
             # Capture value
             function_value = new_function.strip() if new_function else ""
             if function_value:
-                if function_value not in st.session_state.functions:
+                name_warning = new_name_warning(function_value, get_name_index('functions'), "Function", allow_similar_function)
+                if name_warning is None:
                     st.session_state.functions.append(function_value)
                     # Clear input by incrementing key
                     st.session_state.function_input_key += 1
@@ -960,7 +248,7 @@ with col_function:
                     st.session_state.refocus_function = True
                     st.rerun()
                 else:
-                    st.warning("Function already exists!")
+                    st.warning(name_warning)
             else:
                 st.warning("Please enter a function name.")
 
@@ -969,12 +257,14 @@ with col_stakeholder:
     st.markdown("**➕ Add Stakeholder (Column)**")
     with st.form("add_stakeholder_form", clear_on_submit=False):
         new_stakeholder = st.text_input("Add new stakeholder", key=f"stakeholder_input_{st.session_state.stakeholder_input_key}", label_visibility="collapsed")
+        allow_similar_stakeholder = st.checkbox("Add anyway", key="allow_similar_stakeholder", help="Add the stakeholder even if a similarly named one exists")
         submitted_stake = st.form_submit_button("➕ Add Stakeholder", use_container_width=True)
         if submitted_stake:
             # Capture value
             stakeholder_value = new_stakeholder.strip() if new_stakeholder else ""
             if stakeholder_value:
-                if stakeholder_value not in st.session_state.stakeholders:
+                name_warning = new_name_warning(stakeholder_value, get_name_index('stakeholders'), "Stakeholder", allow_similar_stakeholder)
+                if name_warning is None:
                     st.session_state.stakeholders.append(stakeholder_value)
                     # Clear input by incrementing key
                     st.session_state.stakeholder_input_key += 1
@@ -982,10 +272,157 @@ with col_stakeholder:
                     st.session_state.refocus_stakeholder = True
                     st.rerun()
                 else:
-                    st.warning("Stakeholder already exists!")
+                    st.warning(name_warning)
             else:
                 st.warning("Please enter a stakeholder name.")
 
+# Start from a reusable skeleton instead of adding every function and stakeholder by hand
+with st.expander("📋 Start from Template"):
+    template_library = get_template_library()
+    template_col, action_col = st.columns([2, 1])
+    with template_col:
+        template_name = st.selectbox("Template", options=list(template_library.keys()), key="template_select")
+        if template_name:
+            template = template_library[template_name]
+            st.caption(
+                f"{template['description']} · {len(template['functions'])} functions, "
+                f"{len(template['stakeholders'])} stakeholders · {template['source']}"
+            )
+    with action_col:
+        template_add = st.checkbox(
+            "Add to current matrix",
+            key="template_add_to_current",
+            disabled=st.session_state.raci_data.empty,
+            help="Keep the current functions and assignments and add the template's on top"
+        )
+        if st.button("📋 Use Template", key="use_template", use_container_width=True, type="primary") and template_name:
+            with timed_stage('instantiate_template'):
+                success, message = instantiate_template(template_name, add_to_current=template_add)
+            if success:
+                st.session_state.bulk_message = (message, len(check_session_rules()))
+                st.rerun()
+            else:
+                st.error(message)
+    
+    if not st.session_state.raci_data.empty:
+        with st.form("save_template_form"):
+            st.markdown("**Save current matrix as a template**")
+            new_template_name = st.text_input("Template name", key="new_template_name")
+            new_template_description = st.text_input("Description", key="new_template_description")
+            if st.form_submit_button("💾 Save Template"):
+                success, message = save_matrix_as_template(new_template_name, new_template_description, st.session_state.raci_data)
+                if success:
+                    st.success(message)
+                else:
+                    st.error(message)
+
+# Combine several team matrices (uploads and/or saved Snowflake matrices) into one
+with st.expander("🧩 Merge Matrices"):
+    merge_uploads = st.file_uploader(
+        "Matrices to merge",
+        type=['xlsx', 'xls', 'csv', 'parquet', 'arrow', 'feather'],
+        accept_multiple_files=True,
+        key="merge_uploads",
+        help="Functions and stakeholders are matched ignoring case and spacing. Sources are used in the order listed."
+    )
+    try:
+        merge_snowflake_available = 'snowflake' in st.secrets
+    except (AttributeError, TypeError):
+        merge_snowflake_available = False
+    merge_snowflake_ids = []
+    if merge_snowflake_available and st.checkbox("Include saved Snowflake matrices", key="merge_include_snowflake"):
+        success, error, matrices = list_snowflake_matrices()
+        if success:
+            merge_snowflake_options = {f"{m['matrix_name']} (Updated: {m['updated_at']})": m['matrix_id'] for m in matrices}
+            merge_snowflake_ids = [
+                merge_snowflake_options[label] for label in
+                st.multiselect("Saved matrices", options=list(merge_snowflake_options.keys()), key="merge_snowflake_select")
+            ]
+        else:
+            st.error(f"Error loading matrices: {error}")
+    merge_include_current = st.checkbox(
+        "Include the current matrix (first)",
+        value=not st.session_state.raci_data.empty,
+        key="merge_include_current"
+    )
+    merge_rule = st.selectbox("When sources disagree", options=list(MERGE_RULES.keys()), format_func=MERGE_RULES.get, key="merge_rule")
+    
+    if st.button("🧩 Merge", key="merge_matrices_button", type="primary"):
+        with timed_stage('merge_matrices'):
+            merge_sources = []
+            if merge_include_current and not st.session_state.raci_data.empty:
+                merge_sources.append(("Current matrix", st.session_state.raci_data))
+            for merge_file in merge_uploads or []:
+                (success, message, _, _, raci_df), _, _ = cached_parse_upload(
+                    upload_digest(merge_file), merge_file.name, merge_file.getvalue()
+                )
+                if success:
+                    merge_sources.append((merge_file.name, raci_df))
+                else:
+                    st.warning(f"'{merge_file.name}' skipped: {message}")
+            if merge_snowflake_ids:
+                success, error, saved_matrices = load_matrices_from_snowflake(merge_snowflake_ids)
+                if success:
+                    merge_sources.extend((matrix_name, raci_df) for _, matrix_name, raci_df in saved_matrices)
+                else:
+                    st.error(error)
+            st.session_state.merge_result = merge_matrices(merge_sources, merge_rule)
+    
+    if st.session_state.get('merge_result'):
+        success, message, merged_functions, merged_stakeholders, merged_df, merge_report = st.session_state.merge_result
+        if not success:
+            st.error(message)
+        else:
+            st.success(message)
+            st.dataframe(
+                pd.DataFrame({'Cells taken': merge_report['cells_by_source']}),
+                use_container_width=True
+            )
+            if merge_report['conflicts']:
+                shown_note = f" (first {len(merge_report['conflicts'])} shown)" if merge_report['conflict_count'] > len(merge_report['conflicts']) else ""
+                st.markdown(f"**Conflicting cells{shown_note}**")
+                st.dataframe(pd.DataFrame(merge_report['conflicts']), use_container_width=True, hide_index=True)
+            if st.button("✅ Use Merged Matrix", key="apply_merge_result"):
+                st.session_state.functions = merged_functions
+                st.session_state.stakeholders = merged_stakeholders
+                commit_raci_edits(merged_df, source='merge_matrices')
+                st.session_state.merge_result = None
+                st.rerun()
+
+# Shared editing: sessions in the same room see each other's cell edits
+with st.expander("👥 Shared Editing", expanded=bool(st.session_state.get('collab_room'))):
+    if not st.session_state.get('collab_room'):
+        st.caption("Everyone who joins the same room edits one matrix; concurrent edits merge cell by cell (the latest edit wins).")
+        with st.form("collab_join_form"):
+            collab_room_name = st.text_input("Room name", key="collab_room_name")
+            if st.form_submit_button("👥 Join Room", use_container_width=True):
+                success, message = join_collab_room(collab_room_name)
+                if success:
+                    st.session_state.bulk_message = (message, 0)
+                    st.rerun()
+                else:
+                    st.error(message)
+    else:
+        collab_status = st.session_state.get('collab_status', {})
+        st.info(
+            f"Editing shared room **{st.session_state.collab_room}** with "
+            f"{max(collab_status.get('active_sessions', 1) - 1, 0)} other session(s). "
+            f"{collab_status.get('conflicts', 0)} concurrent edit(s) merged so far."
+        )
+        if st.button("🚪 Leave Room", key="collab_leave"):
+            leave_collab_room()
+            st.rerun()
+        
+        # Poll the room cheaply and only rerun the whole app when another session changed something
+        if hasattr(st, 'fragment'):
+            @st.fragment(run_every=COLLAB_POLL_SECONDS)
+            def watch_collab_room():
+                if collab_has_updates(st.session_state.collab_room, st.session_state.collab_seq, st.session_state.collab_site):
+                    st.rerun()
+            watch_collab_room()
+        elif st.button("🔄 Sync Now", key="collab_sync"):
+            st.rerun()
+
 # JavaScript to refocus input after form submission
 if st.session_state.refocus_function:
     st.session_state.refocus_function = False
@@ -1061,30 +498,17 @@ if st.session_state.functions or st.session_state.stakeholders:
     col_list_func, col_list_stake, col_clear = st.columns([2, 2, 1])
     
     with col_list_func:
+        # One paged panel per list instead of a row of widgets per name
         if st.session_state.functions:
-            st.markdown("**Current Functions:**")
-            for idx, func in enumerate(st.session_state.functions):
-                col_name, col_del = st.columns([4, 1])
-                with col_name:
-                    st.write(f"{idx + 1}. {func}")
-                with col_del:
-                    if st.button("🗑️", key=f"del_func_{idx}", use_container_width=True):
-                        st.session_state.functions.pop(idx)
-                        st.rerun()
+            st.markdown(f"**Current Functions ({len(st.session_state.functions)}):**")
+            render_name_manager('functions')
         else:
             st.markdown("*No functions added yet*")
     
     with col_list_stake:
         if st.session_state.stakeholders:
-            st.markdown("**Current Stakeholders:**")
-            for idx, stake in enumerate(st.session_state.stakeholders):
-                col_name, col_del = st.columns([4, 1])
-                with col_name:
-                    st.write(f"{idx + 1}. {stake}")
-                with col_del:
-                    if st.button("🗑️", key=f"del_stake_{idx}", use_container_width=True):
-                        st.session_state.stakeholders.pop(idx)
-                        st.rerun()
+            st.markdown(f"**Current Stakeholders ({len(st.session_state.stakeholders)}):**")
+            render_name_manager('stakeholders')
         else:
             st.markdown("*No stakeholders added yet*")
     
@@ -1094,6 +518,10 @@ if st.session_state.functions or st.session_state.stakeholders:
             st.session_state.functions = []
             st.session_state.stakeholders = []
             st.session_state.raci_data = pd.DataFrame()
+            st.session_state.workbook_sheets = {}
+            st.session_state.name_merge_suggestions = None
+            leave_collab_room()
+            st.session_state.loaded_matrix = None
             st.session_state.function_input_key = 0
             st.session_state.stakeholder_input_key = 0
             st.rerun()
@@ -1102,90 +530,284 @@ st.divider()
 
 # Main area - RACI Matrix
 if st.session_state.functions and st.session_state.stakeholders:
-    # Create or update matrix
-    if st.session_state.raci_data.empty or \
-       list(st.session_state.raci_data.index) != st.session_state.functions or \
-       list(st.session_state.raci_data.columns) != st.session_state.stakeholders:
-        st.session_state.raci_data = create_raci_matrix(
-            st.session_state.functions,
-            st.session_state.stakeholders
-        )
+    # Create or update matrix, keeping assignments when functions/stakeholders are added or removed
+    sync_matrix_structure()
     
     st.subheader("RACI Matrix")
-    st.caption("⚠️ Each function must have exactly 1 Accountable (A) stakeholder. Multiple Responsible (R), Consulted (C), or Informed (I) roles are allowed.")
+    st.caption("⚠️ Assignments are checked live against the validation rules - by default, at most 1 Accountable (A) stakeholder per function. Edit them in \"📏 Validation Rules\".")
     
-    # Validate current matrix and show warnings
-    validation_errors = validate_raci_matrix(st.session_state.raci_data)
-    if validation_errors:
-        for error in validation_errors:
-            st.warning(error)
+    # Check the current matrix once per rerun (incrementally, from the previous check); any edit
+    # below reruns the script before the second set of messages is drawn, so both describe the same state
+    validation_errors = check_session_rules()
+    for error in validation_errors[:RULE_MAX_DISPLAYED]:
+        st.warning(error)
+    if len(validation_errors) > RULE_MAX_DISPLAYED:
+        st.warning(f"... and {len(validation_errors) - RULE_MAX_DISPLAYED} more rule violation(s).")
     
-    # Create interactive matrix using st.data_editor
-    # Check if matrix structure changed (new functions/stakeholders added)
-    if st.session_state.raci_data.empty or \
-       list(st.session_state.raci_data.index) != st.session_state.functions or \
-       list(st.session_state.raci_data.columns) != st.session_state.stakeholders:
-        # Recreate matrix with new structure
-        st.session_state.raci_data = create_raci_matrix(
-            st.session_state.functions,
-            st.session_state.stakeholders
+    with st.expander("📏 Validation Rules"):
+        st.caption(
+            "One rule per line, e.g. `exactly 1 A per function`, `at least 1 R per function`, "
+            "`at most 5 R per stakeholder`, `stakeholder \"Legal\" never A`, `function \"Payroll\" never C/I`. "
+            "Prefix a rule with `in group \"Finance\":` or `in functions matching \"deploy|release\":` to limit it to those functions."
         )
+        with st.form("rules_form"):
+            rules_text = st.text_area(
+                "Rules",
+                value=st.session_state.get('raci_rules_text') or default_rules_text(),
+                height=160,
+                help="Lines starting with # are ignored. R/A matches either role."
+            )
+            rules_apply_col, rules_reset_col = st.columns(2)
+            with rules_apply_col:
+                apply_rules = st.form_submit_button("✅ Apply Rules", use_container_width=True, type="primary")
+            with rules_reset_col:
+                reset_rules = st.form_submit_button("↩️ Default Rules", use_container_width=True)
+        if apply_rules:
+            success, message, rules = compile_raci_rules(rules_text)
+            if success:
+                st.session_state.raci_rules_text = rules_text
+                st.session_state.bulk_message = (f"Applied {message}.", len(check_session_rules()))
+                st.rerun()
+            else:
+                st.error(message)
+        if reset_rules:
+            st.session_state.pop('raci_rules_text', None)
+            st.session_state.bulk_message = ("Restored the default rules.", len(check_session_rules()))
+            st.rerun()
+    
+    # Grouped functions ('Process > Sub-process > Task') can be narrowed to one group; the
+    # editors and the Visual Matrix then show only its rows
+    group_state = get_group_rollups()
+    view_rows = None
+    group_filter = ''
+    if group_state['groups']:
+        group_options = [''] + [FUNCTION_GROUP_SEPARATOR.join(path) for path in group_state['groups']]
+        if st.session_state.get('group_filter') not in group_options:
+            st.session_state.group_filter = ''
+        group_filter = st.selectbox(
+            "Show functions in group",
+            options=group_options,
+            format_func=lambda option: '\u2003' * option.count(FUNCTION_GROUP_SEPARATOR) + option.split(FUNCTION_GROUP_SEPARATOR)[-1] if option else "(all groups)",
+            key="group_filter",
+            on_change=lambda: st.session_state.update(grid_viewport=(0, 0))
+        )
+        if group_filter:
+            view_rows = group_member_rows(group_state, function_path(group_filter))
+        with st.expander("🗂️ Group Roll-ups"):
+            max_group_depth = max(len(path) for path in group_state['groups'])
+            rollup_depth = st.slider("Levels shown", min_value=1, max_value=max_group_depth, value=1, key="rollup_depth") \
+                if max_group_depth > 1 else 1
+            rollup_frame = group_rollup_frame(group_state, rollup_depth)
+            st.dataframe(rollup_frame, use_container_width=True, hide_index=True,
+                         height=min(400, 35 * (len(rollup_frame) + 1) + 3))
+    view_df = st.session_state.raci_data.iloc[view_rows] if view_rows is not None else st.session_state.raci_data
     
+    # Create interactive matrix using st.data_editor
     # Prepare data for editor - ensure consistent format
     # Use a fresh copy to avoid reference issues
-    data_for_editor = st.session_state.raci_data.copy()
+    data_for_editor = view_df.copy()
     # Normalize empty values to empty strings for consistency
     data_for_editor = data_for_editor.fillna('')
     
-    # Create the data editor WITHOUT a key
-    # Removing the key prevents widget state caching that causes every 2nd edit to revert
-    # Session state will maintain the data between renders
-    # Use the full labels as options so they display in the dropdown
-    edited_df = st.data_editor(
-        data_for_editor,
-        column_config={
-            col: st.column_config.SelectboxColumn(
-                col,
-                width="medium",
-                options=list(RACI_OPTIONS.values()),  # Use values (labels) for display
-                help=f"Select RACI role for {col}. Note: Only 1 'A' per function!"
+    # Bulk operations apply one block assignment to the matrix, then validate once
+    if st.session_state.get('bulk_message'):
+        message, error_count = st.session_state.bulk_message
+        st.session_state.bulk_message = None
+        st.success(message)
+        if error_count:
+            st.warning(f"The matrix now has {error_count} validation issue(s) - see the messages above.")
+    with st.expander("🧰 Bulk Operations"):
+        tab_assign, tab_copy, tab_clear = st.tabs(["🎯 Assign by Pattern", "📋 Copy Row", "🧹 Clear"])
+        bulk_result = None
+        
+        with tab_assign:
+            with st.form("bulk_assign_form"):
+                bulk_stakeholders = st.multiselect("Stakeholders", options=st.session_state.stakeholders, key="bulk_assign_stakeholders")
+                bulk_pattern = st.text_input(
+                    "Functions matching",
+                    key="bulk_assign_pattern",
+                    help="Case-insensitive regular expression, e.g. 'deploy|release' or '^Finance'. Leave empty for all functions."
+                )
+                bulk_role = st.selectbox(
+                    "Role",
+                    options=list(RACI_OPTIONS.keys()),
+                    format_func=lambda letter: RACI_OPTIONS[letter] or '(clear)',
+                    key="bulk_assign_role"
+                )
+                if st.form_submit_button("🎯 Assign Role", use_container_width=True):
+                    bulk_result = bulk_assign_role(st.session_state.raci_data, bulk_stakeholders, bulk_pattern, bulk_role)
+        
+        with tab_copy:
+            with st.form("bulk_copy_form"):
+                copy_source = st.selectbox("Copy assignments from", options=st.session_state.functions, key="bulk_copy_source")
+                copy_targets = st.multiselect("To functions", options=st.session_state.functions, key="bulk_copy_targets")
+                if st.form_submit_button("📋 Copy Assignments", use_container_width=True):
+                    bulk_result = copy_row_assignments(st.session_state.raci_data, copy_source, copy_targets)
+        
+        with tab_clear:
+            with st.form("bulk_clear_form"):
+                clear_functions = st.multiselect("Functions (empty = all)", options=st.session_state.functions, key="bulk_clear_functions")
+                clear_stakeholders = st.multiselect("Stakeholders (empty = all)", options=st.session_state.stakeholders, key="bulk_clear_stakeholders")
+                if st.form_submit_button("🧹 Clear Assignments", use_container_width=True):
+                    bulk_result = clear_assignments(st.session_state.raci_data, clear_functions, clear_stakeholders)
+        
+        if bulk_result is not None:
+            success, message, new_df, changed_mask = bulk_result
+            if success:
+                with timed_stage('bulk_operation'):
+                    commit_raci_edits(new_df, changed_mask, source='bulk')
+                st.session_state.bulk_message = (message, len(check_session_rules()))
+                st.rerun()
+            else:
+                st.error(message)
+
+    
+    # Near-duplicate functions/stakeholders (found on import or on demand) can be folded together
+    with st.expander("🔗 Near-Duplicate Names", expanded=bool(st.session_state.get('name_merge_suggestions'))):
+        if st.button("🔍 Find Near-Duplicates", key="find_name_duplicates"):
+            st.session_state.name_merge_suggestions = find_name_merge_suggestions(
+                st.session_state.functions, st.session_state.stakeholders
             )
-            for col in st.session_state.raci_data.columns
-        },
-        use_container_width=True,
-        height=400,
-        hide_index=False
-        # NO KEY - this prevents widget state caching that causes reverts
+        suggestions = st.session_state.get('name_merge_suggestions')
+        if suggestions is not None and not suggestions:
+            st.info("No near-duplicate names found.")
+        for suggestion_idx, (axis, group) in enumerate(suggestions or []):
+            kind = "Functions" if axis == 0 else "Stakeholders"
+            keep_col, merge_col = st.columns([3, 1])
+            with keep_col:
+                keep_name = st.selectbox(
+                    f"{kind}: {', '.join(group)}",
+                    options=group,
+                    key=f"merge_keep_{suggestion_idx}",
+                    help="Name to keep; the others are merged into it"
+                )
+            with merge_col:
+                if st.button("🔗 Merge", key=f"merge_names_{suggestion_idx}", use_container_width=True):
+                    success, message, functions, stakeholders, new_df = merge_names(
+                        st.session_state.raci_data, st.session_state.functions, st.session_state.stakeholders,
+                        keep_name, group, axis
+                    )
+                    if success:
+                        st.session_state.functions = functions
+                        st.session_state.stakeholders = stakeholders
+                        commit_raci_edits(new_df, source='merge_names')
+                        st.session_state.name_merge_suggestions.pop(suggestion_idx)
+                        st.session_state.bulk_message = (message, len(check_session_rules()))
+                        st.rerun()
+                    else:
+                        st.error(message)
+        if suggestions:
+            if st.button("Dismiss Suggestions", key="dismiss_name_duplicates"):
+                st.session_state.name_merge_suggestions = None
+                st.rerun()
+    
+    # The grid component draws only the visible cells and sends edits as deltas; the classic
+    # data editor (with batch mode) remains available and is used if the component is missing
+    grid_component = get_grid_component()
+    editor_mode = st.radio(
+        "Editor",
+        options=["grid", "classic"],
+        format_func=lambda mode: "Fast grid" if mode == "grid" else "Classic editor",
+        key="editor_mode",
+        horizontal=True,
+        disabled=grid_component is None,
+        help="The fast grid stays responsive on very large matrices: click or shift-click cells, then press R, A, C, I or Delete."
     )
+    use_grid = grid_component is not None and editor_mode == "grid"
     
-    # CRITICAL FIX: Always update session state from editor's return value
-    # Do this immediately and unconditionally to prevent reverts
-    if edited_df is not None:
-        # Normalize empty values to empty strings
-        edited_clean = edited_df.fillna('')
-        
-        # Compare to see if we need to update
-        current_str = data_for_editor.astype(str).to_string()
-        edited_str = edited_clean.astype(str).to_string()
+    if use_grid:
+        raci_codes, _ = get_raci_codes(st.session_state.raci_data)
+        grid_viewport = tuple(st.session_state.get('grid_viewport', (0, 0)))
+        with timed_stage('render_grid'):
+            grid_event = grid_component(
+                key="raci_grid",
+                default=None,
+                **build_grid_args(
+                    view_df, raci_codes[view_rows] if view_rows is not None else raci_codes,
+                    session_function_errors(), *grid_viewport,
+                    version=f"{st.session_state.get('raci_data_version', 0)}|{group_filter}"
+                )
+            )
+        # The component keeps returning its last value, so each event is handled once
+        if grid_event and (grid_event.get('nonce'), grid_event.get('seq')) != st.session_state.get('grid_event_id'):
+            st.session_state.grid_event_id = (grid_event.get('nonce'), grid_event.get('seq'))
+            st.session_state.grid_viewport = tuple(grid_event.get('viewport') or grid_viewport)
+            if grid_event.get('edits'):
+                with timed_stage('grid_edits'):
+                    new_df, changed_mask = apply_grid_edits(st.session_state.raci_data, grid_event['edits'])
+                    if changed_mask is not None and changed_mask.any():
+                        commit_raci_edits(new_df, changed_mask, source='grid')
+                st.rerun()
+            elif st.session_state.grid_viewport != grid_viewport:
+                st.rerun()
+    else:
+        # Batch mode wraps the editor in a form: cell edits stay in the browser until
+        # "Apply Changes", then are committed together with a single rerun
+        batch_edits = st.toggle(
+            "Batch edits",
+            key="batch_edit_mode",
+            help="Collect many cell edits and apply them at once instead of rerunning the app after every change"
+        )
+        editor_container = st.form("raci_editor_form") if batch_edits else st.container()
+        
+        # Create the data editor WITHOUT a key
+        # Removing the key prevents widget state caching that causes every 2nd edit to revert
+        # Session state will maintain the data between renders
+        # Use the full labels as options so they display in the dropdown
+        with editor_container:
+            with timed_stage('render_editor'):
+                edited_df = st.data_editor(
+                    data_for_editor,
+                    column_config={
+                        col: st.column_config.SelectboxColumn(
+                            col,
+                            width="medium",
+                            options=list(RACI_OPTIONS.values()),  # Use values (labels) for display
+                            help=f"Select RACI role for {col}. Note: Only 1 'A' per function!"
+                        )
+                        for col in st.session_state.raci_data.columns
+                    },
+                    use_container_width=True,
+                    height=400,
+                    hide_index=False
+                    # NO KEY - this prevents widget state caching that causes reverts
+                )
+            if batch_edits:
+                st.form_submit_button("✅ Apply Changes", type="primary")
+        
+        # CRITICAL FIX: Always update session state from editor's return value
+        # Do this immediately and unconditionally to prevent reverts
+        if edited_df is not None:
+            # Normalize empty values to empty strings
+            edited_clean = edited_df.fillna('')
+            
+            # Compare cell values directly (rendering both frames with to_string is far slower)
+            with timed_stage('editor_diff'):
+                changed_mask = diff_raci_frames(data_for_editor, edited_clean)
+            
+            # Edits to one group's rows are written back into the full matrix
+            if view_rows is not None:
+                if changed_mask is not None and changed_mask.any():
+                    edited_clean, changed_mask = merge_view_edits(st.session_state.raci_data, view_rows, edited_clean, changed_mask)
+                else:
+                    changed_mask = np.zeros(st.session_state.raci_data.shape, dtype=bool)
+            
+            # Update session state if changed
+            if changed_mask is None or changed_mask.any():
+                # Update session state immediately - this is the source of truth
+                commit_raci_edits(edited_clean.copy(), changed_mask, source='batch' if batch_edits else 'editor')
+                # Force a rerun to ensure UI reflects the change immediately
+                st.rerun()
         
-        # Update session state if changed
-        if current_str != edited_str:
-            # Update session state immediately - this is the source of truth
-            st.session_state.raci_data = edited_clean.copy()
-            # Force a rerun to ensure UI reflects the change immediately
-            st.rerun()
-    
-    # Check validation status AFTER updating session state
-    # Use the updated session state for validation
-    validation_errors = validate_raci_matrix(st.session_state.raci_data)
-    
     # Use a container to manage validation messages so they clear properly
     validation_container = st.container()
     with validation_container:
         if validation_errors:
             # Show errors - these will clear when validation passes
-            for error in validation_errors:
+            for error in validation_errors[:RULE_MAX_DISPLAYED]:
                 st.error(error)
+            if len(validation_errors) > RULE_MAX_DISPLAYED:
+                st.error(f"... and {len(validation_errors) - RULE_MAX_DISPLAYED} more rule violation(s).")
         else:
             # Only show success if we have actual data entries (not all empty)
             has_data = False
@@ -1196,51 +818,83 @@ if st.session_state.functions and st.session_state.stakeholders:
             if has_data:
                 st.success("✅ All functions have valid RACI assignments!")
     
-    # Display styled matrix
-    st.subheader("Visual Matrix")
-    styled_df = st.session_state.raci_data.copy()
+    # Display styled matrix (the fast grid is already color coded, so it is only needed with the classic editor)
+    if not use_grid:
+        st.subheader("Visual Matrix")
+        
+        # Colors come from the role codes in one lookup instead of a Python call per cell
+        with timed_stage('style_matrix'):
+            raci_codes, _ = get_raci_codes(st.session_state.raci_data)
+            cell_styles = raci_cell_styles(view_df, raci_codes[view_rows] if view_rows is not None else raci_codes)
+            styled_display = view_df.style.apply(lambda _: cell_styles, axis=None)
+            st.dataframe(styled_display, use_container_width=True, height=400)
     
-    # Apply styling function
-    def style_raci(val):
-        # Extract letter from value (could be 'R' or 'R - Responsible')
-        val_str = str(val).strip()
-        raci_letter = ''
-        if val_str:
-            if val_str.startswith('R -') or val_str == 'R':
-                raci_letter = 'R'
-            elif val_str.startswith('A -') or val_str == 'A':
-                raci_letter = 'A'
-            elif val_str.startswith('C -') or val_str == 'C':
-                raci_letter = 'C'
-            elif val_str.startswith('I -') or val_str == 'I':
-                raci_letter = 'I'
-            elif len(val_str) == 1 and val_str in ['R', 'A', 'C', 'I']:
-                raci_letter = val_str
-            else:
-                raci_letter = val_str[0] if len(val_str) > 0 else ''
+    # Workload analytics
+    st.divider()
+    st.subheader("📈 Workload Analytics")
+    if st.toggle("Show workload analytics", key="show_analytics"):
+        col_max_r, col_max_a = st.columns(2)
+        with col_max_r:
+            max_responsible = st.number_input("Max R per stakeholder", min_value=0, value=10, step=1, key="analytics_max_r")
+        with col_max_a:
+            max_accountable = st.number_input("Max A per stakeholder", min_value=0, value=5, step=1, key="analytics_max_a")
+        
+        raci_codes, raci_digest = get_raci_codes(st.session_state.raci_data)
+        with timed_stage('analytics'):
+            analytics = compute_raci_analytics(
+                raci_digest,
+                raci_codes,
+                list(st.session_state.raci_data.index),
+                list(st.session_state.raci_data.columns),
+                max_responsible,
+                max_accountable
+            )
         
-        if raci_letter in RACI_COLORS:
-            return f'background-color: {RACI_COLORS[raci_letter]}'
-        return ''
-    
-    # Use map instead of applymap (applymap deprecated in pandas 2.1.0+)
-    try:
-        styled_display = styled_df.style.map(style_raci)
-    except AttributeError:
-        # Fallback for older pandas versions
-        styled_display = styled_df.style.applymap(style_raci)
-    st.dataframe(styled_display, use_container_width=True, height=400)
+        col_metric_1, col_metric_2, col_metric_3, col_metric_4 = st.columns(4)
+        col_metric_1.metric("Overloaded stakeholders", len(analytics['overloaded_stakeholders']))
+        col_metric_2.metric("Functions with no R", len(analytics['functions_without_r']))
+        col_metric_3.metric("Empty functions", len(analytics['empty_functions']))
+        col_metric_4.metric("Empty stakeholders", len(analytics['empty_stakeholders']))
+        
+        tab_stakeholders, tab_functions, tab_gaps = st.tabs(["👥 Per Stakeholder", "🧩 Per Function", "⚠️ Gaps"])
+        with tab_stakeholders:
+            if not analytics['overloaded_stakeholders'].empty:
+                st.warning(f"{len(analytics['overloaded_stakeholders'])} stakeholder(s) exceed {max_responsible} R or {max_accountable} A roles.")
+                st.dataframe(analytics['overloaded_stakeholders'], use_container_width=True)
+            st.dataframe(analytics['stakeholder_counts'], use_container_width=True, height=300)
+        with tab_functions:
+            st.dataframe(analytics['function_counts'], use_container_width=True, height=300)
+        with tab_gaps:
+            gap_lists = [
+                ("Functions with no Responsible (R)", analytics['functions_without_r']),
+                ("Functions with no Accountable (A)", analytics['functions_without_a']),
+                ("Functions with no assignments", analytics['empty_functions']),
+                ("Stakeholders with no assignments", analytics['empty_stakeholders']),
+            ]
+            for gap_title, gap_items in gap_lists:
+                st.markdown(f"**{gap_title}:** {len(gap_items)}")
+                if gap_items:
+                    st.dataframe(pd.DataFrame({'Name': gap_items}), use_container_width=True, hide_index=True, height=min(300, 35 * (len(gap_items) + 1)))
     
     # Export section
     st.divider()
     st.subheader("Export Options")
     
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
+    export_df = st.session_state.raci_data
+    _, export_digest = get_raci_codes(export_df)
     
     with col1:
         st.markdown("**Export to Spreadsheet**")
+        excel_native = st.toggle(
+            "Editable in Excel",
+            key="excel_native",
+            help="Write role codes (R/A/C/I) with a dropdown and conditional colors instead of formatted labels: "
+                 "smaller and faster to create, and colors and validation keep working when the file is edited in Excel and imported again."
+        )
         try:
-            excel_buffer = export_to_excel(st.session_state.raci_data)
+            with timed_stage('export_excel'):
+                excel_buffer = cached_matrix_export(export_digest, 'xlsx', excel_native, export_df)
             st.download_button(
                 label="📊 Download Excel File",
                 data=excel_buffer,
@@ -1252,7 +906,8 @@ if st.session_state.functions and st.session_state.stakeholders:
             st.error(f"Cannot export to Excel: {str(e)}")
         
         try:
-            csv = st.session_state.raci_data.to_csv()
+            with timed_stage('export_csv'):
+                csv = cached_matrix_export(export_digest, 'csv', False, export_df)
             st.download_button(
                 label="📄 Download CSV File",
                 data=csv,
@@ -1262,11 +917,45 @@ if st.session_state.functions and st.session_state.stakeholders:
             )
         except Exception as e:
             st.error(f"Cannot export to CSV: {str(e)}")
+        
+        if st.session_state.get('workbook_sheets'):
+            try:
+                store_active_sheet()
+                with timed_stage('export_workbook'):
+                    workbook_buffer = cached_workbook_export(
+                        workbook_sheet_digests(st.session_state.workbook_sheets), excel_native,
+                        {name: sheet['raci_data'] for name, sheet in st.session_state.workbook_sheets.items()}
+                    )
+                st.download_button(
+                    label=f"📚 Download Workbook ({len(st.session_state.workbook_sheets)} sheets)",
+                    data=workbook_buffer,
+                    file_name="raci_workbook.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    use_container_width=True
+                )
+            except Exception as e:
+                st.error(f"Cannot export workbook: {str(e)}")
+        
+        if any(function_group(f) for f in export_df.index):
+            try:
+                with timed_stage('export_workbook'):
+                    split_buffer = cached_matrix_export(export_digest, 'split_xlsx', excel_native, export_df)
+                st.download_button(
+                    label="📑 Download Split by Function Group",
+                    data=split_buffer,
+                    file_name="raci_matrix_by_group.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    use_container_width=True,
+                    help=f"One sheet per top-level group (functions named like 'Group{FUNCTION_GROUP_SEPARATOR}Function')"
+                )
+            except Exception as e:
+                st.error(f"Cannot export split workbook: {str(e)}")
     
     with col2:
         st.markdown("**Export to Presentation**")
         try:
-            pptx_buffer = export_to_powerpoint(st.session_state.raci_data)
+            with timed_stage('export_pptx'):
+                pptx_buffer = cached_matrix_export(export_digest, 'pptx', False, export_df)
             st.download_button(
                 label="📽️ Download PowerPoint File",
                 data=pptx_buffer,
@@ -1277,6 +966,73 @@ if st.session_state.functions and st.session_state.stakeholders:
         except Exception as e:
             st.error(f"Cannot export to PowerPoint: {str(e)}")
     
+    with col3:
+        st.markdown("**Export for Data Pipelines**")
+        try:
+            with timed_stage('export_parquet'):
+                parquet_buffer = cached_matrix_export(export_digest, 'parquet', False, export_df)
+            st.download_button(
+                label="🧱 Download Parquet File",
+                data=parquet_buffer,
+                file_name="raci_matrix.parquet",
+                mime="application/vnd.apache.parquet",
+                use_container_width=True
+            )
+        except Exception as e:
+            st.error(f"Cannot export to Parquet: {str(e)}")
+        
+        try:
+            with timed_stage('export_arrow'):
+                arrow_buffer = cached_matrix_export(export_digest, 'arrow', False, export_df)
+            st.download_button(
+                label="🏹 Download Arrow File",
+                data=arrow_buffer,
+                file_name="raci_matrix.arrow",
+                mime="application/vnd.apache.arrow.file",
+                use_container_width=True
+            )
+        except Exception as e:
+            st.error(f"Cannot export to Arrow: {str(e)}")
+
+    # Change log of every committed edit (written in the background, see record_audit_events)
+    st.divider()
+    st.subheader("📜 Change Log")
+    st.text_input("Your name", key="audit_user_name", placeholder=current_audit_user(),
+                  help="Recorded with every change you make; defaults to your sign-in email if available")
+    with st.form("change_log_form"):
+        col_scope, col_user, col_days = st.columns(3)
+        with col_scope:
+            change_log_scope = st.radio("Matrix", ["This matrix", "All matrices"], horizontal=True, key="change_log_scope")
+        with col_user:
+            change_log_user = st.text_input("Changed by", key="change_log_user", placeholder="Any user")
+        with col_days:
+            change_log_days = st.number_input("Last N days", min_value=1, value=7, step=1, key="change_log_days")
+        if st.form_submit_button("🔎 Show Changes", use_container_width=True):
+            from datetime import datetime, timedelta, timezone
+            with timed_stage('query_change_log'):
+                st.session_state.change_log_result = query_audit_log(
+                    matrix_id=session_audit_context('')['matrix_id'] if change_log_scope == "This matrix" else None,
+                    user=change_log_user.strip() or None,
+                    start=datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=int(change_log_days))
+                )
+    if st.session_state.get('change_log_result'):
+        success, message, change_events = st.session_state.change_log_result
+        if not success:
+            st.error(message)
+        elif change_events:
+            st.caption(message)
+            change_log_df = pd.DataFrame(change_events, columns=AUDIT_COLUMNS)
+            st.dataframe(change_log_df, use_container_width=True, hide_index=True, height=300)
+            st.download_button(
+                label="📥 Download Changes (CSV)",
+                data=change_log_df.to_csv(index=False),
+                file_name="raci_change_log.csv",
+                mime="text/csv",
+                key="download_change_log"
+            )
+        else:
+            st.info("No changes recorded for this selection.")
+
     # Snowflake Integration Section
     st.divider()
     st.subheader("💾 Snowflake Database")
@@ -1291,7 +1047,7 @@ if st.session_state.functions and st.session_state.stakeholders:
         st.info("💡 To use Snowflake storage, configure your credentials in Streamlit secrets. See documentation for setup instructions.")
     else:
         # Create tabs for Save, Load, and Manage
-        tab_save, tab_load, tab_manage = st.tabs(["💾 Save to Snowflake", "📥 Load from Snowflake", "🗂️ Manage Saved Matrices"])
+        tab_save, tab_load, tab_manage, tab_search = st.tabs(["💾 Save to Snowflake", "📥 Load from Snowflake", "🗂️ Manage Saved Matrices", "🔎 Search All Matrices"])
         
         with tab_save:
             st.markdown("**Save Current Matrix to Snowflake**")
@@ -1311,12 +1067,45 @@ if st.session_state.functions and st.session_state.stakeholders:
                     key="snowflake_created_by"
                 )
                 
+                # A matrix loaded from Snowflake is updated in place, guarded by the version it was loaded at
+                loaded_matrix = st.session_state.get('loaded_matrix')
+                update_existing = False
+                if loaded_matrix:
+                    st.caption(f"Loaded from Snowflake: **{loaded_matrix['matrix_name']}** (version {loaded_matrix['version']})")
+                    save_mode = st.radio(
+                        "Save as",
+                        options=["update", "new"],
+                        format_func=lambda mode: "Update the loaded matrix" if mode == "update" else "New matrix",
+                        key="snowflake_save_mode",
+                        horizontal=True
+                    )
+                    update_existing = save_mode == "update"
+                
                 if st.button("💾 Save to Snowflake", use_container_width=True, type="primary"):
-                    if not matrix_name:
+                    if not matrix_name and not update_existing:
                         st.error("Please enter a matrix name.")
+                    elif update_existing:
+                        with st.spinner("Saving to Snowflake..."):
+                            success, message, new_version, conflict = update_snowflake_matrix(
+                                loaded_matrix['matrix_id'],
+                                loaded_matrix['version'],
+                                matrix_name or loaded_matrix['matrix_name'],
+                                st.session_state.functions,
+                                st.session_state.stakeholders,
+                                st.session_state.raci_data,
+                                created_by
+                            )
+                            if success:
+                                loaded_matrix['version'] = new_version
+                                loaded_matrix['matrix_name'] = matrix_name or loaded_matrix['matrix_name']
+                                st.success(message)
+                            elif conflict:
+                                st.error(f"⚠️ Not saved: {message}")
+                            else:
+                                st.error(message)
                     else:
                         with st.spinner("Saving to Snowflake..."):
-                            success, message = save_to_snowflake(
+                            success, message, matrix_id = save_to_snowflake(
                                 matrix_name,
                                 st.session_state.functions,
                                 st.session_state.stakeholders,
@@ -1324,13 +1113,14 @@ if st.session_state.functions and st.session_state.stakeholders:
                                 created_by
                             )
                             if success:
+                                st.session_state.loaded_matrix = {'matrix_id': matrix_id, 'matrix_name': matrix_name, 'version': 1}
                                 st.success(message)
                             else:
                                 st.error(message)
         
         with tab_load:
             st.markdown("**Load Matrix from Snowflake**")
-            with st.spinner("Loading saved matrices..."):
+            with st.spinner("Loading saved matrices..."), timed_stage('snowflake_list_matrices'):
                 success, error, matrices = list_snowflake_matrices()
             
             if not success:
@@ -1351,11 +1141,17 @@ if st.session_state.functions and st.session_state.stakeholders:
                     if st.button("📥 Load Selected Matrix", use_container_width=True, type="primary"):
                         matrix_id = matrix_options[selected_matrix]
                         with st.spinner("Loading matrix..."):
-                            success, message, functions, stakeholders, raci_data = load_from_snowflake(matrix_id)
+                            success, message, functions, stakeholders, raci_data, version = load_from_snowflake(matrix_id)
                             if success:
                                 st.session_state.functions = functions
                                 st.session_state.stakeholders = stakeholders
-                                st.session_state.raci_data = raci_data.fillna('')
+                                # Through commit_raci_edits, so a shared room gets the loaded matrix too
+                                commit_raci_edits(raci_data.fillna(''), source='snowflake_load')
+                                st.session_state.loaded_matrix = {
+                                    'matrix_id': matrix_id,
+                                    'matrix_name': next(m['matrix_name'] for m in matrices if m['matrix_id'] == matrix_id),
+                                    'version': version
+                                }
                                 st.success(message)
                                 st.rerun()
                             else:
@@ -1369,12 +1165,13 @@ if st.session_state.functions and st.session_state.stakeholders:
                         st.markdown("**Matrix Details:**")
                         st.write(f"**Name:** {selected_matrix_info['matrix_name']}")
                         st.write(f"**Created:** {selected_matrix_info['created_at']}")
-                        st.write(f"**Updated:** {selected_matrix_info['updated_at']}")
+                        st.write(f"**Updated:** {selected_matrix_info['updated_at']} by {selected_matrix_info['updated_by']}")
                         st.write(f"**Created By:** {selected_matrix_info['created_by']}")
+                        st.write(f"**Version:** {selected_matrix_info['version']}")
         
         with tab_manage:
             st.markdown("**Manage Saved Matrices**")
-            with st.spinner("Loading saved matrices..."):
+            with st.spinner("Loading saved matrices..."), timed_stage('snowflake_list_matrices'):
                 success, error, matrices = list_snowflake_matrices()
             
             if not success:
@@ -1389,18 +1186,70 @@ if st.session_state.functions and st.session_state.stakeholders:
                         with col_info:
                             st.write(f"**Matrix ID:** `{matrix['matrix_id']}`")
                             st.write(f"**Created:** {matrix['created_at']}")
-                            st.write(f"**Updated:** {matrix['updated_at']}")
+                            st.write(f"**Updated:** {matrix['updated_at']} by {matrix['updated_by']}")
                             st.write(f"**Created By:** {matrix['created_by']}")
+                            st.write(f"**Version:** {matrix['version']}")
                         with col_delete:
                             if st.button("🗑️ Delete", key=f"delete_{matrix['matrix_id']}", use_container_width=True):
                                 with st.spinner("Deleting..."):
-                                    success, message = delete_from_snowflake(matrix['matrix_id'])
+                                    success, message = delete_from_snowflake(matrix['matrix_id'], matrix['version'])
                                     if success:
+                                        if (st.session_state.get('loaded_matrix') or {}).get('matrix_id') == matrix['matrix_id']:
+                                            st.session_state.loaded_matrix = None
                                         st.success(message)
                                         st.rerun()
                                     else:
                                         st.error(message)
     
+        with tab_search:
+            st.markdown("**Search Stakeholders and Functions Across All Saved Matrices**")
+            with st.form("matrix_search_form"):
+                col_query, col_field, col_role = st.columns([3, 1, 1])
+                with col_query:
+                    search_name = st.text_input("Name contains", key="matrix_search_name")
+                with col_field:
+                    search_field = st.selectbox("Search in", options=["Stakeholder", "Function"], key="matrix_search_field")
+                with col_role:
+                    search_role = st.selectbox(
+                        "Role",
+                        options=[''] + list(RACI_LABELS.keys()),
+                        format_func=lambda letter: RACI_LABELS.get(letter, 'Any role'),
+                        key="matrix_search_role"
+                    )
+                submitted_search = st.form_submit_button("🔎 Search", use_container_width=True, type="primary")
+            
+            if submitted_search:
+                if not search_name.strip():
+                    st.warning("Please enter a name to search for.")
+                else:
+                    with st.spinner("Searching..."), timed_stage('snowflake_search_index'):
+                        success, error, hits = search_matrix_index(search_name, search_field.lower(), search_role or None)
+                    if not success:
+                        st.error(error)
+                    elif not hits:
+                        st.info("No matching assignments found. Matrices saved before search was available may need indexing below.")
+                    else:
+                        st.caption(f"{len(hits)} matching assignment(s)")
+                        st.dataframe(pd.DataFrame(hits).drop(columns=['matrix_id']), use_container_width=True, hide_index=True)
+            
+            col_index, col_compact = st.columns(2)
+            with col_index:
+                if st.button("🔁 Index Older Matrices", help="Add matrices saved before search was available to the search index"):
+                    with st.spinner("Indexing saved matrices..."):
+                        success, message = backfill_matrix_index()
+                        if success:
+                            st.success(message)
+                        else:
+                            st.error(message)
+            with col_compact:
+                if st.button("🗜️ Compact Older Matrices", help="Rewrite matrices saved by earlier versions in the compact storage format"):
+                    with st.spinner("Compacting saved matrices..."):
+                        success, message = compact_saved_matrices()
+                        if success:
+                            st.success(message)
+                        else:
+                            st.error(message)
+    
     # Legend
     st.divider()
     st.markdown("**Legend:**")
@@ -1417,3 +1266,10 @@ if st.session_state.functions and st.session_state.stakeholders:
 else:
     st.info("👆 Start by importing a previously exported file or adding functions and stakeholders above to create your RACI matrix.")
 
+# Autosave the matrix in the background so a dropped session can resume it
+autosave_session_snapshot()
+
+# Per-rerun performance breakdown (reruns cut short by st.rerun() are flushed on the next run)
+perf_summary = finish_rerun_metrics()
+if PERF_PANEL_ENABLED:
+    render_performance_panel(perf_summary)
@@ -0,0 +1,3929 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+from io import BytesIO
+from pptx import Presentation
+from pptx.util import Inches, Pt
+from pptx.enum.text import PP_ALIGN
+from pptx.dml.color import RGBColor
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+import os
+import re
+import json
+import time
+import logging
+import threading
+import hashlib
+import functools
+import weakref
+from collections import Counter
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# RACI options - keys are what get stored, values are what display in dropdown
+RACI_OPTIONS = {
+    '': '',
+    'R': 'R - Responsible',
+    'A': 'A - Accountable',
+    'C': 'C - Consulted',
+    'I': 'I - Informed'
+}
+
+# RACI labels for display (maps letter to full label)
+RACI_LABELS = {
+    'R': 'R - Responsible',
+    'A': 'A - Accountable',
+    'C': 'C - Consulted',
+    'I': 'I - Informed'
+}
+
+# Functions named 'Process > Sub-process > Task' are grouped by their leading parts
+FUNCTION_GROUP_SEPARATOR = ' > '
+
+# Color scheme for RACI
+RACI_COLORS = {
+    'R': '#FFE5B4',  # Light orange
+    'A': '#FFB6C1',  # Light pink
+    'C': '#B0E0E6',  # Powder blue
+    'I': '#E0E0E0'   # Light gray
+}
+
+# Role codes for vectorized analysis - index in this list is the code stored (0 = unassigned)
+RACI_CODES = ['', 'R', 'A', 'C', 'I']
+RACI_CODE_LOOKUP = {letter: code for code, letter in enumerate(RACI_CODES) if letter}
+
+def encode_raci_codes(df, strict=False):
+    """Convert a RACI DataFrame to an int8 array of role codes (0 = empty, 1-4 = R/A/C/I).
+
+    A cell's role is the first letter of its stripped value, the same rule the
+    Visual Matrix and exporters use for coloring. With strict=True only 'A' or
+    'A - ...' style values count, as validation always has.
+    """
+    codes = np.zeros(df.shape, dtype=np.int8)
+    for col_idx in range(df.shape[1]):
+        codes[:, col_idx] = encode_role_values(df.iloc[:, col_idx], strict)
+    return codes
+
+def role_code(value, strict=False):
+    """Role code for a single cell value"""
+    val_str = str(value).strip()
+    letter = val_str[:1]
+    if strict and val_str != letter and not val_str.startswith(f"{letter} -"):
+        return 0
+    return RACI_CODE_LOOKUP.get(letter, 0)
+
+def encode_role_values(values, strict=False):
+    """Role codes for a 1-D sequence of cell values"""
+    # Factorize so the string logic runs once per distinct value, not once per cell
+    value_codes, uniques = pd.factorize(values)
+    lookup = np.array([role_code(val, strict) for val in uniques] + [0], dtype=np.int8)
+    return lookup[value_codes]  # NaN factorizes to -1, i.e. the trailing 0
+
+def raci_cell_styles(df, codes):
+    """Per-cell background CSS for the Visual Matrix, looked up from role codes"""
+    role_styles = np.array([''] + [f'background-color: {RACI_COLORS[letter]}' for letter in RACI_CODES[1:]], dtype=object)
+    return pd.DataFrame(role_styles[codes], index=df.index, columns=df.columns)
+
+def raci_matrix_digest(df, codes):
+    """Digest of a matrix's labels and role codes, used as a cache key"""
+    digest = hashlib.sha1(json.dumps([[str(f) for f in df.index], [str(s) for s in df.columns]]).encode('utf-8'))
+    digest.update(np.ascontiguousarray(codes).tobytes())
+    return digest.hexdigest()
+
+def _codes_memo_key(strict):
+    return 'raci_strict_codes_memo' if strict else 'raci_codes_memo'
+
+def get_raci_codes(df, strict=False):
+    """Role codes and digest for df, memoized per DataFrame object in session state.
+
+    The session matrix is always replaced (never edited in place), so object
+    identity tells us when the codes need to be recomputed. Strict codes (see
+    encode_raci_codes), as validation uses, are memoized separately.
+    """
+    memo = st.session_state.get(_codes_memo_key(strict))
+    if memo is not None and memo['ref']() is df:
+        return memo['codes'], memo['digest']
+    with timed_stage('encode_codes'):
+        codes = encode_raci_codes(df, strict)
+        digest = raci_matrix_digest(df, codes)
+    st.session_state[_codes_memo_key(strict)] = {'ref': weakref.ref(df), 'codes': codes, 'digest': digest}
+    return codes, digest
+
+def carry_raci_codes(old_df, new_df, changed_mask):
+    """Memoize new_df's role codes by re-encoding only its changed cells, if old_df's are memoized"""
+    if changed_mask is None:
+        return
+    rows, cols = np.nonzero(changed_mask)
+    changed_values = new_df.to_numpy(dtype=object)[rows, cols]
+    for strict in (False, True):
+        memo = st.session_state.get(_codes_memo_key(strict))
+        if memo is None or memo['ref']() is not old_df or memo['codes'].shape != new_df.shape:
+            continue
+        codes = memo['codes'].copy()
+        if len(rows):
+            codes[rows, cols] = encode_role_values(changed_values, strict)
+        st.session_state[_codes_memo_key(strict)] = {'ref': weakref.ref(new_df), 'codes': codes,
+                                                     'digest': raci_matrix_digest(new_df, codes)}
+
+def diff_raci_frames(before, after):
+    """Boolean mask of cells that differ between two same-shaped matrices (None if the structure differs)"""
+    if before.shape != after.shape or \
+       not before.index.equals(after.index) or not before.columns.equals(after.columns):
+        return None
+    return before.to_numpy(dtype=object) != after.to_numpy(dtype=object)
+
+def assign_cells(df, cells):
+    """Write {(function, stakeholder): value} into df in one vectorized assignment"""
+    if not cells or df.empty:
+        return df
+    keys = list(cells.keys())
+    rows = df.index.get_indexer([key[0] for key in keys])
+    cols = df.columns.get_indexer([key[1] for key in keys])
+    found = (rows >= 0) & (cols >= 0)
+    values = df.to_numpy(dtype=object).copy()
+    values[rows[found], cols[found]] = np.array([cells[key] for key in keys], dtype=object)[found]
+    return pd.DataFrame(values, index=df.index, columns=df.columns)
+
+def commit_raci_edits(new_df, changed_mask=None, source='editor', renamed=None):
+    """Replace the session matrix with an edited copy in a single step.
+
+    Every way of changing cells (editor, imports, bulk operations) goes through
+    here so derived state is refreshed once per batch rather than once per cell.
+    renamed ({axis: {old: new}}) lets the change log record renames as such.
+    """
+    changed_cells = int(changed_mask.sum()) if changed_mask is not None else None
+    if source != 'collab':
+        publish_session_changes(st.session_state.raci_data, new_df, changed_mask)
+        # Other sessions' edits are logged by the session that made them
+        record_session_changes(st.session_state.raci_data, new_df, changed_mask, source, renamed)
+    carry_raci_codes(st.session_state.raci_data, new_df, changed_mask)
+    st.session_state.raci_data = new_df
+    st.session_state.raci_data_version = st.session_state.get('raci_data_version', 0) + 1
+    st.session_state.last_commit = {'source': source, 'changed_cells': changed_cells}
+    count_metric('committed_cells', changed_cells or 0)
+    return changed_cells
+
+def create_raci_matrix(functions, stakeholders):
+    """Create an empty RACI matrix DataFrame"""
+    if not functions or not stakeholders:
+        return pd.DataFrame()
+    
+    # Create matrix with functions as rows and stakeholders as columns
+    matrix = pd.DataFrame(
+        index=functions,
+        columns=stakeholders,
+        data=''
+    )
+    return matrix
+
+def sync_matrix_structure():
+    """Reshape the session matrix to the current function/stakeholder lists, keeping existing assignments.
+
+    Returns True if the matrix changed.
+    """
+    df = st.session_state.raci_data
+    functions, stakeholders = st.session_state.functions, st.session_state.stakeholders
+    if not df.empty and list(df.index) == functions and list(df.columns) == stakeholders:
+        return False
+    
+    # Labels are matched on their stripped text (imports keep the raw header text)
+    labeled = df.set_axis([str(f).strip() for f in df.index], axis=0).set_axis([str(s).strip() for s in df.columns], axis=1)
+    if df.empty or not labeled.index.is_unique or not labeled.columns.is_unique:
+        new_df = create_raci_matrix(functions, stakeholders)
+    else:
+        new_df = labeled.reindex(index=functions, columns=stakeholders, fill_value='')
+    commit_raci_edits(new_df, source='structure')
+    return True
+
+def validate_raci_row(row_data):
+    """Validate that a row has at most one 'A' (Accountable) role"""
+    accountable_count = sum(1 for val in row_data if str(val).strip() == 'A')
+    return accountable_count <= 1
+
+def validate_raci_matrix(df, rules=None):
+    """Validate the entire RACI matrix against compiled rules (the default rules if None)"""
+    if rules is None:
+        rules = get_default_rules()
+    codes = encode_raci_codes(df, strict=True)
+    tables = build_rule_tables(rules, codes, df.index, df.columns)
+    return rule_violations(rules, tables, df.index, df.columns)
+
+def parse_raci_value(value):
+    """Parse RACI value from imported file - handles both formats"""
+    if pd.isna(value) or value == '':
+        return ''
+    
+    val_str = str(value).strip().upper()
+    
+    # If it's just a single letter, return it
+    if len(val_str) == 1 and val_str in ['R', 'A', 'C', 'I']:
+        return RACI_LABELS.get(val_str, val_str)
+    
+    # If it starts with a RACI letter, extract it
+    if val_str and val_str[0] in ['R', 'A', 'C', 'I']:
+        letter = val_str[0]
+        return RACI_LABELS.get(letter, letter)
+    
+    # Try to match full labels
+    val_lower = val_str.lower()
+    if 'responsible' in val_lower:
+        return RACI_LABELS['R']
+    elif 'accountable' in val_lower:
+        return RACI_LABELS['A']
+    elif 'consulted' in val_lower:
+        return RACI_LABELS['C']
+    elif 'informed' in val_lower:
+        return RACI_LABELS['I']
+    
+    return ''
+
+# Legend rows look like "Legend:" / "R = Responsible"; data cells holding role words are treated the same way
+LEGEND_LABEL_PATTERNS = ['legend', 'r =', 'a =', 'c =', 'i =', 'responsible', 'accountable', 'consulted', 'informed']
+LEGEND_CONTENT_PATTERNS = ['r =', 'a =', 'c =', 'i =', 'responsible', 'accountable', 'consulted', 'informed']
+IMPORT_REPORT_MAX_DETAILS = 1000
+
+def new_import_report(file_name=None):
+    """Empty import diagnostics report (filled in by parse_uploaded_file / normalize_raci_frame)"""
+    return {
+        'file_name': file_name,
+        'success': None,
+        'message': None,
+        'stage': None,
+        'input_shape': None,
+        'output_shape': None,
+        'dropped_rows': [],
+        'dropped_columns': [],
+        'coerced_cells': [],
+        'coerced_cell_count': 0,
+        'timings': {},
+        'error': None
+    }
+
+def _is_legend_label(label):
+    """Check if a row label looks like a legend row (e.g. 'Legend:' or 'R = Responsible')"""
+    label_str = str(label).strip().lower()
+    return any(pattern in label_str for pattern in LEGEND_LABEL_PATTERNS) or '=' in label_str
+
+def _is_unnamed_label(label):
+    """Check if a row label or column header is blank, NaN/None or a pandas 'Unnamed: n' placeholder"""
+    label_str = str(label).strip()
+    return 'unnamed' in label_str.lower() or not label_str or label_str.lower() in ['nan', 'none', '']
+
+def _drop_rows(report, labels, positions, reason):
+    """Record dropped rows in the import report"""
+    for position in positions:
+        if len(report['dropped_rows']) < IMPORT_REPORT_MAX_DETAILS:
+            report['dropped_rows'].append({'row': str(labels[position]), 'position': int(position), 'reason': reason})
+
+def normalize_raci_frame(df, report=None):
+    """Clean up a raw spreadsheet frame (functions as index, stakeholders as columns).
+
+    Drops legend, unnamed and empty rows/columns and converts cells to full RACI labels.
+    Returns (success, message, functions, stakeholders, raci_df) without touching session
+    state; pass a report from new_import_report() to collect what was dropped and why.
+    """
+    report = report if report is not None else new_import_report()
+    report['input_shape'] = list(df.shape)
+    report['stage'] = 'filter'
+    filter_start = time.perf_counter()
+    
+    # Check if DataFrame is empty
+    if df.empty:
+        return False, "The uploaded file appears to be empty.", None, None, None
+    
+    labels = list(df.index)
+    keep_rows = np.ones(len(labels), dtype=bool)
+    
+    # Drop rows whose label is missing or blank, then legend and unnamed rows
+    missing = np.array([pd.isna(label) or str(label).strip() == '' for label in labels], dtype=bool)
+    _drop_rows(report, labels, np.nonzero(missing)[0], 'missing function name')
+    keep_rows &= ~missing
+    legend_labels = keep_rows & np.array([_is_legend_label(label) for label in labels], dtype=bool)
+    _drop_rows(report, labels, np.nonzero(legend_labels)[0], 'legend row')
+    keep_rows &= ~legend_labels
+    unnamed_labels = keep_rows & np.array([_is_unnamed_label(label) for label in labels], dtype=bool)
+    _drop_rows(report, labels, np.nonzero(unnamed_labels)[0], 'unnamed row')
+    keep_rows &= ~unnamed_labels
+    
+    # Classify each distinct cell value once per column, then work on boolean grids
+    num_rows, num_cols = df.shape
+    present = np.zeros((num_rows, num_cols), dtype=bool)      # not NaN/None
+    non_empty = np.zeros((num_rows, num_cols), dtype=bool)    # present and not blank
+    has_legend_text = np.zeros((num_rows, num_cols), dtype=bool)
+    ends_with_letter = np.zeros((num_rows, num_cols), dtype=bool)
+    starts_with_equals = np.zeros((num_rows, num_cols), dtype=bool)
+    parsed = np.empty((num_rows, num_cols), dtype=object)
+    for col_idx in range(num_cols):
+        value_codes, uniques = pd.factorize(df.iloc[:, col_idx])
+        lowered = [str(val).strip().lower() for val in uniques]
+        present[:, col_idx] = value_codes >= 0
+        non_empty[:, col_idx] = np.array([bool(val) for val in lowered] + [False])[value_codes]
+        has_legend_text[:, col_idx] = np.array([any(p in val for p in LEGEND_CONTENT_PATTERNS) for val in lowered] + [False])[value_codes]
+        ends_with_letter[:, col_idx] = np.array([val[-1:] in ('r', 'a', 'c', 'i') for val in lowered] + [False])[value_codes]
+        starts_with_equals[:, col_idx] = np.array([val[:1] == '=' for val in lowered] + [False])[value_codes]
+        parsed[:, col_idx] = np.array([parse_raci_value(val) for val in uniques] + [''], dtype=object)[value_codes]
+    
+    # A legend can also span cells ("R" | "= Responsible"): the row's present values joined
+    # with spaces contain "r =" when a cell ending in r/a/c/i is followed by one starting with "="
+    column_positions = np.where(present, np.arange(num_cols), num_cols)
+    next_present = np.minimum.accumulate(column_positions[:, ::-1], axis=1)[:, ::-1]
+    next_present = np.concatenate([next_present[:, 1:], np.full((num_rows, 1), num_cols)], axis=1)
+    padded_equals = np.concatenate([starts_with_equals, np.zeros((num_rows, 1), dtype=bool)], axis=1)
+    spans_legend = present & ends_with_letter & np.take_along_axis(padded_equals, next_present, axis=1)
+    
+    legend_content = keep_rows & (has_legend_text.any(axis=1) | spans_legend.any(axis=1))
+    _drop_rows(report, labels, np.nonzero(legend_content)[0], 'legend content')
+    keep_rows &= ~legend_content
+    empty_rows = keep_rows & ~non_empty.any(axis=1)
+    _drop_rows(report, labels, np.nonzero(empty_rows)[0], 'no values')
+    keep_rows &= ~empty_rows
+    
+    if not keep_rows.any():
+        report['timings']['filter'] = time.perf_counter() - filter_start
+        return False, "No valid data rows found after filtering legend. Please ensure your file contains function names in the first column.", None, None, None
+    
+    # Extract functions from index (first column) - now filtered
+    row_positions = np.nonzero(keep_rows)[0]
+    functions = [str(labels[position]).strip() for position in row_positions]
+    
+    # Keep columns with a real header, and of those the ones with at least one value
+    headers = list(df.columns)
+    valid_cols = [col_idx for col_idx, col in enumerate(headers) if not _is_unnamed_label(col)]
+    has_values = non_empty[row_positions].any(axis=0)
+    cols_with_data = [col_idx for col_idx in valid_cols if has_values[col_idx]]
+    kept_cols = cols_with_data if cols_with_data else valid_cols
+    for col_idx, col in enumerate(headers):
+        if col_idx not in kept_cols and len(report['dropped_columns']) < IMPORT_REPORT_MAX_DETAILS:
+            reason = 'unnamed or blank header' if _is_unnamed_label(col) else 'no values'
+            report['dropped_columns'].append({'column': str(col), 'position': col_idx, 'reason': reason})
+    
+    # Extract stakeholders from remaining valid columns
+    stakeholders = [str(headers[col_idx]).strip() for col_idx in kept_cols]
+    report['timings']['filter'] = time.perf_counter() - filter_start
+    
+    if not functions:
+        return False, "No functions found in the file. Please ensure the first column contains function names.", None, None, None
+    
+    if not stakeholders:
+        return False, "No stakeholders found in the file. Please ensure the first row contains stakeholder names.", None, None, None
+    
+    # Parse RACI values - convert to full label format (already parsed once per distinct value above)
+    report['stage'] = 'normalize'
+    normalize_start = time.perf_counter()
+    kept_cells = np.ix_(row_positions, kept_cols)
+    raci_df = pd.DataFrame(parsed[kept_cells], index=df.index[row_positions], columns=df.columns[kept_cols])
+    
+    # Values that were present but not recognized as a RACI role end up empty
+    coerced = non_empty[kept_cells] & (parsed[kept_cells] == '')
+    report['coerced_cell_count'] = int(coerced.sum())
+    for row_offset, col_offset in zip(*np.nonzero(coerced)):
+        if len(report['coerced_cells']) >= IMPORT_REPORT_MAX_DETAILS:
+            break
+        report['coerced_cells'].append({
+            'function': functions[row_offset],
+            'stakeholder': stakeholders[col_offset],
+            'value': str(df.iat[row_positions[row_offset], kept_cols[col_offset]])
+        })
+    report['timings']['normalize'] = time.perf_counter() - normalize_start
+    report['output_shape'] = list(raci_df.shape)
+    
+    return True, f"Successfully imported {len(functions)} functions and {len(stakeholders)} stakeholders!", functions, stakeholders, raci_df
+
+def parse_uploaded_file(file_name, uploaded_file, report=None):
+    """Read and normalize an uploaded file without touching session state.
+
+    Returns (success, message, functions, stakeholders, raci_df). Pass a report from
+    new_import_report() to collect per-stage timings and dropped rows/columns.
+    """
+    report = report if report is not None else new_import_report(file_name)
+    report['stage'] = 'read'
+    read_start = time.perf_counter()
+    
+    # Reset file pointer to beginning
+    uploaded_file.seek(0)
+    
+    # Columnar files carry exact labels, so they skip the spreadsheet clean-up heuristics
+    if file_name.lower().endswith(PARQUET_EXTENSIONS + ARROW_EXTENSIONS):
+        functions, stakeholders, raci_df, metadata = read_columnar_matrix(uploaded_file, file_name)
+        report['timings']['read'] = time.perf_counter() - read_start
+        if not functions or not stakeholders:
+            return False, "The uploaded file has no functions or stakeholders.", None, None, None
+        report['input_shape'] = report['output_shape'] = list(raci_df.shape)
+        name_note = f" from '{metadata['raci:matrix_name']}'" if metadata.get('raci:matrix_name') else ""
+        return True, f"Successfully imported {len(functions)} functions and {len(stakeholders)} stakeholders{name_note}!", functions, stakeholders, raci_df
+    
+    # Determine file type and read accordingly
+    if file_name.endswith('.csv'):
+        df = pd.read_csv(uploaded_file, index_col=0)
+    elif file_name.endswith(('.xlsx', '.xls')):
+        # Try to read the first sheet
+        uploaded_file.seek(0)  # Reset again for Excel
+        df = pd.read_excel(uploaded_file, index_col=0, sheet_name=0)
+    else:
+        return False, "Unsupported file format. Please use Excel (.xlsx, .xls), CSV (.csv), Parquet (.parquet) or Arrow (.arrow) files.", None, None, None
+    report['timings']['read'] = time.perf_counter() - read_start
+    
+    return normalize_raci_frame(df, report)
+
+def run_import(parse, report):
+    """Run a parse step, recording its outcome (or the stage it failed in) in the report"""
+    try:
+        result = parse()
+    except Exception as e:
+        report['error'] = {'stage': report['stage'], 'type': type(e).__name__, 'message': str(e)}
+        result = (False, f"Error importing file: {str(e)}", None, None, None)
+    report['success'], report['message'] = result[0], result[1]
+    return result
+
+# Parsed imports are shared by every session in the process, keyed by a digest of the
+# file contents, so re-uploading a known template skips parsing entirely
+IMPORT_CACHE_MAX_ENTRIES = int(os.environ.get('RACI_IMPORT_CACHE_ENTRIES', '64'))
+IMPORT_CACHE_TTL_SECONDS = int(os.environ.get('RACI_IMPORT_CACHE_TTL', str(24 * 60 * 60)))
+
+def upload_digest(uploaded_file):
+    """SHA-256 of an uploaded file's contents"""
+    return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+
+# Set by a cached parser's body, which only runs on a cache miss, in the calling thread
+_import_parse_state = threading.local()
+
+@st.cache_data(max_entries=IMPORT_CACHE_MAX_ENTRIES, ttl=IMPORT_CACHE_TTL_SECONDS, show_spinner=False)
+def _cached_parse_upload(digest, file_name, _data):
+    _import_parse_state.parsed = True
+    count_metric('import_cache_misses')
+    report = new_import_report(file_name)
+    result = run_import(lambda: parse_uploaded_file(file_name, BytesIO(_data), report), report)
+    return result, report
+
+def cached_parse_upload(digest, file_name, data):
+    """parse_uploaded_file, cached by content digest (the bytes themselves are not hashed again).
+
+    Returns (result, report, cached), where cached tells whether the parse came from the
+    cache; failures are cached too since they depend only on the bytes.
+    """
+    _import_parse_state.parsed = False
+    result, report = _cached_parse_upload(digest, file_name, data)
+    return result, report, not _import_parse_state.parsed
+
+@st.cache_data(max_entries=IMPORT_CACHE_MAX_ENTRIES, ttl=IMPORT_CACHE_TTL_SECONDS, show_spinner=False)
+def cached_parse_workbook(digest, _data):
+    """import_workbook_sheets, cached by content digest"""
+    count_metric('import_cache_misses')
+    return import_workbook_sheets(BytesIO(_data))
+
+def import_from_spreadsheet(uploaded_file):
+    """Import RACI matrix from Excel or CSV file.
+
+    The diagnostics report for the import is left in st.session_state.last_import_report.
+    """
+    try:
+        (success, message, functions, stakeholders, raci_df), report, cached = cached_parse_upload(
+            upload_digest(uploaded_file), uploaded_file.name, uploaded_file.getvalue()
+        )
+        report['cached'] = cached
+        st.session_state.last_import_report = report
+        if not success:
+            return False, message
+        
+        # Update session state
+        st.session_state.functions = functions
+        st.session_state.stakeholders = stakeholders
+        commit_raci_edits(raci_df, source='import')
+        # Large imports often bring near-duplicate names; offer them for merging
+        st.session_state.name_merge_suggestions = find_name_merge_suggestions(functions, stakeholders)
+        
+        return True, message
+        
+    except Exception as e:
+        return False, f"Error importing file: {str(e)}"
+
+def render_import_report(report):
+    """Show an import diagnostics report (single file or per-sheet workbook report)"""
+    for sheet_report in report.get('sheets', [report]):
+        if 'sheets' in report:
+            st.markdown(f"**Sheet: {sheet_report['file_name']}**")
+        if sheet_report.get('error'):
+            error = sheet_report['error']
+            st.error(f"Failed during '{error['stage']}' ({error['type']}): {error['message']}")
+        
+        metric_cols = st.columns(4)
+        metric_cols[0].metric("Rows dropped", len(sheet_report['dropped_rows']))
+        metric_cols[1].metric("Columns dropped", len(sheet_report['dropped_columns']))
+        metric_cols[2].metric("Values cleared", sheet_report['coerced_cell_count'])
+        metric_cols[3].metric("Total time", f"{sum(sheet_report['timings'].values()) * 1000:.0f} ms")
+        
+        if sheet_report['timings']:
+            st.caption(" · ".join(f"{stage}: {seconds * 1000:.1f} ms" for stage, seconds in sheet_report['timings'].items())
+                       + (" (cached)" if sheet_report.get('cached') else ""))
+        if sheet_report['dropped_rows']:
+            st.markdown("Dropped rows")
+            st.dataframe(pd.DataFrame(sheet_report['dropped_rows']), use_container_width=True, hide_index=True)
+        if sheet_report['dropped_columns']:
+            st.markdown("Dropped columns")
+            st.dataframe(pd.DataFrame(sheet_report['dropped_columns']), use_container_width=True, hide_index=True)
+        if sheet_report['coerced_cells']:
+            st.markdown("Values cleared (not R, A, C or I)")
+            st.dataframe(pd.DataFrame(sheet_report['coerced_cells']), use_container_width=True, hide_index=True)
+    
+    st.download_button(
+        label="📥 Download Report (JSON)",
+        data=json.dumps(report, indent=2, default=str),
+        file_name="import_report.json",
+        mime="application/json",
+        key="download_import_report"
+    )
+
+def import_workbook_sheets(uploaded_file, max_workers=None):
+    """Parse every sheet of an Excel workbook into its own matrix.
+
+    The workbook is read in a single pass, then the sheets are cleaned up concurrently.
+    Returns one dict per sheet (sheet, success, message, functions, stakeholders, raci_data,
+    report) in workbook order; nothing is written to session state.
+    """
+    uploaded_file.seek(0)
+    read_start = time.perf_counter()
+    sheets = pd.read_excel(uploaded_file, index_col=0, sheet_name=None)
+    read_seconds = time.perf_counter() - read_start
+    
+    def normalize_sheet(item):
+        sheet_name, sheet_df = item
+        report = new_import_report(str(sheet_name))
+        report['timings']['read'] = read_seconds
+        success, message, functions, stakeholders, raci_df = run_import(lambda: normalize_raci_frame(sheet_df, report), report)
+        return {
+            'sheet': str(sheet_name),
+            'success': success,
+            'message': message,
+            'functions': functions,
+            'stakeholders': stakeholders,
+            'raci_data': raci_df,
+            'report': report
+        }
+    
+    if not sheets:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers or min(8, len(sheets))) as pool:
+        return list(pool.map(normalize_sheet, sheets.items()))
+
+def store_active_sheet():
+    """Write the working matrix back into its workbook sheet before switching or exporting"""
+    active_sheet = st.session_state.get('active_sheet')
+    if active_sheet in st.session_state.get('workbook_sheets', {}):
+        st.session_state.workbook_sheets[active_sheet] = {
+            'functions': list(st.session_state.functions),
+            'stakeholders': list(st.session_state.stakeholders),
+            'raci_data': st.session_state.raci_data
+        }
+
+def switch_active_sheet():
+    """Selectbox callback: keep edits to the current sheet and load the newly selected one"""
+    store_active_sheet()
+    new_sheet = st.session_state.active_sheet_select
+    sheet = st.session_state.workbook_sheets[new_sheet]
+    st.session_state.functions = list(sheet['functions'])
+    st.session_state.stakeholders = list(sheet['stakeholders'])
+    commit_raci_edits(sheet['raci_data'], source='switch_sheet')
+    st.session_state.active_sheet = new_sheet
+
+def _write_raci_sheet(writer, df, sheet_name='RACI Matrix'):
+    """Write one formatted RACI matrix sheet into an open openpyxl ExcelWriter.
+
+    Grouped functions ('Process > Task') are written under a heading row per group,
+    as collapsible outline levels; the empty headings are skipped on re-import.
+    """
+    outline = function_outline(df.index)
+    if outline is not None:
+        positions, labels, levels = outline
+        is_function = positions >= 0
+        values = np.full((len(positions), df.shape[1]), '', dtype=object)
+        values[is_function] = df.to_numpy(dtype=object)[positions[is_function]]
+        df = pd.DataFrame(values, index=pd.Index(labels, dtype=object), columns=df.columns)
+    df.to_excel(writer, sheet_name=sheet_name, index=True)
+    worksheet = writer.sheets[sheet_name]
+    
+    # Set column widths
+    worksheet.column_dimensions['A'].width = 25
+    for col in range(2, len(df.columns) + 2):
+        worksheet.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 15
+    
+    # Style header row
+    header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+    header_font = Font(color='FFFFFF', bold=True, size=11)
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    
+    # Format header
+    for cell in worksheet[1]:
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+        cell.border = border
+    
+    # Format index column
+    index_fill = PatternFill(start_color='D9E1F2', end_color='D9E1F2', fill_type='solid')
+    index_font = Font(bold=True, size=11)
+    
+    for row in range(2, len(df) + 2):
+        cell = worksheet[f'A{row}']
+        cell.fill = index_fill
+        cell.font = index_font
+        cell.alignment = Alignment(horizontal='left', vertical='center')
+        cell.border = border
+    
+    # Resolve every cell's RACI letter at once; unrecognized values are written as-is
+    codes = encode_raci_codes(df)
+    display_values = _excel_cell_values(df, codes, [''] + [RACI_LABELS[letter] for letter in RACI_CODES[1:]])
+    
+    # Build the per-letter styles once instead of once per cell
+    cell_alignment = Alignment(horizontal='center', vertical='center')
+    letter_fills = {
+        code: PatternFill(start_color=RACI_COLORS[letter].replace('#', ''), end_color=RACI_COLORS[letter].replace('#', ''), fill_type='solid')
+        for code, letter in enumerate(RACI_CODES) if letter
+    }
+    letter_fonts = {code: Font(size=11, bold=(RACI_CODES[code] in ['R', 'A'])) for code in range(len(RACI_CODES))}
+    
+    # Format data cells with RACI colors
+    for row_offset in range(codes.shape[0]):
+        for col_offset in range(codes.shape[1]):
+            cell = worksheet.cell(row=row_offset + 2, column=col_offset + 2)
+            code = codes[row_offset, col_offset]
+            cell.value = display_values[row_offset, col_offset]
+            if code:
+                cell.fill = letter_fills[code]
+            cell.alignment = cell_alignment
+            cell.border = border
+            cell.font = letter_fonts[code]
+    
+    if outline is not None:
+        # Headings sit above their members, so collapsing a group leaves its heading visible
+        worksheet.sheet_properties.outlinePr.summaryBelow = False
+        heading_fill = PatternFill(start_color='B4C6E7', end_color='B4C6E7', fill_type='solid')
+        for row_offset in range(len(positions)):
+            row = row_offset + 2
+            if levels[row_offset]:
+                worksheet.row_dimensions[row].outline_level = int(levels[row_offset])
+            cell = worksheet.cell(row=row, column=1)
+            cell.alignment = Alignment(horizontal='left', vertical='center', indent=int(levels[row_offset]))
+            if positions[row_offset] < 0:
+                cell.fill = heading_fill
+    
+    # Add legend
+    legend_row = len(df) + 3
+    worksheet.cell(row=legend_row, column=1, value='Legend:')
+    worksheet.cell(row=legend_row, column=1).font = Font(bold=True, size=11)
+    
+    legend_items = ['R = Responsible', 'A = Accountable', 'C = Consulted', 'I = Informed']
+    for idx, item in enumerate(legend_items, start=2):
+        cell = worksheet.cell(row=legend_row, column=idx, value=item)
+        cell.font = Font(size=10)
+    return worksheet
+
+def _excel_cell_values(df, codes, role_labels):
+    """Text written for each cell: role_labels[code] for roles, the stripped value otherwise"""
+    display_values = np.array(role_labels, dtype=object)[codes]
+    for col_idx in np.nonzero((codes == 0).any(axis=0))[0]:
+        column = df.iloc[:, col_idx]
+        value_codes, uniques = pd.factorize(column)
+        if all(isinstance(val, str) for val in uniques):
+            stripped = np.array([str(val).strip() for val in uniques] + [''], dtype=object)[value_codes]
+            # Missing values (None/NaN) are written the way str() renders them, e.g. 'nan'
+            for row_idx in np.nonzero(value_codes == -1)[0]:
+                stripped[row_idx] = str(column.iat[row_idx]).strip()
+        else:
+            # Hash-equal values such as 0, 0.0 and False share one factorize entry but print differently
+            stripped = np.array([str(val).strip() for val in column], dtype=object)
+        unrecognized = codes[:, col_idx] == 0
+        display_values[unrecognized, col_idx] = stripped[unrecognized]
+    return display_values
+
+def _write_native_raci_sheet(workbook, df, sheet_name='RACI Matrix'):
+    """Write one matrix as role codes (R/A/C/I) into a write-only openpyxl workbook.
+
+    Colors come from one conditional-formatting rule per role and the dropdown from
+    one list validation over the whole grid, instead of a fill and font per cell, so
+    the sheet stays colored and valid when it is edited in Excel and re-imported.
+    """
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.formatting.rule import CellIsRule
+    from openpyxl.worksheet.datavalidation import DataValidation
+    
+    worksheet = workbook.create_sheet(sheet_name)
+    worksheet.column_dimensions['A'].width = 25
+    for col in range(2, len(df.columns) + 2):
+        worksheet.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 15
+    worksheet.freeze_panes = 'B2'
+    
+    codes = encode_raci_codes(df)
+    values = _excel_cell_values(df, codes, RACI_CODES)
+    labels = list(df.index)
+    outline = function_outline(df.index)
+    if outline is not None:
+        positions, labels, levels = outline
+        is_function = positions >= 0
+        grouped_values = np.full((len(positions), df.shape[1]), '', dtype=object)
+        grouped_values[is_function] = values[positions[is_function]]
+        values = grouped_values
+        worksheet.sheet_properties.outlinePr.summaryBelow = False
+        for row_offset in np.flatnonzero(levels):
+            worksheet.row_dimensions[int(row_offset) + 2].outline_level = int(levels[row_offset])
+    
+    def styled(value, font=None, fill=None):
+        cell = WriteOnlyCell(worksheet, value=value)
+        if font is not None:
+            cell.font = font
+        if fill is not None:
+            cell.fill = fill
+        return cell
+    
+    header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+    header_font = Font(color='FFFFFF', bold=True, size=11)
+    index_fill = PatternFill(start_color='D9E1F2', end_color='D9E1F2', fill_type='solid')
+    heading_fill = PatternFill(start_color='B4C6E7', end_color='B4C6E7', fill_type='solid')
+    index_font = Font(bold=True, size=11)
+    worksheet.append([None] + [styled(str(stakeholder), header_font, header_fill) for stakeholder in df.columns])
+    for row_offset, label in enumerate(labels):
+        is_heading = outline is not None and positions[row_offset] < 0
+        row_values = [value if value != '' else None for value in values[row_offset]]
+        worksheet.append([styled(str(label), index_font, heading_fill if is_heading else index_fill)] + row_values)
+    worksheet.append([])
+    worksheet.append([styled('Legend:', Font(bold=True, size=11))] + ['R = Responsible', 'A = Accountable', 'C = Consulted', 'I = Informed'])
+    
+    if df.shape[1] and len(labels):
+        grid = f"B2:{openpyxl.utils.get_column_letter(df.shape[1] + 1)}{len(labels) + 1}"
+        validation = DataValidation(
+            type='list', formula1='"' + ','.join(RACI_CODES[1:]) + '"', allow_blank=True,
+            showErrorMessage=True, errorTitle='Invalid role', error='Use R, A, C or I, or leave the cell empty.'
+        )
+        validation.add(grid)
+        worksheet.data_validations.append(validation)
+        for letter in RACI_CODES[1:]:
+            color = RACI_COLORS[letter].replace('#', '')
+            worksheet.conditional_formatting.add(grid, CellIsRule(
+                operator='equal', formula=[f'"{letter}"'],
+                fill=PatternFill(start_color=color, end_color=color, fill_type='solid'),
+                font=Font(bold=letter in ['R', 'A'])
+            ))
+    return worksheet
+
+def export_to_excel(df, filename='raci_matrix.xlsx', native=False):
+    """Export RACI matrix to Excel with formatting.
+
+    native=True writes role codes with a sheet-level dropdown and conditional
+    colors instead of per-cell styles (smaller, faster, stays valid after editing).
+    """
+    if df.empty:
+        raise ValueError("Cannot export empty matrix. Please add functions and stakeholders first.")
+    
+    output = BytesIO()
+    
+    try:
+        if native:
+            workbook = openpyxl.Workbook(write_only=True)
+            _write_native_raci_sheet(workbook, df, 'RACI Matrix')
+            workbook.save(output)
+        else:
+            with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                _write_raci_sheet(writer, df, 'RACI Matrix')
+    except Exception as e:
+        st.error(f"Error exporting to Excel: {str(e)}")
+        raise
+    
+    output.seek(0)
+    return output
+
+def export_workbook(matrices, native=False):
+    """Export several matrices (dict of sheet name -> DataFrame) into one formatted workbook in a single pass"""
+    matrices = {name: df for name, df in matrices.items() if not df.empty}
+    if not matrices:
+        raise ValueError("Cannot export empty matrices. Please add functions and stakeholders first.")
+    
+    output = BytesIO()
+    used_names = set()
+    try:
+        if native:
+            workbook = openpyxl.Workbook(write_only=True)
+            for name, df in matrices.items():
+                sheet_name = make_sheet_name(name, used_names)
+                used_names.add(sheet_name.lower())
+                _write_native_raci_sheet(workbook, df, sheet_name)
+            workbook.save(output)
+        else:
+            with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                for name, df in matrices.items():
+                    sheet_name = make_sheet_name(name, used_names)
+                    used_names.add(sheet_name.lower())
+                    _write_raci_sheet(writer, df, sheet_name)
+    except Exception as e:
+        st.error(f"Error exporting workbook: {str(e)}")
+        raise
+    
+    output.seek(0)
+    return output
+
+def make_sheet_name(name, used_names=()):
+    """Turn a matrix name into a valid, unique Excel sheet name (max 31 chars, no []:*?/\\)"""
+    base = re.sub(r'[\[\]:*?/\\]', '-', str(name)).strip().strip("'") or 'Sheet'
+    base = base[:31]
+    sheet_name, suffix = base, 2
+    while sheet_name.lower() in used_names:
+        tag = f" ({suffix})"
+        sheet_name, suffix = base[:31 - len(tag)] + tag, suffix + 1
+    return sheet_name
+
+def function_group(function_name):
+    """Top-level group of a function named like 'Process > Sub-process > Task' ('' if ungrouped)"""
+    parts = str(function_name).split(FUNCTION_GROUP_SEPARATOR)
+    return parts[0].strip() if len(parts) > 1 else ''
+
+def split_matrix_by_group(df, ungrouped_name='Other'):
+    """Split a matrix into one matrix per top-level function group, keeping row order"""
+    groups = pd.Series([function_group(f) or ungrouped_name for f in df.index], index=range(len(df.index)))
+    return {group: df.iloc[positions.to_numpy()] for group, positions in groups.groupby(groups, sort=False).groups.items()}
+
+def export_to_powerpoint(df, filename='raci_matrix.pptx', group_slides=True):
+    """Export RACI matrix to PowerPoint presentation.
+
+    With group_slides, a matrix of grouped functions ('Process > Task') gets one
+    slide per top-level group instead of one slide for everything.
+    """
+    if df.empty:
+        raise ValueError("Cannot export empty matrix. Please add functions and stakeholders first.")
+    
+    try:
+        prs = Presentation()
+        prs.slide_width = Inches(10)
+        prs.slide_height = Inches(7.5)
+        
+        if group_slides and any(function_group(f) for f in df.index):
+            for group, group_df in split_matrix_by_group(df).items():
+                # Rows are labelled relative to the slide's group
+                row_labels = [
+                    FUNCTION_GROUP_SEPARATOR.join(function_path(f)[1:]) if function_group(f) else str(f)
+                    for f in group_df.index
+                ]
+                _add_raci_slide(prs, group_df, f"RACI Matrix - {group}", row_labels)
+        else:
+            _add_raci_slide(prs, df, "RACI Matrix")
+        
+        output = BytesIO()
+        prs.save(output)
+        output.seek(0)
+        return output
+    except Exception as e:
+        st.error(f"Error exporting to PowerPoint: {str(e)}")
+        raise
+
+def _add_raci_slide(prs, df, title, row_labels=None):
+    """Add one slide with a color-coded RACI table for df"""
+    # Use blank layout
+    slide = prs.slides.add_slide(prs.slide_layouts[6])
+    
+    # Add title
+    title_left = Inches(0.5)
+    title_top = Inches(0.3)
+    title_width = Inches(9)
+    title_height = Inches(0.5)
+    
+    title_box = slide.shapes.add_textbox(title_left, title_top, title_width, title_height)
+    title_frame = title_box.text_frame
+    title_frame.text = title
+    title_para = title_frame.paragraphs[0]
+    title_para.font.size = Pt(24)
+    title_para.font.bold = True
+    title_para.alignment = PP_ALIGN.CENTER
+    
+    # Calculate table dimensions
+    table_left = Inches(0.5)
+    table_top = Inches(1)
+    table_width = Inches(9)
+    table_height = Inches(5)
+    
+    # Create table
+    num_rows = len(df) + 1  # +1 for header
+    num_cols = len(df.columns) + 1  # +1 for index column
+    
+    table = slide.shapes.add_table(num_rows, num_cols, table_left, table_top, table_width, table_height).table
+    
+    # Set column widths
+    index_col_width = table_width / num_cols * 1.5
+    data_col_width = (table_width - index_col_width) / (num_cols - 1)
+    
+    # Fill header row
+    table.cell(0, 0).text = "Function"
+    table.cell(0, 0).fill.solid()
+    table.cell(0, 0).fill.fore_color.rgb = RGBColor(54, 96, 146)
+    
+    for col_idx, stakeholder in enumerate(df.columns, start=1):
+        cell = table.cell(0, col_idx)
+        cell.text = stakeholder
+        cell.fill.solid()
+        cell.fill.fore_color.rgb = RGBColor(54, 96, 146)
+    
+    # Fill data rows
+    for row_idx, function in enumerate(df.index, start=1):
+        # Index column
+        table.cell(row_idx, 0).text = row_labels[row_idx - 1] if row_labels is not None else function
+        table.cell(row_idx, 0).fill.solid()
+        table.cell(row_idx, 0).fill.fore_color.rgb = RGBColor(217, 225, 242)
+        
+        # Data cells
+        for col_idx, stakeholder in enumerate(df.columns, start=1):
+            cell = table.cell(row_idx, col_idx)
+            value = str(df.loc[function, stakeholder]).strip()
+            
+            # Value could be just letter ('R') or full label ('R - Responsible')
+            # Extract the letter for color matching
+            raci_letter = ''
+            display_text = value
+            
+            if value:
+                # Check if it's a full label format
+                if value.startswith('R -') or value == 'R - Responsible':
+                    raci_letter = 'R'
+                    display_text = 'R - Responsible'
+                elif value.startswith('A -') or value == 'A - Accountable':
+                    raci_letter = 'A'
+                    display_text = 'A - Accountable'
+                elif value.startswith('C -') or value == 'C - Consulted':
+                    raci_letter = 'C'
+                    display_text = 'C - Consulted'
+                elif value.startswith('I -') or value == 'I - Informed':
+                    raci_letter = 'I'
+                    display_text = 'I - Informed'
+                elif len(value) == 1 and value in ['R', 'A', 'C', 'I']:
+                    # Just the letter - convert to full label
+                    raci_letter = value
+                    display_text = RACI_LABELS.get(value, value)
+                else:
+                    # Try to extract first character
+                    raci_letter = value[0] if len(value) > 0 else ''
+                    if raci_letter in RACI_LABELS:
+                        display_text = RACI_LABELS[raci_letter]
+            
+            cell.text = display_text
+            
+            # Apply color based on the letter
+            if raci_letter in RACI_COLORS:
+                color = RACI_COLORS[raci_letter]
+                rgb = tuple(int(color[i:i+2], 16) for i in (1, 3, 5))
+                cell.fill.solid()
+                cell.fill.fore_color.rgb = RGBColor(*rgb)
+    
+    # Format all cells with larger font
+    for row in range(num_rows):
+        for col in range(num_cols):
+            cell = table.cell(row, col)
+            # Increased font size for data cells (was Pt(10), now Pt(14))
+            # Header and index keep larger size
+            if row == 0 or col == 0:
+                # Header and index cells
+                cell.text_frame.paragraphs[0].font.size = Pt(12)
+                cell.text_frame.paragraphs[0].font.bold = True
+                if row == 0:
+                    cell.text_frame.paragraphs[0].font.color.rgb = RGBColor(255, 255, 255)
+                else:
+                    cell.text_frame.paragraphs[0].font.color.rgb = RGBColor(0, 0, 0)
+            else:
+                # Data cells - larger font
+                cell.text_frame.paragraphs[0].font.size = Pt(14)
+                cell.text_frame.paragraphs[0].font.bold = False
+            cell.text_frame.paragraphs[0].alignment = PP_ALIGN.CENTER
+    
+    # Add legend
+    legend_top = Inches(6.5)
+    legend_left = Inches(0.5)
+    legend_width = Inches(9)
+    legend_height = Inches(0.5)
+    
+    legend_box = slide.shapes.add_textbox(legend_left, legend_top, legend_width, legend_height)
+    legend_frame = legend_box.text_frame
+    legend_frame.text = "Legend: R = Responsible | A = Accountable | C = Consulted | I = Informed"
+    legend_para = legend_frame.paragraphs[0]
+    legend_para.font.size = Pt(9)
+    legend_para.alignment = PP_ALIGN.CENTER
+
+# ============================================================================
+# Columnar Exchange Format (Parquet / Arrow IPC)
+# ============================================================================
+
+# Files are one row per function: a 'Function' column followed by one dictionary-encoded
+# column of role codes ('', 'R', 'A', 'C', 'I') per stakeholder. Exact names and order
+# live in the schema metadata so round trips are lossless.
+COLUMNAR_FORMAT = 'raci-columnar'
+COLUMNAR_FORMAT_VERSION = '1'
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+def build_raci_arrow_table(df, matrix_name=''):
+    """Convert a RACI DataFrame to an Arrow table with dictionary-encoded role columns"""
+    import pyarrow as pa
+    from datetime import datetime, timezone
+    
+    codes = encode_raci_codes(df)
+    role_dictionary = pa.array(RACI_CODES, type=pa.string())
+    columns = [pa.array([str(f) for f in df.index], type=pa.string())]
+    for col_idx in range(codes.shape[1]):
+        columns.append(pa.DictionaryArray.from_arrays(pa.array(codes[:, col_idx], type=pa.int8()), role_dictionary))
+    
+    stakeholders = [str(s) for s in df.columns]
+    # Field names must be unique for Parquet readers; the exact names are kept in the metadata
+    field_names = ['Function']
+    for name in stakeholders:
+        field_name, suffix = name, 2
+        while field_name in field_names:
+            field_name, suffix = f"{name} ({suffix})", suffix + 1
+        field_names.append(field_name)
+    metadata = {
+        'raci:format': COLUMNAR_FORMAT,
+        'raci:version': COLUMNAR_FORMAT_VERSION,
+        'raci:matrix_name': matrix_name or '',
+        'raci:stakeholders': json.dumps(stakeholders),
+        'raci:exported_at': datetime.now(timezone.utc).isoformat(),
+    }
+    return pa.Table.from_arrays(columns, names=field_names, metadata=metadata)
+
+def export_to_parquet(df, matrix_name=''):
+    """Export RACI matrix to a compressed Parquet file"""
+    if df.empty:
+        raise ValueError("Cannot export empty matrix. Please add functions and stakeholders first.")
+    import pyarrow.parquet as pq
+    
+    output = BytesIO()
+    pq.write_table(build_raci_arrow_table(df, matrix_name), output, compression='zstd')
+    output.seek(0)
+    return output
+
+def export_to_arrow(df, matrix_name=''):
+    """Export RACI matrix to an Arrow IPC file (uncompressed, so it can be memory-mapped)"""
+    if df.empty:
+        raise ValueError("Cannot export empty matrix. Please add functions and stakeholders first.")
+    import pyarrow as pa
+    
+    table = build_raci_arrow_table(df, matrix_name)
+    output = BytesIO()
+    with pa.ipc.new_file(output, table.schema) as writer:
+        writer.write_table(table)
+    output.seek(0)
+    return output
+
+def decode_raci_arrow_table(table):
+    """Convert an Arrow table back to (functions, stakeholders, raci_df, metadata).
+
+    Role columns are decoded through their dictionaries, so parse_raci_value runs
+    once per distinct value. Plain string columns written by other tools work too.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    
+    metadata = {key.decode('utf-8'): value.decode('utf-8') for key, value in (table.schema.metadata or {}).items()}
+    if table.num_columns < 2:
+        raise ValueError("Expected a function column followed by at least one stakeholder column.")
+    
+    functions = [str(f) for f in table.column(0).to_pylist()]
+    if 'raci:stakeholders' in metadata:
+        stakeholders = json.loads(metadata['raci:stakeholders'])
+    else:
+        stakeholders = [str(name) for name in table.column_names[1:]]
+    
+    cells = np.empty((table.num_rows, table.num_columns - 1), dtype=object)
+    for col_idx in range(1, table.num_columns):
+        column = table.column(col_idx).combine_chunks()
+        if not pa.types.is_dictionary(column.type):
+            column = pc.dictionary_encode(column.cast(pa.string()))
+        labels = np.array([parse_raci_value(val) for val in column.dictionary.to_pylist()] + [''], dtype=object)
+        # Nulls index the trailing '' entry
+        indices = column.indices.fill_null(len(labels) - 1).to_numpy(zero_copy_only=False)
+        cells[:, col_idx - 1] = labels[indices]
+    
+    raci_df = pd.DataFrame(cells, index=functions, columns=stakeholders)
+    return functions, stakeholders, raci_df, metadata
+
+def read_columnar_matrix(source, file_name=None):
+    """Read a Parquet or Arrow IPC matrix from a path or an in-memory file.
+
+    Paths are memory-mapped, so only the pages that are actually decoded are read from disk.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    name = str(file_name or source).lower()
+    if isinstance(source, (str, os.PathLike)):
+        if name.endswith(PARQUET_EXTENSIONS):
+            table = pq.read_table(source, memory_map=True)
+        else:
+            with pa.memory_map(str(source), 'r') as mapped:
+                table = pa.ipc.open_file(mapped).read_all()
+    else:
+        source.seek(0)
+        buffer = pa.py_buffer(source.read())
+        if name.endswith(PARQUET_EXTENSIONS):
+            table = pq.read_table(pa.BufferReader(buffer))
+        else:
+            table = pa.ipc.open_file(pa.BufferReader(buffer)).read_all()
+    return decode_raci_arrow_table(table)
+
+# ============================================================================
+# Export Cache
+# ============================================================================
+
+# Downloads are built on every rerun that draws the export buttons, so each file is
+# cached by the matrix digest and rebuilt only when the matrix itself changes.
+# The digest covers role codes, not cell text, so files are built from the labels of
+# those codes; two matrices with the same digest always give the same file.
+EXPORT_CACHE_MAX_ENTRIES = int(os.environ.get('RACI_EXPORT_CACHE_ENTRIES', '16'))
+
+def _export_frame(df):
+    """df with every cell rewritten as the label of its role code"""
+    labels = np.array([RACI_OPTIONS[letter] for letter in RACI_CODES], dtype=object)
+    export_df = pd.DataFrame(labels[encode_raci_codes(df)], index=df.index, columns=df.columns)
+    export_df.index.name = df.index.name
+    return export_df
+
+@st.cache_data(max_entries=EXPORT_CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_matrix_export(digest, export_format, native, _df):
+    """File bytes for one export format of a matrix, cached by its digest"""
+    count_metric('export_cache_misses')
+    _df = _export_frame(_df)
+    exporters = {
+        'xlsx': lambda: export_to_excel(_df, native=native),
+        'split_xlsx': lambda: export_workbook(split_matrix_by_group(_df), native=native),
+        'pptx': lambda: export_to_powerpoint(_df),
+        'parquet': lambda: export_to_parquet(_df),
+        'arrow': lambda: export_to_arrow(_df),
+        'csv': lambda: BytesIO(_df.to_csv().encode('utf-8')),
+    }
+    return exporters[export_format]().getvalue()
+
+@st.cache_data(max_entries=EXPORT_CACHE_MAX_ENTRIES, show_spinner=False)
+def cached_workbook_export(sheet_digests, native, _matrices):
+    """export_workbook bytes, cached by the (sheet name, digest) of every sheet"""
+    count_metric('export_cache_misses')
+    return export_workbook({name: _export_frame(df) for name, df in _matrices.items()}, native=native).getvalue()
+
+def workbook_sheet_digests(sheets):
+    """(name, digest) per workbook sheet; a sheet is re-encoded only when its matrix object changes"""
+    memo = st.session_state.setdefault('sheet_digest_memo', {})
+    digests = []
+    for name, sheet in sheets.items():
+        df = sheet['raci_data']
+        entry = memo.get(name)
+        if entry is None or entry[0]() is not df:
+            entry = (weakref.ref(df), raci_matrix_digest(df, encode_raci_codes(df)))
+            memo[name] = entry
+        digests.append((name, entry[1]))
+    for name in set(memo) - set(sheets):
+        del memo[name]
+    return tuple(digests)
+
+# ============================================================================
+# Bulk Role Operations
+# ============================================================================
+
+def match_functions(df, function_pattern):
+    """Boolean mask of functions whose name matches a case-insensitive regex (empty pattern matches all)"""
+    if not function_pattern or not function_pattern.strip():
+        return np.ones(len(df.index), dtype=bool)
+    return np.asarray(df.index.astype(str).str.contains(function_pattern.strip(), case=False, regex=True), dtype=bool)
+
+def _assign_block(df, row_mask, stakeholders, values):
+    """Assign values to the selected rows/stakeholders as one block; returns the new frame and changed-cell mask"""
+    new_df = df.copy()
+    new_df.loc[row_mask, stakeholders] = values
+    return new_df, diff_raci_frames(df, new_df)
+
+def bulk_assign_role(df, stakeholders, function_pattern, role):
+    """Give each stakeholder the role ('' clears it) on every function matching function_pattern"""
+    if not stakeholders:
+        return False, "Please select at least one stakeholder.", df, None
+    try:
+        row_mask = match_functions(df, function_pattern)
+    except re.error as e:
+        return False, f"Invalid function pattern: {str(e)}", df, None
+    if not row_mask.any():
+        return False, f"No functions match '{function_pattern}'.", df, None
+    
+    new_df, changed_mask = _assign_block(df, row_mask, list(stakeholders), RACI_OPTIONS.get(role, ''))
+    role_text = RACI_LABELS.get(role, 'no role')
+    return True, f"Set {role_text} for {len(stakeholders)} stakeholder(s) on {int(row_mask.sum())} function(s).", new_df, changed_mask
+
+def copy_row_assignments(df, source_function, target_functions):
+    """Copy one function's assignments to each of the target functions"""
+    targets = [f for f in target_functions if f != source_function]
+    if source_function not in df.index or not targets:
+        return False, "Please choose a source function and at least one other target function.", df, None
+    
+    row_mask = df.index.isin(targets)
+    new_df, changed_mask = _assign_block(df, row_mask, list(df.columns), df.loc[source_function].to_numpy())
+    return True, f"Copied assignments from '{source_function}' to {len(targets)} function(s).", new_df, changed_mask
+
+def clear_assignments(df, functions=None, stakeholders=None):
+    """Clear every assignment in the selected functions and/or stakeholders (None means all)"""
+    if not functions and not stakeholders:
+        return False, "Please select functions and/or stakeholders to clear.", df, None
+    
+    row_mask = df.index.isin(functions) if functions else np.ones(len(df.index), dtype=bool)
+    columns = list(stakeholders) if stakeholders else list(df.columns)
+    new_df, changed_mask = _assign_block(df, row_mask, columns, '')
+    return True, f"Cleared {int(changed_mask.sum())} assignment(s).", new_df, changed_mask
+
+# ============================================================================
+# Function/Stakeholder Management
+# ============================================================================
+
+# The management panels list names a page at a time, so the widget count stays the same however many names there are
+NAME_PAGE_SIZE = int(os.environ.get('RACI_NAME_PAGE_SIZE', '50'))
+
+def search_names(names, query):
+    """Positions of the names containing query, case-insensitively (an empty query matches all)"""
+    if not query or not query.strip():
+        return np.arange(len(names))
+    matches = pd.Series(list(names), dtype=object).astype(str).str.contains(query.strip(), case=False, regex=False)
+    return np.nonzero(matches.to_numpy(dtype=bool))[0]
+
+def restructure_names(df, functions, stakeholders, axis, deleted=(), renamed=None, moved=(), position=None):
+    """Delete, rename and move functions (axis=0) or stakeholders (axis=1) in one step, keeping assignments.
+    
+    renamed maps old name -> new name; moved names are placed together at position (an index
+    into the names that remain, None for the end). Returns (success, message, functions, stakeholders, new_df).
+    """
+    kind = 'function' if axis == 0 else 'stakeholder'
+    names = list(functions if axis == 0 else stakeholders)
+    renamed = {old: str(new).strip() for old, new in (renamed or {}).items() if str(new).strip() != old}
+    deleted, moved = set(deleted), set(moved)
+    if not deleted and not renamed and not moved:
+        return False, f"Please select at least one {kind}.", functions, stakeholders, df
+    missing = [name for name in list(deleted) + list(renamed) + list(moved) if name not in names]
+    if missing:
+        return False, f"'{missing[0]}' is no longer in the list of {kind}s.", functions, stakeholders, df
+    
+    positions = [pos for pos, name in enumerate(names) if name not in deleted]
+    if moved:
+        staying = [pos for pos in positions if names[pos] not in moved]
+        block = [pos for pos in positions if names[pos] in moved]
+        insert_at = len(staying) if position is None else min(max(int(position), 0), len(staying))
+        positions = staying[:insert_at] + block + staying[insert_at:]
+    new_names = [renamed.get(names[pos], names[pos]) for pos in positions]
+    if any(not name for name in new_names):
+        return False, f"A {kind} name cannot be empty.", functions, stakeholders, df
+    duplicated = pd.Index(new_names).duplicated()
+    if duplicated.any():
+        return False, f"'{new_names[int(np.argmax(duplicated))]}' would appear twice.", functions, stakeholders, df
+    
+    new_functions, new_stakeholders = (new_names, list(stakeholders)) if axis == 0 else (list(functions), new_names)
+    # Labels are matched on their stripped text, as in sync_matrix_structure
+    labeled = df.set_axis([str(f).strip() for f in df.index], axis=0).set_axis([str(s).strip() for s in df.columns], axis=1)
+    if df.empty or not labeled.index.is_unique or not labeled.columns.is_unique or not functions or not stakeholders:
+        new_df = create_raci_matrix(new_functions, new_stakeholders)
+    else:
+        aligned = labeled.reindex(index=list(functions), columns=list(stakeholders), fill_value='').to_numpy(dtype=object)
+        new_df = pd.DataFrame(np.take(aligned, positions, axis=axis), index=new_functions, columns=new_stakeholders)
+    
+    changes = []
+    if deleted:
+        changes.append(f"deleted {len(deleted)}")
+    if renamed:
+        changes.append(f"renamed {len(renamed)}")
+    if moved:
+        changes.append(f"moved {len(moved)}")
+    return True, f"{', '.join(changes).capitalize()} {kind}(s).", new_functions, new_stakeholders, new_df
+
+def apply_name_changes(kind, **changes):
+    """restructure_names on the session lists, committed as one structural edit; returns (success, message)"""
+    axis = 0 if kind == 'functions' else 1
+    success, message, functions, stakeholders, new_df = restructure_names(
+        st.session_state.raci_data, st.session_state.functions, st.session_state.stakeholders, axis, **changes
+    )
+    if success:
+        st.session_state.functions = functions
+        st.session_state.stakeholders = stakeholders
+        commit_raci_edits(new_df, source='structure',
+                          renamed={axis: {old: str(new).strip() for old, new in (changes.get('renamed') or {}).items()}})
+        st.session_state[f'{kind}_manager_nonce'] = st.session_state.get(f'{kind}_manager_nonce', 0) + 1
+    return success, message
+
+def render_name_manager(kind):
+    """Searchable, paged list of st.session_state[kind] ('functions' or 'stakeholders') with bulk delete, rename and move"""
+    names = st.session_state[kind]
+    singular = kind[:-1]
+    nonce = st.session_state.get(f'{kind}_manager_nonce', 0)
+    
+    query = st.text_input(f"Search {kind}", key=f"{kind}_search", placeholder="Filter by name")
+    matches = search_names(names, query)
+    page_count = max(1, -(-len(matches) // NAME_PAGE_SIZE))
+    if st.session_state.get(f"{kind}_page", 1) > page_count:
+        st.session_state[f"{kind}_page"] = page_count
+    page = st.number_input("Page", min_value=1, max_value=page_count, key=f"{kind}_page") if page_count > 1 else 1
+    
+    start = (page - 1) * NAME_PAGE_SIZE
+    page_positions = matches[start:start + NAME_PAGE_SIZE]
+    page_names = [names[pos] for pos in page_positions]
+    st.caption(f"{len(matches)} of {len(names)} {kind} match" + (f" · page {page} of {page_count}" if page_count > 1 else ""))
+    if page_names:
+        st.dataframe(
+            pd.DataFrame({'#': page_positions + 1, singular.capitalize(): page_names}),
+            use_container_width=True, hide_index=True, height=min(35 * len(page_names) + 38, 300)
+        )
+    
+    select_all = st.checkbox(f"Select all {len(matches)} matching", key=f"{kind}_select_all_{nonce}")
+    if select_all:
+        selected = [names[pos] for pos in matches]
+    else:
+        selected = st.multiselect(f"Select {kind}", page_names, key=f"{kind}_selected_{nonce}_{page}_{query}")
+    
+    result = None
+    if st.button(f"🗑️ Delete Selected ({len(selected)})", key=f"{kind}_delete", use_container_width=True, disabled=not selected):
+        result = apply_name_changes(kind, deleted=selected)
+    
+    rename_col, rename_btn_col = st.columns([3, 2])
+    with rename_col:
+        new_name = st.text_input("Rename to", key=f"{kind}_rename_{nonce}", label_visibility="collapsed",
+                                 placeholder=f"New name for the selected {singular}")
+    with rename_btn_col:
+        if st.button("✏️ Rename", key=f"{kind}_rename_apply", use_container_width=True, disabled=len(selected) != 1):
+            result = apply_name_changes(kind, renamed={selected[0]: new_name})
+    
+    move_col, move_btn_col = st.columns([3, 2])
+    with move_col:
+        move_to = st.number_input("Move to position", min_value=1, max_value=max(len(names), 1), value=1,
+                                  key=f"{kind}_move_to_{nonce}", label_visibility="collapsed")
+    with move_btn_col:
+        if st.button("↕️ Move", key=f"{kind}_move", use_container_width=True, disabled=not selected,
+                     help=f"Move the selected {kind}, in their current order, to this position"):
+            result = apply_name_changes(kind, moved=selected, position=int(move_to) - 1)
+    
+    if result is not None:
+        success, message = result
+        if success:
+            st.session_state.bulk_message = (message, len(check_session_rules()))
+            st.rerun()
+        else:
+            st.error(message)
+
+# ============================================================================
+# Name Matching
+# ============================================================================
+
+# Abbreviations expanded before fuzzy comparison, so "Eng Lead" matches "Engineering Lead"
+NAME_ABBREVIATIONS = {
+    'eng': 'engineering', 'engr': 'engineering', 'mgr': 'manager', 'mgmt': 'management',
+    'dept': 'department', 'dir': 'director', 'sr': 'senior', 'jr': 'junior',
+    'ops': 'operations', 'dev': 'development', 'admin': 'administration', 'asst': 'assistant',
+    'vp': 'vice president', 'hr': 'human resources', 'qa': 'quality assurance', 'pm': 'project manager'
+}
+NAME_MATCH_THRESHOLD = 0.8
+# Only the names sharing the most trigrams with a query are scored
+NAME_MAX_CANDIDATES = 25
+# Trigrams found in more than this share of names are too common to narrow the candidates
+NAME_GRAM_MAX_SHARE = 0.05
+
+def normalize_name(name):
+    """Key for exact duplicate checks: ignores case, punctuation and extra whitespace"""
+    return ' '.join(re.sub(r'[^\w\s]', ' ', str(name).casefold()).split())
+
+def _fuzzy_key(name):
+    """Normalized name with abbreviations expanded"""
+    return ' '.join(NAME_ABBREVIATIONS.get(token, token) for token in normalize_name(name).split())
+
+def _name_trigrams(key):
+    padded = f" {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def build_name_index(names):
+    """Index names for hashed exact lookups and trigram-blocked fuzzy lookups"""
+    index = {'names': list(names), 'exact': {}, 'keys': [], 'grams': [], 'postings': {}}
+    for position, name in enumerate(index['names']):
+        index['exact'].setdefault(normalize_name(name), name)
+        key = _fuzzy_key(name)
+        grams = _name_trigrams(key)
+        index['keys'].append(key)
+        index['grams'].append(grams)
+        for gram in grams:
+            index['postings'].setdefault(gram, []).append(position)
+    return index
+
+def get_name_index(kind):
+    """build_name_index for st.session_state[kind] ('functions' or 'stakeholders'), rebuilt only when the list changes"""
+    snapshot = tuple(st.session_state[kind])
+    cached = st.session_state.get(f'{kind}_name_index')
+    if cached is None or cached[0] != snapshot:
+        cached = (snapshot, build_name_index(snapshot))
+        st.session_state[f'{kind}_name_index'] = cached
+    return cached[1]
+
+def _name_similarity(key_a, grams_a, key_b, grams_b):
+    """Score in [0, 1]: trigram overlap, or 0.9 when every word of one name abbreviates the other's"""
+    if key_a == key_b:
+        return 1.0
+    dice = 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+    tokens_a, tokens_b = key_a.split(), key_b.split()
+    if len(tokens_a) == len(tokens_b) and all(
+        (a.startswith(b) or b.startswith(a)) and min(len(a), len(b)) >= 3 or a == b
+        for a, b in zip(tokens_a, tokens_b)
+    ):
+        return max(dice, 0.9)
+    return dice
+
+def find_similar_names(name, index, threshold=NAME_MATCH_THRESHOLD, limit=5, exclude_position=None):
+    """Indexed names similar to name, as (name, score) pairs with the best match first"""
+    key = _fuzzy_key(name)
+    grams = _name_trigrams(key)
+    max_posting = max(NAME_MAX_CANDIDATES, int(len(index['names']) * NAME_GRAM_MAX_SHARE))
+    # Block on shared trigrams, skipping very common ones (but always keeping the rarest few)
+    postings = sorted((index['postings'].get(gram, []) for gram in grams), key=len)
+    shared = Counter()
+    for rank, posting in enumerate(postings):
+        if rank < 3 or len(posting) <= max_posting:
+            shared.update(posting)
+    
+    matches = []
+    for position, _ in shared.most_common(NAME_MAX_CANDIDATES + 1):
+        if position == exclude_position:
+            continue
+        score = _name_similarity(key, grams, index['keys'][position], index['grams'][position])
+        if score >= threshold:
+            matches.append((index['names'][position], score))
+    matches.sort(key=lambda match: -match[1])
+    return matches[:limit]
+
+def find_duplicate_groups(names, threshold=NAME_MATCH_THRESHOLD):
+    """Groups (in list order) of two or more names that look like the same function/stakeholder"""
+    index = build_name_index(names)
+    parent = list(range(len(index['names'])))
+    
+    def root(position):
+        while parent[position] != position:
+            parent[position] = parent[parent[position]]
+            position = parent[position]
+        return position
+    
+    positions = {}
+    for position, name in enumerate(index['names']):
+        positions.setdefault(name, position)
+    for position, name in enumerate(index['names']):
+        for match, _ in find_similar_names(name, index, threshold, limit=NAME_MAX_CANDIDATES, exclude_position=position):
+            parent[root(positions[match])] = root(position)
+    
+    groups = {}
+    for position, name in enumerate(index['names']):
+        groups.setdefault(root(position), []).append(name)
+    return [group for group in groups.values() if len(group) > 1]
+
+def new_name_warning(name, index, label, allow_similar=False):
+    """Why name should not be added to the indexed names (None if it can be)"""
+    existing = index['exact'].get(normalize_name(name))
+    if existing is not None:
+        return f"{label} already exists as '{existing}'!" if existing != name else f"{label} already exists!"
+    if not allow_similar:
+        similar = find_similar_names(name, index, limit=3)
+        if similar:
+            names = ", ".join(f"'{match}'" for match, _ in similar)
+            return f"Similar {label.lower()}(s) already exist: {names}. Tick 'Add anyway' to add it regardless."
+    return None
+
+def find_name_merge_suggestions(functions, stakeholders):
+    """Near-duplicate groups among the functions and stakeholders, as (axis, group) pairs"""
+    with timed_stage('find_duplicates'):
+        return [(0, group) for group in find_duplicate_groups(functions)] + \
+               [(1, group) for group in find_duplicate_groups(stakeholders)]
+
+def merge_names(df, functions, stakeholders, keep, others, axis):
+    """Fold duplicate functions (axis=0) or stakeholders (axis=1) into keep.
+
+    Each cell takes the first assignment found in keep, then others in order;
+    cells where the duplicates disagree are counted as conflicts.
+    Returns (success, message, functions, stakeholders, new_df).
+    """
+    names = list(functions if axis == 0 else stakeholders)
+    others = [name for name in others if name != keep]
+    if keep not in names or not others or any(name not in names for name in others):
+        return False, "Please choose a name to keep and at least one other name to merge into it.", functions, stakeholders, df
+    
+    matrix = df.to_numpy(dtype=object)
+    if axis == 0:
+        matrix = matrix.T
+    positions = [names.index(name) for name in [keep] + others]
+    values = matrix[:, positions]
+    assigned = ~pd.isna(values) & (values != '')
+    first = assigned.argmax(axis=1)
+    merged = np.where(assigned.any(axis=1), values[np.arange(len(values)), first], '')
+    conflicts = int((assigned & (values != merged[:, None])).any(axis=1).sum())
+    
+    matrix = matrix.copy()
+    matrix[:, positions[0]] = merged
+    kept = np.ones(len(names), dtype=bool)
+    kept[positions[1:]] = False
+    matrix = matrix[:, kept]
+    new_names = [name for name, keep_name in zip(names, kept) if keep_name]
+    if axis == 0:
+        functions, matrix = new_names, matrix.T
+    else:
+        stakeholders = new_names
+    new_df = pd.DataFrame(matrix, index=list(functions), columns=list(stakeholders))
+    
+    conflict_note = f" {conflicts} cell(s) had conflicting roles; the first assigned role was kept." if conflicts else ""
+    return True, f"Merged {len(others)} name(s) into '{keep}'.{conflict_note}", functions, stakeholders, new_df
+
+# ============================================================================
+# Matrix Consolidation
+# ============================================================================
+
+# How a cell assigned differently by several source matrices is resolved;
+# in every rule an explicit assignment beats a blank cell
+MERGE_RULES = {
+    'first': "First source wins (earlier matrices take priority)",
+    'last': "Last source wins (later matrices take priority)",
+    'strongest': "Strongest role wins (A > R > C > I)"
+}
+# Rank of each role code for the 'strongest' rule (index = code in RACI_CODES)
+ROLE_STRENGTH = np.array([0, 3, 4, 2, 1], dtype=np.int8)
+MERGE_CONFLICT_MAX_DETAILS = 1000
+
+def _align_labels(labels, union_positions, union_labels):
+    """Positions of labels in the union (by normalized name), appending unseen ones"""
+    positions = np.empty(len(labels), dtype=np.intp)
+    for idx, label in enumerate(labels):
+        key = normalize_name(label)
+        if key not in union_positions:
+            union_positions[key] = len(union_labels)
+            union_labels.append(str(label).strip())
+        positions[idx] = union_positions[key]
+    return positions
+
+def merge_matrices(sources, rule='first'):
+    """Consolidate several matrices into one over the union of their functions and stakeholders.
+
+    sources is a list of (source_name, DataFrame). Names are matched ignoring case
+    and spacing. Each source's role codes are scattered onto the union grid and
+    folded in one array operation per source. Returns (success, message, functions,
+    stakeholders, merged_df, report); report holds per-source cell counts, the
+    source chosen for each cell and the conflicting cells.
+    """
+    sources = [(name, df) for name, df in sources if df is not None and not df.empty]
+    if len(sources) < 2:
+        return False, "Please choose at least two non-empty matrices to merge.", None, None, None, None
+    if rule not in MERGE_RULES:
+        return False, f"Unknown merge rule '{rule}'.", None, None, None, None
+    
+    row_positions, col_positions = {}, {}
+    functions, stakeholders, aligned = [], [], []
+    for _, df in sources:
+        rows = _align_labels(df.index, row_positions, functions)
+        cols = _align_labels(df.columns, col_positions, stakeholders)
+        aligned.append((rows, cols, encode_raci_codes(df)))
+    
+    merged = np.zeros((len(functions), len(stakeholders)), dtype=np.int8)
+    chosen_source = np.full(merged.shape, -1, dtype=np.int16)
+    conflicts = np.zeros(merged.shape, dtype=bool)
+    for source_idx, (rows, cols, codes) in enumerate(aligned):
+        block = np.ix_(rows, cols)
+        current = merged[block]
+        assigned = codes != 0
+        conflicts[block] |= assigned & (current != 0) & (current != codes)
+        if rule == 'first':
+            take = assigned & (current == 0)
+        elif rule == 'last':
+            take = assigned
+        else:
+            take = ROLE_STRENGTH[codes] > ROLE_STRENGTH[current]
+        current[take] = codes[take]
+        merged[block] = current
+        chosen = chosen_source[block]
+        chosen[take] = source_idx
+        chosen_source[block] = chosen
+    
+    label_lookup = np.array([''] + [RACI_LABELS[letter] for letter in RACI_CODES[1:]], dtype=object)
+    merged_df = pd.DataFrame(label_lookup[merged], index=functions, columns=stakeholders)
+    merged_df.index.name = 'Function'
+    
+    source_names = [str(name) for name, _ in sources]
+    conflict_rows, conflict_cols = np.nonzero(conflicts)
+    conflict_details = []
+    if len(conflict_rows):
+        # Every source's role at the first conflicting cells, via the inverse of its alignment
+        detail_rows = conflict_rows[:MERGE_CONFLICT_MAX_DETAILS]
+        detail_cols = conflict_cols[:MERGE_CONFLICT_MAX_DETAILS]
+        source_roles = [[] for _ in range(len(detail_rows))]
+        for source_idx, (rows, cols, codes) in enumerate(aligned):
+            row_inverse = np.full(len(functions), -1, dtype=np.intp)
+            row_inverse[rows] = np.arange(len(rows))
+            col_inverse = np.full(len(stakeholders), -1, dtype=np.intp)
+            col_inverse[cols] = np.arange(len(cols))
+            src_rows, src_cols = row_inverse[detail_rows], col_inverse[detail_cols]
+            for detail_idx in np.nonzero((src_rows >= 0) & (src_cols >= 0))[0]:
+                code = codes[src_rows[detail_idx], src_cols[detail_idx]]
+                if code:
+                    source_roles[detail_idx].append(f"{RACI_CODES[code]} ({source_names[source_idx]})")
+        for detail_idx, (row, col) in enumerate(zip(detail_rows, detail_cols)):
+            conflict_details.append({
+                'function': functions[row],
+                'stakeholder': stakeholders[col],
+                'resolved': RACI_CODES[merged[row, col]],
+                'resolved_from': source_names[chosen_source[row, col]],
+                'source_roles': ", ".join(source_roles[detail_idx])
+            })
+    
+    cells_by_source = np.bincount(chosen_source[chosen_source >= 0], minlength=len(sources))
+    report = {
+        'rule': rule,
+        'sources': source_names,
+        'cells_by_source': dict(zip(source_names, cells_by_source.tolist())),
+        'chosen_source': chosen_source,
+        'conflict_count': int(conflicts.sum()),
+        'conflicts': conflict_details
+    }
+    conflict_note = f" {report['conflict_count']} conflicting cell(s) resolved." if report['conflict_count'] else ""
+    message = f"Merged {len(sources)} matrices into {len(functions)} functions and {len(stakeholders)} stakeholders.{conflict_note}"
+    return True, message, functions, stakeholders, merged_df, report
+
+# ============================================================================
+# Template Library
+# ============================================================================
+
+# Built-in skeletons; more can be added as JSON files in RACI_TEMPLATE_DIR, each with
+# name, description, functions, stakeholders and assignments {function: {stakeholder: letter}}
+TEMPLATE_DIR = os.environ.get('RACI_TEMPLATE_DIR', 'raci_templates')
+BUILTIN_TEMPLATES = {
+    'Software Release': {
+        'description': "Plan, build, test and ship a software release",
+        'functions': ['Define Requirements', 'Technical Design', 'Development', 'Code Review', 'QA Testing',
+                      'Security Review', 'Release Approval', 'Deployment', 'Release Notes', 'Post-Release Monitoring'],
+        'stakeholders': ['Product Manager', 'Engineering Lead', 'Developers', 'QA Lead', 'Security', 'Operations', 'Support'],
+        'assignments': {
+            'Define Requirements': {'Product Manager': 'A', 'Engineering Lead': 'C', 'Developers': 'I', 'QA Lead': 'C'},
+            'Technical Design': {'Engineering Lead': 'A', 'Developers': 'R', 'Security': 'C', 'Product Manager': 'I'},
+            'Development': {'Engineering Lead': 'A', 'Developers': 'R'},
+            'Code Review': {'Engineering Lead': 'A', 'Developers': 'R'},
+            'QA Testing': {'QA Lead': 'A', 'Developers': 'C', 'Product Manager': 'I'},
+            'Security Review': {'Security': 'A', 'Engineering Lead': 'R', 'Developers': 'C'},
+            'Release Approval': {'Product Manager': 'A', 'Engineering Lead': 'R', 'QA Lead': 'C', 'Operations': 'I'},
+            'Deployment': {'Operations': 'A', 'Developers': 'R', 'Support': 'I'},
+            'Release Notes': {'Product Manager': 'A', 'Developers': 'C', 'Support': 'I'},
+            'Post-Release Monitoring': {'Operations': 'A', 'Developers': 'R', 'Support': 'C', 'Engineering Lead': 'I'}
+        }
+    },
+    'Incident Management': {
+        'description': "Detect, respond to and learn from production incidents",
+        'functions': ['Detection & Alerting', 'Triage', 'Incident Command', 'Mitigation', 'Customer Communication',
+                      'Executive Updates', 'Root Cause Analysis', 'Postmortem', 'Follow-up Actions'],
+        'stakeholders': ['On-call Engineer', 'Incident Commander', 'Engineering Manager', 'Support', 'Communications', 'Leadership'],
+        'assignments': {
+            'Detection & Alerting': {'On-call Engineer': 'A', 'Engineering Manager': 'I'},
+            'Triage': {'On-call Engineer': 'R', 'Incident Commander': 'A'},
+            'Incident Command': {'Incident Commander': 'A', 'On-call Engineer': 'C', 'Leadership': 'I'},
+            'Mitigation': {'On-call Engineer': 'R', 'Incident Commander': 'A', 'Engineering Manager': 'C'},
+            'Customer Communication': {'Support': 'R', 'Communications': 'A', 'Incident Commander': 'C'},
+            'Executive Updates': {'Incident Commander': 'R', 'Engineering Manager': 'A', 'Leadership': 'I'},
+            'Root Cause Analysis': {'On-call Engineer': 'R', 'Engineering Manager': 'A'},
+            'Postmortem': {'Incident Commander': 'R', 'Engineering Manager': 'A', 'Leadership': 'I', 'Support': 'I'},
+            'Follow-up Actions': {'Engineering Manager': 'A', 'On-call Engineer': 'R'}
+        }
+    },
+    'Hiring': {
+        'description': "Open a role, interview candidates and onboard the hire",
+        'functions': ['Headcount Approval', 'Job Description', 'Sourcing', 'Screening', 'Interviews',
+                      'Hiring Decision', 'Offer', 'Onboarding'],
+        'stakeholders': ['Hiring Manager', 'Recruiter', 'Interview Panel', 'HR', 'Finance', 'Department Head'],
+        'assignments': {
+            'Headcount Approval': {'Department Head': 'A', 'Hiring Manager': 'R', 'Finance': 'C'},
+            'Job Description': {'Hiring Manager': 'A', 'Recruiter': 'C', 'HR': 'C'},
+            'Sourcing': {'Recruiter': 'A', 'Hiring Manager': 'C'},
+            'Screening': {'Recruiter': 'A', 'Hiring Manager': 'I'},
+            'Interviews': {'Hiring Manager': 'A', 'Interview Panel': 'R', 'Recruiter': 'C'},
+            'Hiring Decision': {'Hiring Manager': 'A', 'Interview Panel': 'C', 'Department Head': 'I'},
+            'Offer': {'Recruiter': 'R', 'HR': 'A', 'Finance': 'C', 'Hiring Manager': 'I'},
+            'Onboarding': {'Hiring Manager': 'A', 'HR': 'R'}
+        }
+    }
+}
+
+def _template_dir_signature():
+    """(file name, modification time) pairs of the local template files, used as the cache key"""
+    if not os.path.isdir(TEMPLATE_DIR):
+        return ()
+    return tuple(sorted(
+        (entry.name, entry.stat().st_mtime_ns) for entry in os.scandir(TEMPLATE_DIR) if entry.name.endswith('.json')
+    ))
+
+@st.cache_data(show_spinner=False)
+def load_template_library(signature):
+    """Built-in plus local templates by name (local files override built-ins of the same name)"""
+    templates = {name: dict(template, source='built-in') for name, template in BUILTIN_TEMPLATES.items()}
+    for file_name, _ in signature:
+        try:
+            with open(os.path.join(TEMPLATE_DIR, file_name), encoding='utf-8') as template_file:
+                template = json.load(template_file)
+            name = template.get('name') or os.path.splitext(file_name)[0]
+            templates[name] = {
+                'description': template.get('description', ''),
+                'functions': [str(f) for f in template.get('functions', [])],
+                'stakeholders': [str(s) for s in template.get('stakeholders', [])],
+                'assignments': template.get('assignments', {}),
+                'source': file_name
+            }
+        except (OSError, ValueError) as e:
+            perf_logger.warning("Skipping template %s: %s", file_name, e)
+    return templates
+
+def get_template_library():
+    return load_template_library(_template_dir_signature())
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def build_template_frame(name, signature):
+    """Pre-built matrix for a template, with its default assignments filled in one vectorized step"""
+    template = load_template_library(signature)[name]
+    functions, stakeholders = template['functions'], template['stakeholders']
+    df = create_raci_matrix(functions, stakeholders)
+    cells = {
+        (function, stakeholder): RACI_LABELS.get(str(letter).strip().upper()[:1], '')
+        for function, row in template['assignments'].items()
+        for stakeholder, letter in row.items()
+    }
+    return assign_cells(df, cells)
+
+def instantiate_template(name, add_to_current=False):
+    """Replace (or extend) the session matrix with a template in a single commit"""
+    signature = _template_dir_signature()
+    if name not in load_template_library(signature):
+        return False, f"Template '{name}' not found."
+    template_df = build_template_frame(name, signature)
+    
+    if add_to_current and not st.session_state.raci_data.empty:
+        success, message, functions, stakeholders, new_df, _ = merge_matrices(
+            [("Current matrix", st.session_state.raci_data), (name, template_df)], rule='first'
+        )
+        if not success:
+            return False, message
+    else:
+        functions, stakeholders, new_df = list(template_df.index), list(template_df.columns), template_df
+    
+    st.session_state.functions = list(functions)
+    st.session_state.stakeholders = list(stakeholders)
+    commit_raci_edits(new_df, source='template')
+    action = "Added template" if add_to_current else "Created matrix from template"
+    return True, f"{action} '{name}' ({len(functions)} functions, {len(stakeholders)} stakeholders)."
+
+def save_matrix_as_template(name, description, df):
+    """Write the current matrix to RACI_TEMPLATE_DIR as a reusable template"""
+    name = name.strip()
+    if not name:
+        return False, "Please enter a template name."
+    if df.empty:
+        return False, "Please create a RACI matrix before saving it as a template."
+    try:
+        codes = encode_raci_codes(df)
+        functions = [str(f) for f in df.index]
+        stakeholders = [str(s) for s in df.columns]
+        assignments = {}
+        for row, col in zip(*np.nonzero(codes)):
+            assignments.setdefault(functions[row], {})[stakeholders[col]] = RACI_CODES[codes[row, col]]
+        template = {'name': name, 'description': description.strip(), 'functions': functions,
+                    'stakeholders': stakeholders, 'assignments': assignments}
+        
+        os.makedirs(TEMPLATE_DIR, exist_ok=True)
+        file_name = re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_').lower() or 'template'
+        with open(os.path.join(TEMPLATE_DIR, f"{file_name}.json"), 'w', encoding='utf-8') as template_file:
+            json.dump(template, template_file, indent=2)
+        return True, f"Saved template '{name}'."
+    except Exception as e:
+        return False, f"Error saving template: {str(e)}"
+
+# ============================================================================
+# Matrix Analytics
+# ============================================================================
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def compute_raci_analytics(digest, _codes, _functions, _stakeholders, max_responsible, max_accountable):
+    """Workload analytics for a matrix, cached by its digest.
+
+    Every figure is a NumPy reduction over the role-code array, so a 10k x 500
+    matrix is summarized in milliseconds once its codes are known.
+    """
+    codes = _codes
+    role_letters = RACI_CODES[1:]
+    # One boolean pass per role; sums along each axis give per-function and per-stakeholder counts
+    per_stakeholder = np.empty((codes.shape[1], len(role_letters)), dtype=np.int64)
+    per_function = np.empty((codes.shape[0], len(role_letters)), dtype=np.int64)
+    for role_idx, letter in enumerate(role_letters):
+        is_role = codes == RACI_CODE_LOOKUP[letter]
+        per_stakeholder[:, role_idx] = is_role.sum(axis=0)
+        per_function[:, role_idx] = is_role.sum(axis=1)
+    
+    stakeholder_counts = pd.DataFrame(per_stakeholder, index=list(_stakeholders), columns=role_letters)
+    stakeholder_counts['Total'] = per_stakeholder.sum(axis=1)
+    function_counts = pd.DataFrame(per_function, index=list(_functions), columns=role_letters)
+    function_counts['Total'] = per_function.sum(axis=1)
+    
+    overloaded = stakeholder_counts[
+        (stakeholder_counts['R'] > max_responsible) | (stakeholder_counts['A'] > max_accountable)
+    ]
+    return {
+        'stakeholder_counts': stakeholder_counts,
+        'function_counts': function_counts,
+        'overloaded_stakeholders': overloaded,
+        'functions_without_r': [str(f) for f in function_counts.index[function_counts['R'].to_numpy() == 0]],
+        'functions_without_a': [str(f) for f in function_counts.index[function_counts['A'].to_numpy() == 0]],
+        'empty_functions': [str(f) for f in function_counts.index[function_counts['Total'].to_numpy() == 0]],
+        'empty_stakeholders': [str(s) for s in stakeholder_counts.index[stakeholder_counts['Total'].to_numpy() == 0]],
+    }
+
+# ============================================================================
+# Validation Rules
+# ============================================================================
+
+# Rules are plain text, one per line (lines starting with '#' are comments):
+#   exactly 1 A per function              at least 1 R per function
+#   at most 5 R per stakeholder           at most 8 R/A per stakeholder
+#   stakeholder "Legal" never A           function "Payroll" never C/I
+#   in group "Finance": exactly 1 A per function
+#   in functions matching "deploy|release": at least 1 C per function
+# Each rule compiles to a count of role codes per function or per stakeholder, held
+# in a count table shared by all rules over the same cells, and a min/max bound.
+RULES_FILE = os.environ.get('RACI_RULES_FILE', '')
+DEFAULT_RULES = "at most 1 A per function"
+RULE_MAX_DISPLAYED = 50
+_RULE_ROLES = r'[RACI](?:\s*[/,]\s*[RACI])*'
+RULE_SCOPE_PATTERN = re.compile(
+    r'^in\s+(?:group\s+"(?P<group>[^"]+)"|functions\s+matching\s+"(?P<pattern>[^"]+)")\s*:\s*(?P<rule>.+)$',
+    re.IGNORECASE
+)
+RULE_COUNT_PATTERN = re.compile(
+    rf'^(?P<quantifier>exactly|at\s+least|at\s+most)\s+(?P<count>\d+)\s+(?P<roles>{_RULE_ROLES})\s+per\s+(?P<per>function|stakeholder)$',
+    re.IGNORECASE
+)
+RULE_NEVER_PATTERN = re.compile(
+    rf'^(?P<axis>stakeholder|function)\s+"(?P<name>[^"]+)"\s+(?:is\s+)?never\s+(?P<roles>{_RULE_ROLES})$',
+    re.IGNORECASE
+)
+
+@functools.lru_cache(maxsize=32)
+def compile_raci_rules(text):
+    """Compile rules text into a tuple of rules; returns (success, message, rules)"""
+    rules, problems = [], []
+    for line_number, raw_line in enumerate(text.splitlines(), start=1):
+        line = raw_line.strip()
+        if not line or line.startswith('#'):
+            continue
+        body, scope = line, None
+        scope_match = RULE_SCOPE_PATTERN.match(line)
+        if scope_match:
+            body = scope_match['rule'].strip()
+            if scope_match['group']:
+                scope = ('group', scope_match['group'].strip())
+            else:
+                try:
+                    re.compile(scope_match['pattern'], re.IGNORECASE)
+                except re.error as e:
+                    problems.append(f"Line {line_number}: invalid pattern '{scope_match['pattern']}': {str(e)}")
+                    continue
+                scope = ('pattern', scope_match['pattern'])
+        
+        count_match = RULE_COUNT_PATTERN.match(body)
+        never_match = RULE_NEVER_PATTERN.match(body)
+        if count_match:
+            count = int(count_match['count'])
+            quantifier = ' '.join(count_match['quantifier'].lower().split())
+            low, high = {'exactly': (count, count), 'at least': (count, None), 'at most': (0, count)}[quantifier]
+            per, target, roles = count_match['per'].lower(), None, count_match['roles']
+        elif never_match:
+            # "stakeholder X never A" bounds a count per function over X's column, and vice versa
+            per = 'function' if never_match['axis'].lower() == 'stakeholder' else 'stakeholder'
+            low, high, target, roles = 0, 0, never_match['name'].strip(), never_match['roles']
+        else:
+            problems.append(f"Line {line_number}: could not read '{line}'.")
+            continue
+        
+        letters = tuple(dict.fromkeys(re.findall('[RACI]', roles.upper())))
+        role_vector = np.zeros(len(RACI_CODES), dtype=np.int64)
+        role_vector[[RACI_CODE_LOOKUP[letter] for letter in letters]] = 1
+        rules.append({
+            'line': line_number,
+            'text': line,
+            'per': per,
+            'roles': letters,
+            'role_vector': role_vector,
+            'min': low,
+            'max': high,
+            'scope': scope,
+            'target': target,
+            # Per-function counts only depend on the columns counted; per-stakeholder counts on the rows
+            'table': ('function', target) if per == 'function' else ('stakeholder', scope, target),
+        })
+    if problems:
+        return False, "\n".join(problems), ()
+    return True, f"{len(rules)} rule(s)", tuple(rules)
+
+def default_rules_text():
+    """Rules text from RACI_RULES_FILE, or DEFAULT_RULES if it is not set or cannot be read"""
+    if not RULES_FILE:
+        return DEFAULT_RULES
+    try:
+        with open(RULES_FILE, encoding='utf-8') as handle:
+            return handle.read()
+    except OSError as e:
+        perf_logger.warning("Could not read rules file %s: %s", RULES_FILE, e)
+        return DEFAULT_RULES
+
+def get_default_rules():
+    success, message, rules = compile_raci_rules(default_rules_text())
+    if not success:
+        perf_logger.warning("Ignoring invalid rules in %s: %s", RULES_FILE, message)
+        rules = compile_raci_rules(DEFAULT_RULES)[2]
+    return rules
+
+def get_session_rules():
+    """Compiled rules for this session ("📏 Validation Rules"), starting from the defaults"""
+    text = st.session_state.get('raci_rules_text')
+    return compile_raci_rules(text)[2] if text is not None else get_default_rules()
+
+def _rule_scope_mask(scope, functions):
+    labels = [str(f).strip() for f in functions]
+    if scope is None:
+        return np.ones(len(labels), dtype=bool)
+    kind, value = scope
+    if kind == 'group':
+        prefix = value + FUNCTION_GROUP_SEPARATOR
+        return np.array([label.startswith(prefix) for label in labels], dtype=bool)
+    pattern = re.compile(value, re.IGNORECASE)
+    return np.array([bool(pattern.search(label)) for label in labels], dtype=bool)
+
+def _label_mask(labels, name):
+    return np.array([str(label).strip() == name for label in labels], dtype=bool)
+
+def build_rule_tables(rules, codes, functions, stakeholders):
+    """Count tables for rules over a role-code array.
+
+    Each table holds, per function (or per stakeholder), how many cells of each role
+    code fall in the table's columns (or rows); rules are dot products with it.
+    """
+    tables = {'counts': {}, 'masks': {}, 'scopes': {}}
+    for rule in rules:
+        key = rule['table']
+        if rule['per'] == 'function':
+            tables['scopes'].setdefault(rule['scope'], _rule_scope_mask(rule['scope'], functions))
+        if key in tables['counts']:
+            continue
+        if rule['per'] == 'function':
+            mask = _label_mask(stakeholders, rule['target']) if rule['target'] is not None else np.ones(len(stakeholders), dtype=bool)
+            cells, axis = codes[:, mask], 1
+        else:
+            mask = _rule_scope_mask(rule['scope'], functions)
+            if rule['target'] is not None:
+                mask &= _label_mask(functions, rule['target'])
+            cells, axis = codes[mask], 0
+        tables['counts'][key], tables['masks'][key] = role_count_table(cells, axis), mask
+    return tables
+
+def role_count_table(codes, axis):
+    """Count of each role code (columns 0-4) per function (axis=1) or per stakeholder (axis=0)"""
+    counts = np.zeros((codes.shape[1 - axis], len(RACI_CODES)), dtype=np.int64)
+    for code in range(1, len(RACI_CODES)):
+        counts[:, code] = (codes == code).sum(axis=axis)
+    counts[:, 0] = codes.shape[axis] - counts[:, 1:].sum(axis=1)
+    return counts
+
+def changed_role_codes(state, df, codes):
+    """Cells whose role code changed since state (with 'codes', 'functions', 'stakeholders') was computed.
+
+    Returns (rows, cols, old_codes, new_codes), or None if there is no state or the
+    functions or stakeholders changed, in which case derived tables must be rebuilt.
+    """
+    if state is None or state['codes'].shape != codes.shape or \
+       not state['functions'].equals(df.index) or not state['stakeholders'].equals(df.columns):
+        return None
+    rows, cols = np.nonzero(state['codes'] != codes)
+    return rows, cols, state['codes'][rows, cols], codes[rows, cols]
+
+def update_rule_tables(tables, rows, cols, old_codes, new_codes):
+    """Apply changed cells (positions with their old and new codes) to count tables in place"""
+    for key, counts in tables['counts'].items():
+        mask = tables['masks'][key]
+        if key[0] == 'function':
+            keep, positions = mask[cols], rows
+        else:
+            keep, positions = mask[rows], cols
+        if keep.any():
+            np.subtract.at(counts, (positions[keep], old_codes[keep]), 1)
+            np.add.at(counts, (positions[keep], new_codes[keep]), 1)
+
+def _rule_role_name(rule):
+    return ' or '.join(RACI_LABELS[letter].split(' - ')[1] for letter in rule['roles'])
+
+def _rule_limit_text(rule):
+    low, high = rule['min'], rule['max']
+    amount = high if high is not None else low
+    verb = 'is' if amount == 1 else 'are'
+    if high == 0:
+        return "None are allowed."
+    if low == high:
+        return f"Exactly {low} {verb} required."
+    if high is not None:
+        return f"Only {high} {verb} allowed."
+    return f"At least {low} {verb} required."
+
+def rule_violations(rules, tables, functions, stakeholders, function_errors=None):
+    """Messages for every function or stakeholder outside a rule's bounds, rule by rule.
+
+    If function_errors is a dict, the messages about one function are also listed under its name.
+    """
+    errors = []
+
+    def report(message, function=None):
+        errors.append(message)
+        if function_errors is not None and function is not None:
+            function_errors.setdefault(function, []).append(message)
+
+    for rule in rules:
+        counts = tables['counts'][rule['table']] @ rule['role_vector']
+        outside = counts < rule['min']
+        if rule['max'] is not None:
+            outside |= counts > rule['max']
+        role = _rule_role_name(rule)
+        if rule['per'] == 'function':
+            for pos in np.flatnonzero(outside & tables['scopes'][rule['scope']]):
+                if rule['target'] is not None:
+                    report(f"Function '{functions[pos]}': stakeholder '{rule['target']}' must never be {role}.", functions[pos])
+                else:
+                    count = int(counts[pos])
+                    report(f"Function '{functions[pos]}' has {count} {role} stakeholder{'' if count == 1 else 's'}. {_rule_limit_text(rule)}", functions[pos])
+        else:
+            scope_text = ''
+            if rule['scope'] is not None:
+                kind, value = rule['scope']
+                scope_text = f" in group '{value}'" if kind == 'group' else f" in functions matching '{value}'"
+            for pos in np.flatnonzero(outside):
+                if rule['target'] is not None:
+                    report(f"Function '{rule['target']}': stakeholder '{stakeholders[pos]}' must never be {role}.", rule['target'])
+                else:
+                    count = int(counts[pos])
+                    report(f"Stakeholder '{stakeholders[pos]}' is {role} for {count} function{'' if count == 1 else 's'}{scope_text}. {_rule_limit_text(rule)}")
+    return errors
+
+def check_session_rules():
+    """Rule violations for the session matrix, updated incrementally since the previous check.
+
+    Only cells whose role code changed are applied to the count tables, so after an
+    edit a check costs one comparison of code arrays plus work proportional to the
+    edit, however many rules there are.
+    """
+    df = st.session_state.raci_data
+    # Strict codes, so the session sees the same violations as validate_raci_matrix
+    codes, digest = get_raci_codes(df, strict=True)
+    rules = get_session_rules()
+    state = st.session_state.get('rule_check_state')
+    if state is not None and state['rules'] is rules and state['digest'] == digest:
+        return state['errors']
+    with timed_stage('check_rules'):
+        changes = changed_role_codes(state, df, codes) if state is not None and state['rules'] is rules else None
+        if changes is not None:
+            update_rule_tables(state['tables'], *changes)
+            count_metric('rule_cells_updated', len(changes[0]))
+        else:
+            state = {'rules': rules, 'tables': build_rule_tables(rules, codes, df.index, df.columns)}
+        function_errors = {}
+        state.update(codes=codes, digest=digest, functions=df.index, stakeholders=df.columns,
+                     errors=rule_violations(rules, state['tables'], df.index, df.columns, function_errors),
+                     function_errors=function_errors)
+    st.session_state.rule_check_state = state
+    return state['errors']
+
+def session_function_errors():
+    """The session's rule violations about single functions, keyed by function name"""
+    check_session_rules()
+    return st.session_state.rule_check_state['function_errors']
+
+# ============================================================================
+# Function Groups
+# ============================================================================
+
+# Functions named 'Process > Sub-process > Task' form a tree of groups. The tree is
+# derived from the names, so the matrix stays flat; per-group role counts are kept
+# per session and updated from the cells that changed, like the rule tables.
+GROUP_OUTLINE_MAX_LEVEL = 7  # deepest outline level Excel supports
+
+def function_path(function_name):
+    """Parts of a function named like 'Process > Sub-process > Task', stripped"""
+    return tuple(part.strip() for part in str(function_name).split(FUNCTION_GROUP_SEPARATOR))
+
+def build_function_tree(functions):
+    """Groups of a list of functions and each function's group at every depth.
+
+    Returns (groups, row_groups): groups lists group paths (tuples) in tree order,
+    each after its parent; row_groups[depth][i] is the position in groups of
+    function i's group at that depth (0 = top level), or -1.
+    """
+    paths = [function_path(f)[:-1] for f in functions]
+    first_seen = {}
+    for path in paths:
+        for depth in range(1, len(path) + 1):
+            first_seen.setdefault(path[:depth], len(first_seen))
+    groups = sorted(first_seen, key=lambda path: [first_seen[path[:depth]] for depth in range(1, len(path) + 1)])
+    group_index = {path: idx for idx, path in enumerate(groups)}
+    row_groups = np.full((max((len(path) for path in paths), default=0), len(paths)), -1, dtype=np.int64)
+    for row, path in enumerate(paths):
+        for depth in range(len(path)):
+            row_groups[depth, row] = group_index[path[:depth + 1]]
+    return groups, row_groups
+
+def group_rollups(row_groups, group_count, function_counts):
+    """Role-code counts per group (including sub-groups) from per-function counts"""
+    rollup = np.zeros((group_count, function_counts.shape[1]), dtype=np.int64)
+    for level in row_groups:
+        member = level >= 0
+        np.add.at(rollup, level[member], function_counts[member])
+    return rollup
+
+def update_group_rollups(state, rows, cols, old_codes, new_codes):
+    """Apply changed cells to the per-function and per-group counts in place"""
+    np.subtract.at(state['function_counts'], (rows, old_codes), 1)
+    np.add.at(state['function_counts'], (rows, new_codes), 1)
+    for level in state['row_groups']:
+        groups = level[rows]
+        member = groups >= 0
+        np.subtract.at(state['rollup'], (groups[member], old_codes[member]), 1)
+        np.add.at(state['rollup'], (groups[member], new_codes[member]), 1)
+
+def get_group_rollups():
+    """Group tree and roll-ups of the session matrix, updated incrementally since the last call"""
+    df = st.session_state.raci_data
+    codes, digest = get_raci_codes(df)
+    state = st.session_state.get('group_rollup_state')
+    if state is not None and state['digest'] == digest:
+        return state
+    with timed_stage('group_rollups'):
+        changes = changed_role_codes(state, df, codes)
+        if changes is not None:
+            update_group_rollups(state, *changes)
+            count_metric('rollup_cells_updated', len(changes[0]))
+        else:
+            groups, row_groups = build_function_tree(df.index)
+            function_counts = role_count_table(codes, 1)
+            state = {
+                'groups': groups,
+                'group_index': {path: idx for idx, path in enumerate(groups)},
+                'row_groups': row_groups,
+                'sizes': group_rollups(row_groups, len(groups), np.ones((len(df.index), 1), dtype=np.int64))[:, 0],
+                'function_counts': function_counts,
+                'rollup': group_rollups(row_groups, len(groups), function_counts),
+            }
+        state.update(codes=codes, digest=digest, functions=df.index, stakeholders=df.columns)
+    st.session_state.group_rollup_state = state
+    return state
+
+def group_member_rows(state, group_path):
+    """Positions of the functions in a group (and its sub-groups)"""
+    group_idx = state['group_index'].get(tuple(group_path))
+    if group_idx is None:
+        return np.zeros(0, dtype=np.int64)
+    return np.flatnonzero(state['row_groups'][len(group_path) - 1] == group_idx)
+
+def group_rollup_frame(state, max_depth=None):
+    """Roll-up table with one row per group, indented by depth, down to max_depth levels"""
+    groups, function_counts = state['groups'], state['function_counts']
+    # Functions missing a role are counted per group the same way as cells
+    missing = np.stack([function_counts[:, RACI_CODE_LOOKUP[letter]] == 0 for letter in ('A', 'R')], axis=1)
+    missing_rollup = group_rollups(state['row_groups'], len(groups), missing.astype(np.int64))
+    shown = [idx for idx, path in enumerate(groups) if max_depth is None or len(path) <= max_depth]
+    frame = pd.DataFrame({
+        'Group': [' ' * (len(groups[idx]) - 1) + groups[idx][-1] for idx in shown],
+        'Functions': state['sizes'][shown],
+    })
+    for letter in RACI_CODES[1:]:
+        frame[letter] = state['rollup'][shown, RACI_CODE_LOOKUP[letter]]
+    frame['Without A'] = missing_rollup[shown, 0]
+    frame['Without R'] = missing_rollup[shown, 1]
+    return frame
+
+def merge_view_edits(df, rows, edited_view, view_mask):
+    """Write edits made to a subset of df's rows (at positions rows) back into the full matrix.
+
+    Returns (new_df, changed_mask) for commit_raci_edits.
+    """
+    values = df.to_numpy(dtype=object).copy()
+    values[rows] = edited_view.to_numpy(dtype=object)
+    changed_mask = np.zeros(df.shape, dtype=bool)
+    changed_mask[rows] = view_mask
+    return pd.DataFrame(values, index=df.index, columns=df.columns), changed_mask
+
+def function_outline(functions):
+    """Rows for writing functions as an outline, with a heading row for each group.
+
+    Returns (positions, labels, levels) - positions holds each row's function
+    position or -1 for a group heading - or None if no function is grouped.
+    """
+    positions, labels, levels = [], [], []
+    open_path = ()
+    for position, function in enumerate(functions):
+        path = function_path(function)[:-1]
+        shared = 0
+        while shared < min(len(path), len(open_path)) and path[shared] == open_path[shared]:
+            shared += 1
+        for depth in range(shared, len(path)):
+            positions.append(-1)
+            labels.append(FUNCTION_GROUP_SEPARATOR.join(path[:depth + 1]))
+            levels.append(min(depth, GROUP_OUTLINE_MAX_LEVEL))
+        positions.append(position)
+        labels.append(function)
+        levels.append(min(len(path), GROUP_OUTLINE_MAX_LEVEL))
+        open_path = path
+    if not any(levels):
+        return None
+    return np.array(positions, dtype=np.int64), labels, np.array(levels, dtype=np.int64)
+
+# ============================================================================
+# Grid Editor Component
+# ============================================================================
+
+# Virtualized grid in raci_grid/index.html. Only a window of role codes around the
+# viewport is sent per rerun (one digit per cell), so the payload and the browser's
+# work stay bounded however large the matrix is; edits come back as small deltas.
+GRID_COMPONENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'raci_grid')
+GRID_WINDOW_ROWS = int(os.environ.get('RACI_GRID_WINDOW_ROWS', '120'))
+GRID_WINDOW_COLS = int(os.environ.get('RACI_GRID_WINDOW_COLS', '40'))
+GRID_MAX_HEIGHT = 520
+
+def get_grid_component():
+    """The grid component function, or None when its frontend files are missing"""
+    if not os.path.exists(os.path.join(GRID_COMPONENT_DIR, 'index.html')):
+        return None
+    import streamlit.components.v1 as components
+    return components.declare_component('raci_grid', path=GRID_COMPONENT_DIR)
+
+def grid_row_errors(functions, function_errors):
+    """Rule violations of each function, one newline-joined string per function ('' if none)"""
+    return ['\n'.join(function_errors.get(function, ())) for function in functions]
+
+def build_grid_args(df, codes, function_errors, row0=0, col0=0, version=0):
+    """Component arguments for the window of the matrix starting at (row0, col0).
+
+    function_errors maps function names to their rule violations (see session_function_errors).
+    """
+    n_rows, n_cols = codes.shape
+    row0 = int(min(max(row0, 0), max(n_rows - GRID_WINDOW_ROWS, 0)))
+    col0 = int(min(max(col0, 0), max(n_cols - GRID_WINDOW_COLS, 0)))
+    window = codes[row0:row0 + GRID_WINDOW_ROWS, col0:col0 + GRID_WINDOW_COLS]
+    return {
+        'n_rows': n_rows,
+        'n_cols': n_cols,
+        'row0': row0,
+        'col0': col0,
+        'window_rows': window.shape[0],
+        'window_cols': window.shape[1],
+        'cells': (np.ascontiguousarray(window).astype(np.uint8) + ord('0')).tobytes().decode('ascii'),
+        'row_errors': grid_row_errors(df.index[row0:row0 + GRID_WINDOW_ROWS], function_errors),
+        'functions': [str(f) for f in df.index[row0:row0 + GRID_WINDOW_ROWS]],
+        'stakeholders': [str(s) for s in df.columns[col0:col0 + GRID_WINDOW_COLS]],
+        'labels': RACI_CODES,
+        'colors': RACI_COLORS,
+        'version': version,
+        'height': int(min(GRID_MAX_HEIGHT, 34 + n_rows * 28 + 16))
+    }
+
+def apply_grid_edits(df, edits):
+    """Apply [function, stakeholder, code] edits from the grid; returns (new_df, changed_mask)"""
+    rows = df.index.get_indexer([str(edit[0]) for edit in edits])
+    cols = df.columns.get_indexer([str(edit[1]) for edit in edits])
+    codes = np.array([int(edit[2]) for edit in edits], dtype=np.int64)
+    found = (rows >= 0) & (cols >= 0) & (codes >= 0) & (codes < len(RACI_CODES))
+    labels = np.array([RACI_OPTIONS[letter] for letter in RACI_CODES], dtype=object)
+    values = df.to_numpy(dtype=object).copy()
+    values[rows[found], cols[found]] = labels[codes[found]]
+    new_df = pd.DataFrame(values, index=df.index, columns=df.columns)
+    return new_df, diff_raci_frames(df, new_df)
+
+# ============================================================================
+# Performance Instrumentation
+# ============================================================================
+
+# Show the per-rerun timing panel with RACI_PERF_PANEL=1. Set RACI_METRICS_JSONL
+# and/or RACI_METRICS_PROM to a file path to export each rerun's metrics as
+# JSON lines or as a Prometheus text-format file (e.g. for node_exporter's textfile collector).
+PERF_PANEL_ENABLED = os.environ.get('RACI_PERF_PANEL', '') == '1'
+METRICS_JSONL_PATH = os.environ.get('RACI_METRICS_JSONL', '')
+METRICS_PROM_PATH = os.environ.get('RACI_METRICS_PROM', '')
+
+perf_logger = logging.getLogger('raci_app.perf')
+
+# Metrics for the run currently executing (reset by begin_rerun_metrics). Each session's
+# script, and each API request, runs on its own thread, so the collector is thread-local.
+_run_metrics = threading.local()
+
+@st.cache_resource
+def get_process_metrics():
+    """Cumulative metrics shared by every session in this server process"""
+    return {'lock': threading.Lock(), 'reruns': 0, 'interrupted_reruns': 0, 'rerun_seconds': 0.0,
+            'stage_seconds': {}, 'stage_calls': {}, 'counters': {}}
+
+def reset_run_metrics():
+    """Start a fresh metrics collector for the current thread and return it"""
+    _run_metrics.current = {'started_at': time.time(), 'start': time.perf_counter(), 'stages': {}, 'counters': {}}
+    return _run_metrics.current
+
+def current_run_metrics():
+    """Metrics collector of the run executing on this thread"""
+    metrics = getattr(_run_metrics, 'current', None)
+    return metrics if metrics is not None else reset_run_metrics()
+
+def begin_rerun_metrics():
+    """Start collecting metrics for this script run.
+
+    A rerun cut short by st.rerun() never reaches finish_rerun_metrics, so it is
+    flushed (marked interrupted) at the start of the next run instead.
+    """
+    pending = st.session_state.get('perf_inflight')
+    if pending is not None:
+        flush_rerun_metrics(pending, interrupted=True)
+    st.session_state.perf_inflight = reset_run_metrics()
+
+@contextmanager
+def timed_stage(name):
+    """Time a block and add it to the current rerun's stage totals"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics = current_run_metrics()
+        stage = metrics['stages'].setdefault(name, {'seconds': 0.0, 'calls': 0})
+        metrics['last'] = time.perf_counter()
+        stage['seconds'] += metrics['last'] - start
+        stage['calls'] += 1
+
+def count_metric(name, amount=1):
+    """Increment a counter for the current rerun"""
+    counters = current_run_metrics()['counters']
+    counters[name] = counters.get(name, 0) + amount
+
+def summarize_rerun_metrics(metrics):
+    """Build a JSON-serializable summary of one rerun's metrics"""
+    # Interrupted reruns have no 'end'; their last timed stage is the best estimate
+    end = metrics.get('end', metrics.get('last', metrics['start']))
+    return {
+        'timestamp': metrics['started_at'],
+        'total_seconds': round(end - metrics['start'], 6),
+        'stages': {name: {'seconds': round(s['seconds'], 6), 'calls': s['calls']}
+                   for name, s in metrics['stages'].items()},
+        'counters': dict(metrics['counters'])
+    }
+
+def write_prometheus_metrics(path, process_metrics):
+    """Write cumulative process metrics in Prometheus text exposition format"""
+    lines = [
+        '# HELP raci_reruns_total Completed script reruns.',
+        '# TYPE raci_reruns_total counter',
+        f"raci_reruns_total {process_metrics['reruns']}",
+        '# HELP raci_interrupted_reruns_total Reruns cut short by st.rerun().',
+        '# TYPE raci_interrupted_reruns_total counter',
+        f"raci_interrupted_reruns_total {process_metrics['interrupted_reruns']}",
+        '# HELP raci_rerun_seconds_total Wall time spent in script reruns.',
+        '# TYPE raci_rerun_seconds_total counter',
+        f"raci_rerun_seconds_total {process_metrics['rerun_seconds']:.6f}",
+        '# HELP raci_stage_seconds_total Wall time spent in each instrumented stage.',
+        '# TYPE raci_stage_seconds_total counter',
+    ]
+    for name, seconds in sorted(process_metrics['stage_seconds'].items()):
+        lines.append(f'raci_stage_seconds_total{{stage="{name}"}} {seconds:.6f}')
+    lines += ['# HELP raci_stage_calls_total Number of times each instrumented stage ran.',
+              '# TYPE raci_stage_calls_total counter']
+    for name, calls in sorted(process_metrics['stage_calls'].items()):
+        lines.append(f'raci_stage_calls_total{{stage="{name}"}} {calls}')
+    for name, value in sorted(process_metrics['counters'].items()):
+        lines += [f'# TYPE raci_{name}_total counter', f'raci_{name}_total {value}']
+    # Write to a temp file and rename so scrapers never read a partial file
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+
+def flush_rerun_metrics(metrics, interrupted=False):
+    """Log one rerun's metrics and push them to the configured export hooks"""
+    summary = summarize_rerun_metrics(metrics)
+    summary['interrupted'] = interrupted
+    perf_logger.info(json.dumps(summary))
+    
+    process_metrics = get_process_metrics()
+    with process_metrics['lock']:
+        process_metrics['reruns'] += 1
+        if interrupted:
+            process_metrics['interrupted_reruns'] += 1
+        process_metrics['rerun_seconds'] += summary['total_seconds']
+        for name, stage in summary['stages'].items():
+            process_metrics['stage_seconds'][name] = process_metrics['stage_seconds'].get(name, 0.0) + stage['seconds']
+            process_metrics['stage_calls'][name] = process_metrics['stage_calls'].get(name, 0) + stage['calls']
+        for name, value in summary['counters'].items():
+            process_metrics['counters'][name] = process_metrics['counters'].get(name, 0) + value
+        
+        try:
+            if METRICS_JSONL_PATH:
+                with open(METRICS_JSONL_PATH, 'a') as f:
+                    f.write(json.dumps(summary) + '\n')
+            if METRICS_PROM_PATH:
+                write_prometheus_metrics(METRICS_PROM_PATH, process_metrics)
+        except OSError as e:
+            perf_logger.warning(f"Could not export metrics: {str(e)}")
+    return summary
+
+def finish_rerun_metrics():
+    """Close out the current rerun's metrics; returns the summary"""
+    metrics = current_run_metrics()
+    metrics['end'] = time.perf_counter()
+    st.session_state.perf_inflight = None
+    return flush_rerun_metrics(metrics)
+
+def render_performance_panel(summary):
+    """Developer panel with the per-stage breakdown of the last rerun"""
+    with st.expander(f"⏱️ Performance: rerun took {summary['total_seconds'] * 1000:.1f} ms", expanded=False):
+        if summary['stages']:
+            stages_df = pd.DataFrame([
+                {'Stage': name, 'Time (ms)': round(stage['seconds'] * 1000, 2), 'Calls': stage['calls']}
+                for name, stage in summary['stages'].items()
+            ]).sort_values('Time (ms)', ascending=False)
+            st.dataframe(stages_df, use_container_width=True, hide_index=True)
+        if summary['counters']:
+            st.markdown("**Counters:**")
+            st.json(summary['counters'])
+
+def _snowflake_execute(cursor, sql, params=None):
+    """Execute a Snowflake statement, counting round trips and bytes sent"""
+    count_metric('snowflake_round_trips')
+    count_metric('snowflake_bytes_sent', len(sql) + sum(len(str(p)) for p in (params or ())))
+    with timed_stage('snowflake_query'):
+        if params is None:
+            return cursor.execute(sql)
+        return cursor.execute(sql, params)
+
+def _snowflake_executemany(cursor, sql, rows):
+    """Execute a batched Snowflake statement (one round trip for all rows)"""
+    count_metric('snowflake_round_trips')
+    count_metric('snowflake_bytes_sent', len(sql) + sum(len(str(val)) for row in rows for val in row))
+    with timed_stage('snowflake_query'):
+        return cursor.executemany(sql, rows)
+
+def _snowflake_fetch(cursor, fetch_all=False):
+    """Fetch one row (or all rows), counting bytes received"""
+    with timed_stage('snowflake_fetch'):
+        result = cursor.fetchall() if fetch_all else cursor.fetchone()
+    rows = result if fetch_all else ([result] if result else [])
+    count_metric('snowflake_bytes_received', sum(len(str(val)) for row in rows for val in row))
+    return result
+
+# ============================================================================
+# Collaborative Editing
+# ============================================================================
+
+# Sessions in the same room share one matrix through an in-process hub. Every change is
+# an op on one cell or one function/stakeholder; ops merge last-writer-wins by
+# (Lamport clock, site), and version vectors tell which overwrites were concurrent.
+COLLAB_POLL_SECONDS = float(os.environ.get('RACI_COLLAB_POLL_SECONDS', '2'))
+# Ops kept per room; sessions that fall further behind resync from the room snapshot
+COLLAB_LOG_LIMIT = int(os.environ.get('RACI_COLLAB_LOG_LIMIT', '20000'))
+COLLAB_PRESENCE_SECONDS = 30
+# Sessions not seen for this long are dropped, and rooms left without sessions are deleted
+COLLAB_SESSION_TIMEOUT_SECONDS = int(os.environ.get('RACI_COLLAB_SESSION_TIMEOUT', '600'))
+
+@st.cache_resource
+def get_collab_hub():
+    """Rooms shared by every session in this server process"""
+    return {'lock': threading.Lock(), 'rooms': {}, 'swept_at': 0.0}
+
+def _new_collab_room():
+    return {
+        # A deleted and recreated room gets a new epoch, so returning sessions know to reseed it
+        'epoch': hashlib.sha1(os.urandom(16)).hexdigest()[:12],
+        'ops': [], 'base_seq': 0, 'clock': 0, 'vector': {}, 'conflicts': 0,
+        'cells': {},  # (function, stakeholder) -> (lamport, site, counter, value)
+        'cell_keys': {'function': {}, 'stakeholder': {}},  # name -> set of its keys in 'cells'
+        'members': {'function': {}, 'stakeholder': {}},  # name -> (lamport, site, counter, present, order)
+        'sessions': {}
+    }
+
+def _expire_collab_sessions(hub, now):
+    """Drop sessions that stopped polling and delete rooms with none left (call with the hub lock held)"""
+    if now - hub['swept_at'] < COLLAB_PRESENCE_SECONDS:
+        return
+    hub['swept_at'] = now
+    for room_name in list(hub['rooms']):
+        sessions = hub['rooms'][room_name]['sessions']
+        for site in [site for site, seen in sessions.items() if now - seen > COLLAB_SESSION_TIMEOUT_SECONDS]:
+            del sessions[site]
+        if not sessions:
+            del hub['rooms'][room_name]
+
+def _apply_collab_op(room, op):
+    """Merge one op into the room state; True if it won"""
+    if op['kind'] == 'cell':
+        entries, key = room['cells'], op['key']
+    else:
+        entries, key = room['members'][op['kind']], op['key']
+    current = entries.get(key)
+    if current is not None:
+        # The op overwrites a write its author had not seen: a concurrent edit
+        if op['deps'].get(current[1], 0) < current[2] and current[1] != op['site']:
+            room['conflicts'] += 1
+        if (op['lamport'], op['site']) < (current[0], current[1]):
+            return False
+    if op['kind'] == 'cell':
+        entries[key] = (op['lamport'], op['site'], op['counter'], op['value'])
+        if current is None:
+            room['cell_keys']['function'].setdefault(key[0], set()).add(key)
+            room['cell_keys']['stakeholder'].setdefault(key[1], set()).add(key)
+    else:
+        order = current[4] if current is not None else len(entries)
+        entries[key] = (op['lamport'], op['site'], op['counter'], op['value'], order)
+        if not op['value']:
+            # A removed function/stakeholder comes back blank if it is added again
+            other_kind, other_position = ('stakeholder', 1) if op['kind'] == 'function' else ('function', 0)
+            for cell_key in room['cell_keys'][op['kind']].pop(key, ()):
+                del room['cells'][cell_key]
+                other_keys = room['cell_keys'][other_kind][cell_key[other_position]]
+                other_keys.discard(cell_key)
+                if not other_keys:
+                    del room['cell_keys'][other_kind][cell_key[other_position]]
+    return True
+
+def publish_collab_ops(room_name, site, clock, deps, changes):
+    """Append changes [(kind, key, value), ...] from one session to a room's op log.
+
+    Returns the room's Lamport clock after the ops were applied.
+    """
+    hub = get_collab_hub()
+    with hub['lock']:
+        room = hub['rooms'].setdefault(room_name, _new_collab_room())
+        room['sessions'][site] = time.time()
+        lamport = clock + 1
+        counter = room['vector'].get(site, 0)
+        for kind, key, value in changes:
+            counter += 1
+            op = {'seq': room['base_seq'] + len(room['ops']) + 1, 'site': site, 'counter': counter,
+                  'lamport': lamport, 'deps': dict(deps), 'kind': kind, 'key': key, 'value': value}
+            _apply_collab_op(room, op)
+            room['ops'].append(op)
+        room['vector'][site] = counter
+        room['clock'] = max(room['clock'], lamport)
+        if len(room['ops']) > COLLAB_LOG_LIMIT:
+            dropped = len(room['ops']) - COLLAB_LOG_LIMIT // 2
+            del room['ops'][:dropped]
+            room['base_seq'] += dropped
+        return room['clock']
+
+def _collab_room_snapshot(room):
+    """Current functions, stakeholders and assigned cells of a room"""
+    members = {}
+    for kind, entries in room['members'].items():
+        present = [(entry[4], name) for name, entry in entries.items() if entry[3]]
+        members[kind] = [name for _, name in sorted(present)]
+    cells = {key: entry[3] for key, entry in room['cells'].items()}
+    return members['function'], members['stakeholder'], cells
+
+def pull_collab_changes(room_name, site, seq):
+    """Changes to a room since op sequence number seq.
+
+    Returns a dict with the new seq, clock and vector plus either 'snapshot'
+    (functions, stakeholders, cells) when seq fell out of the log, or the resolved
+    values of just the touched cells and the membership after any structural op.
+    """
+    hub = get_collab_hub()
+    with hub['lock']:
+        now = time.time()
+        _expire_collab_sessions(hub, now)
+        room = hub['rooms'].setdefault(room_name, _new_collab_room())
+        room['sessions'][site] = now
+        result = {
+            'epoch': room['epoch'], 'seq': room['base_seq'] + len(room['ops']), 'clock': room['clock'],
+            'vector': dict(room['vector']), 'conflicts': room['conflicts'],
+            'active_sessions': sum(1 for seen in room['sessions'].values() if now - seen < COLLAB_PRESENCE_SECONDS)
+        }
+        if seq < room['base_seq']:
+            result['snapshot'] = _collab_room_snapshot(room)
+            return result
+        
+        new_ops = room['ops'][seq - room['base_seq']:]
+        touched = {op['key'] for op in new_ops if op['kind'] == 'cell'}
+        # A touched cell whose function or stakeholder was removed afterwards is blank
+        result['cells'] = {key: room['cells'][key][3] if key in room['cells'] else '' for key in touched}
+        if any(op['kind'] != 'cell' for op in new_ops):
+            functions, stakeholders, _ = _collab_room_snapshot(room)
+            result['structure'] = (functions, stakeholders)
+            result['removed'] = {kind: sorted({op['key'] for op in new_ops if op['kind'] == kind and not op['value']})
+                                 for kind in ('function', 'stakeholder')}
+        return result
+
+def collab_has_updates(room_name, seq, site=None):
+    """Whether a room has ops after seq (a cheap check for polling); also keeps site's session alive"""
+    hub = get_collab_hub()
+    with hub['lock']:
+        room = hub['rooms'].get(room_name)
+        if room is None:
+            return True  # expired; the pull recreates the room
+        if site is not None:
+            room['sessions'][site] = time.time()
+        return room['base_seq'] + len(room['ops']) > seq
+
+def collab_changes_from_frames(old_df, new_df, changed_mask=None):
+    """Ops [(kind, key, value), ...] turning old_df into new_df"""
+    changes = []
+    if changed_mask is not None:
+        rows, cols = np.nonzero(changed_mask)
+        values = new_df.to_numpy(dtype=object)
+        return [('cell', (str(new_df.index[r]), str(new_df.columns[c])), values[r, c]) for r, c in zip(rows, cols)]
+    
+    for kind, old_labels, new_labels in (('function', old_df.index, new_df.index), ('stakeholder', old_df.columns, new_df.columns)):
+        old_set, new_set = set(map(str, old_labels)), set(map(str, new_labels))
+        changes += [(kind, name, True) for name in map(str, new_labels) if name not in old_set]
+        changes += [(kind, name, False) for name in map(str, old_labels) if name not in new_set]
+    if new_df.empty:
+        return changes
+    old_aligned = old_df.fillna('')
+    if old_aligned.index.is_unique and old_aligned.columns.is_unique and not old_aligned.empty:
+        old_aligned = old_aligned.reindex(index=new_df.index, columns=new_df.columns, fill_value='')
+    else:
+        old_aligned = pd.DataFrame('', index=new_df.index, columns=new_df.columns)
+    new_values = new_df.fillna('').to_numpy(dtype=object)
+    rows, cols = np.nonzero(old_aligned.to_numpy(dtype=object) != new_values)
+    changes += [('cell', (str(new_df.index[r]), str(new_df.columns[c])), new_values[r, c]) for r, c in zip(rows, cols)]
+    return changes
+
+def publish_session_changes(old_df, new_df, changed_mask=None):
+    """Broadcast a committed edit to the session's collaboration room, if it has joined one"""
+    room_name = st.session_state.get('collab_room')
+    if not room_name:
+        return
+    changes = collab_changes_from_frames(old_df, new_df, changed_mask)
+    if changes:
+        st.session_state.collab_clock = publish_collab_ops(
+            room_name, st.session_state.collab_site, st.session_state.collab_clock,
+            st.session_state.collab_vector, changes
+        )
+        count_metric('collab_ops_published', len(changes))
+
+def _collab_frame(functions, stakeholders, cells):
+    df = pd.DataFrame('', index=list(functions), columns=list(stakeholders), dtype=object)
+    return assign_cells(df, cells)
+
+def sync_collab_room():
+    """Apply other sessions' ops to this session's matrix; True if anything changed"""
+    room_name = st.session_state.get('collab_room')
+    if not room_name:
+        return False
+    with timed_stage('collab_pull'):
+        update = pull_collab_changes(room_name, st.session_state.collab_site, st.session_state.collab_seq)
+        if st.session_state.get('collab_epoch') not in (None, update['epoch']):
+            # The room expired while this session was away; seed the new one with this session's matrix
+            st.session_state.collab_epoch = update['epoch']
+            st.session_state.collab_seq = -1
+            if not st.session_state.raci_data.empty:
+                publish_session_changes(pd.DataFrame(), st.session_state.raci_data)
+            return False
+        st.session_state.collab_epoch = update['epoch']
+        st.session_state.collab_seq = update['seq']
+        st.session_state.collab_clock = max(st.session_state.collab_clock, update['clock'])
+        st.session_state.collab_vector = update['vector']
+        st.session_state.collab_status = {key: update[key] for key in ('conflicts', 'active_sessions')}
+        
+        if 'snapshot' in update:
+            functions, stakeholders, cells = update['snapshot']
+            new_df = _collab_frame(functions, stakeholders, cells)
+        elif update['cells'] or 'structure' in update:
+            functions, stakeholders = update.get('structure', (st.session_state.functions, st.session_state.stakeholders))
+            new_df = st.session_state.raci_data.fillna('')
+            removed = update.get('removed', {})
+            if removed.get('function') or removed.get('stakeholder'):
+                # Names removed since the last pull come back blank if they were added again
+                new_df = new_df.drop(index=removed['function'], columns=removed['stakeholder'], errors='ignore')
+            if list(new_df.index) != list(functions) or list(new_df.columns) != list(stakeholders):
+                new_df = new_df.reindex(index=functions, columns=stakeholders, fill_value='') \
+                    if new_df.index.is_unique and new_df.columns.is_unique and not new_df.empty \
+                    else pd.DataFrame('', index=functions, columns=stakeholders, dtype=object)
+            new_df = assign_cells(new_df, update['cells'])
+        else:
+            return False
+        
+        st.session_state.functions = list(new_df.index)
+        st.session_state.stakeholders = list(new_df.columns)
+        commit_raci_edits(new_df, source='collab')
+        count_metric('collab_cells_pulled', len(update.get('cells', ())))
+    return True
+
+def join_collab_room(room_name):
+    """Join (or start) a shared editing room; an empty room is seeded with this session's matrix"""
+    room_name = room_name.strip()
+    if not room_name:
+        return False, "Please enter a room name."
+    if not st.session_state.get('collab_site'):
+        st.session_state.collab_site = hashlib.sha1(os.urandom(16)).hexdigest()[:12]
+    st.session_state.collab_room = room_name
+    st.session_state.collab_seq = -1  # before the log, so the first pull is a full snapshot
+    st.session_state.collab_epoch = None
+    st.session_state.collab_clock = 0
+    st.session_state.collab_vector = {}
+    
+    hub = get_collab_hub()
+    with hub['lock']:
+        room = hub['rooms'].get(room_name)
+        is_empty = room is None or not any(entry[3] for entry in room['members']['function'].values())
+    if is_empty and not st.session_state.raci_data.empty:
+        publish_session_changes(pd.DataFrame(), st.session_state.raci_data)
+        sync_collab_room()
+        return True, f"Started shared room '{room_name}' with the current matrix."
+    sync_collab_room()
+    return True, f"Joined shared room '{room_name}'."
+
+def leave_collab_room():
+    """Stop sharing; the session keeps its current copy of the matrix"""
+    room_name = st.session_state.get('collab_room')
+    if room_name:
+        hub = get_collab_hub()
+        with hub['lock']:
+            room = hub['rooms'].get(room_name)
+            if room is not None:
+                room['sessions'].pop(st.session_state.collab_site, None)
+                if not room['sessions']:
+                    del hub['rooms'][room_name]
+    st.session_state.collab_room = None
+
+# ============================================================================
+# Session Snapshots
+# ============================================================================
+
+# Each browser session autosaves its matrix as an Arrow IPC file named after a token kept
+# in the page URL, so reopening the URL after a restart or disconnect resumes the matrix.
+SNAPSHOT_DIR = os.environ.get('RACI_SNAPSHOT_DIR', '.raci_snapshots')
+SNAPSHOT_TTL_SECONDS = int(os.environ.get('RACI_SNAPSHOT_TTL', str(7 * 24 * 60 * 60)))
+SNAPSHOT_QUERY_PARAM = 'session'
+SNAPSHOT_TOKEN_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+@st.cache_resource
+def get_snapshot_owners():
+    """Token -> id of the Streamlit session that autosaves under it"""
+    return {'lock': threading.Lock(), 'owners': {}}
+
+def _is_connected_session(session_id):
+    from streamlit.runtime import Runtime
+    return Runtime.exists() and Runtime.instance().is_active_session(session_id)
+
+def _claim_snapshot_token(token):
+    """Make this session the token's owner; False if another connected session already owns it"""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    
+    ctx = get_script_run_ctx()
+    session_id = ctx.session_id if ctx else None
+    owners = get_snapshot_owners()
+    with owners['lock']:
+        owner = owners['owners'].get(token)
+        if owner and owner != session_id and _is_connected_session(owner):
+            return False
+        for stale in [t for t, s in owners['owners'].items() if s != session_id and not _is_connected_session(s)]:
+            del owners['owners'][stale]
+        owners['owners'][token] = session_id
+    return True
+
+@st.cache_resource
+def get_snapshot_writer():
+    """Single background writer shared by all sessions; pending snapshots are coalesced per token"""
+    writer = {'executor': ThreadPoolExecutor(max_workers=1, thread_name_prefix='raci-snapshot'),
+              'lock': threading.Lock(), 'pending': {}}
+    writer['executor'].submit(_expire_snapshots)
+    return writer
+
+def _snapshot_path(token):
+    return os.path.join(SNAPSHOT_DIR, f"{token}.arrow")
+
+def _expire_snapshots():
+    """Remove snapshots nobody has resumed within the TTL"""
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return
+    cutoff = time.time() - SNAPSHOT_TTL_SECONDS
+    for entry in os.scandir(SNAPSHOT_DIR):
+        try:
+            if entry.name.endswith('.arrow') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+def _write_snapshot(token):
+    """Write the latest pending snapshot for token (runs on the writer thread)"""
+    import pyarrow as pa
+    
+    writer = get_snapshot_writer()
+    with writer['lock']:
+        df, matrix_name, loaded = writer['pending'].pop(token)
+    path = _snapshot_path(token)
+    try:
+        if df is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        table = build_raci_arrow_table(df, matrix_name)
+        if loaded:
+            # The Snowflake matrix this session edits, so a resumed session saves back to it
+            metadata = dict(table.schema.metadata or {})
+            metadata.update({b'raci:matrix_id': str(loaded['matrix_id']).encode('utf-8'),
+                             b'raci:matrix_version': str(loaded['version']).encode('utf-8')})
+            table = table.replace_schema_metadata(metadata)
+        # Write beside the target and rename, so a crash never leaves a torn snapshot
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with pa.OSFile(temp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as ipc_writer:
+            ipc_writer.write_table(table)
+        os.replace(temp_path, path)
+    except Exception as e:
+        perf_logger.warning("Could not write session snapshot %s: %s", token, e)
+
+def queue_snapshot(token, df, matrix_name='', loaded=None):
+    """Schedule a snapshot of df (None deletes it); only the newest pending one per token is written.
+
+    loaded is the session's loaded_matrix ({'matrix_id', 'version', ...}) or None.
+    """
+    writer = get_snapshot_writer()
+    with writer['lock']:
+        already_queued = token in writer['pending']
+        writer['pending'][token] = (df, matrix_name, dict(loaded) if loaded else None)
+    if not already_queued:
+        writer['executor'].submit(_write_snapshot, token)
+
+def new_session_token():
+    """Start autosaving under a fresh token and put it in the URL"""
+    token = hashlib.sha256(os.urandom(32)).hexdigest()[:32]
+    st.query_params[SNAPSHOT_QUERY_PARAM] = token
+    return token
+
+def get_session_token():
+    """This browser session's snapshot token, created and put in the URL on first use"""
+    if not hasattr(st, 'query_params'):
+        return None
+    token = st.query_params.get(SNAPSHOT_QUERY_PARAM)
+    if not token or not SNAPSHOT_TOKEN_PATTERN.match(token):
+        token = new_session_token()
+    return token
+
+def restore_session_snapshot():
+    """On a fresh session, reload the matrix autosaved under the URL's token (memory-mapped read).
+
+    A URL copied from a tab that is still open starts from that tab's snapshot under a
+    token of its own, so the two sessions never autosave over each other.
+    Returns a message describing what was restored, or None.
+    """
+    if st.session_state.get('snapshot_checked'):
+        return None
+    st.session_state.snapshot_checked = True
+    source_token = token = get_session_token()
+    if token and not _claim_snapshot_token(token):
+        token = new_session_token()
+        _claim_snapshot_token(token)
+    st.session_state.snapshot_token = token
+    if not token or st.session_state.functions or not os.path.exists(_snapshot_path(source_token)):
+        return None
+    try:
+        with timed_stage('restore_snapshot'):
+            functions, stakeholders, raci_df, metadata = read_columnar_matrix(_snapshot_path(source_token))
+    except Exception as e:
+        return f"Could not restore your previous matrix: {str(e)}"
+    st.session_state.functions = functions
+    st.session_state.stakeholders = stakeholders
+    st.session_state.raci_data = raci_df
+    if metadata.get('raci:matrix_id'):
+        st.session_state.loaded_matrix = {'matrix_id': metadata['raci:matrix_id'],
+                                          'matrix_name': metadata.get('raci:matrix_name', ''),
+                                          'version': int(metadata.get('raci:matrix_version', '1'))}
+    # A copy taken over from another tab is written under the new token on the first autosave
+    st.session_state.snapshot_source = raci_df if token == source_token else None
+    st.session_state.snapshot_loaded = _snapshot_loaded_key()
+    saved_at = metadata.get('raci:exported_at', '')[:19].replace('T', ' ')
+    restored = f"({len(functions)} functions, {len(stakeholders)} stakeholders) from {saved_at or 'the last autosave'} UTC"
+    if token != source_token:
+        return f"This link is open in another tab; you have your own copy of its matrix {restored}."
+    return f"Restored your unsaved matrix {restored}."
+
+def autosave_session_snapshot():
+    """Queue a snapshot if the matrix object or the loaded Snowflake matrix changed since the last one.
+
+    The session matrix is replaced rather than edited in place, so an identity
+    check is enough; the Arrow conversion and the write happen on the writer thread.
+    """
+    token = st.session_state.get('snapshot_token')
+    df = st.session_state.raci_data
+    loaded_key = _snapshot_loaded_key()
+    if not token or (df is st.session_state.get('snapshot_source')
+                     and loaded_key == st.session_state.get('snapshot_loaded')):
+        return
+    st.session_state.snapshot_source = df
+    st.session_state.snapshot_loaded = loaded_key
+    loaded = st.session_state.get('loaded_matrix')
+    queue_snapshot(token, None if df.empty else df, (loaded or {}).get('matrix_name', ''), loaded)
+    count_metric('snapshots_queued')
+
+def _snapshot_loaded_key():
+    """Identity of the loaded Snowflake matrix; saving bumps its version without replacing the frame"""
+    loaded = st.session_state.get('loaded_matrix') or {}
+    return (loaded.get('matrix_id'), loaded.get('version'), loaded.get('matrix_name'))
+
+# ============================================================================
+# Change Log
+# ============================================================================
+
+# Every committed edit is recorded as append-only change events. Events are buffered in
+# memory and written in batches by a background thread, so editing never waits on storage.
+AUDIT_STORE = os.environ.get('RACI_AUDIT_STORE', 'auto')  # auto, snowflake, local or off
+AUDIT_DIR = os.environ.get('RACI_AUDIT_DIR', '.raci_audit')
+AUDIT_FLUSH_EVENTS = int(os.environ.get('RACI_AUDIT_FLUSH_EVENTS', '500'))
+AUDIT_FLUSH_SECONDS = float(os.environ.get('RACI_AUDIT_FLUSH_SECONDS', '5'))
+AUDIT_MAX_BUFFERED = int(os.environ.get('RACI_AUDIT_MAX_BUFFERED', '200000'))
+AUDIT_QUERY_LIMIT = 5000
+AUDIT_COLUMNS = ['event_time', 'matrix_id', 'matrix_name', 'user_name', 'session_id', 'source',
+                 'action', 'function_name', 'stakeholder_name', 'old_value', 'new_value']
+# Edits that replace the whole matrix are logged as one event rather than one per cell
+AUDIT_WHOLE_MATRIX_SOURCES = ('import', 'template', 'merge_matrices', 'switch_sheet', 'snowflake_load')
+
+INSERT_AUDIT_SQL = f"""
+INSERT INTO raci_change_log ({', '.join(AUDIT_COLUMNS)})
+VALUES ({', '.join(['%s'] * len(AUDIT_COLUMNS))})
+"""
+
+def _resolve_audit_store():
+    if AUDIT_STORE in ('snowflake', 'local', 'off'):
+        return AUDIT_STORE
+    try:
+        return 'snowflake' if 'snowflake' in st.secrets else 'local'
+    except Exception:
+        return 'local'
+
+@st.cache_resource
+def get_audit_log():
+    """Process-wide change event buffer with its background flush thread"""
+    import atexit
+    
+    log = {'lock': threading.Lock(), 'flush_lock': threading.Lock(), 'wake': threading.Event(),
+           'batches': [], 'buffered': 0, 'dropped': 0, 'store': _resolve_audit_store()}
+    if log['store'] != 'off':
+        threading.Thread(target=_audit_flush_loop, args=(log,), name='raci-audit', daemon=True).start()
+        atexit.register(flush_audit_log, log)
+    return log
+
+def _audit_flush_loop(log):
+    while True:
+        log['wake'].wait(AUDIT_FLUSH_SECONDS)
+        log['wake'].clear()
+        flush_audit_log(log)
+
+def _audit_value(value):
+    return '' if value is None or (isinstance(value, float) and np.isnan(value)) else str(value)
+
+def record_audit_events(context, events):
+    """Buffer change events [(action, function, stakeholder, old_value, new_value), ...].
+
+    context holds the fields shared by the batch: matrix_id, matrix_name, user_name,
+    session_id and source. Nothing is written here; see flush_audit_log.
+    """
+    log = get_audit_log()
+    if not events or log['store'] == 'off':
+        return
+    from datetime import datetime, timezone
+    
+    batch = dict(context, event_time=datetime.now(timezone.utc).replace(tzinfo=None).isoformat(timespec='milliseconds'),
+                 events=events)
+    with log['lock']:
+        if log['buffered'] + len(events) > AUDIT_MAX_BUFFERED:
+            log['dropped'] += len(events)
+            perf_logger.warning("Change log buffer full; dropped %d event(s)", len(events))
+            return
+        log['batches'].append(batch)
+        log['buffered'] += len(events)
+        buffer_full = log['buffered'] >= AUDIT_FLUSH_EVENTS
+    if buffer_full:
+        log['wake'].set()
+    count_metric('audit_events', len(events))
+
+def _audit_rows(batches):
+    """Flatten buffered batches into rows in AUDIT_COLUMNS order"""
+    rows = []
+    for batch in batches:
+        shared = tuple(str(batch.get(column) or '') for column in AUDIT_COLUMNS[:6])
+        rows.extend(shared + tuple(event) for event in batch['events'])
+    return rows
+
+def _audit_partition(matrix_id):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', matrix_id)[:120] or '_'
+
+def _write_audit_local(rows):
+    """Append rows as JSON lines, partitioned by day and matrix so queries read only what they need"""
+    partitions = {}
+    for row in rows:
+        key = (row[0][:10], _audit_partition(row[1]))
+        partitions.setdefault(key, []).append(json.dumps(dict(zip(AUDIT_COLUMNS, row))))
+    for (day, matrix_part), lines in partitions.items():
+        day_dir = os.path.join(AUDIT_DIR, f"date={day}")
+        os.makedirs(day_dir, exist_ok=True)
+        with open(os.path.join(day_dir, f"matrix={matrix_part}.jsonl"), 'a', encoding='utf-8') as handle:
+            handle.write('\n'.join(lines) + '\n')
+
+def _write_audit_snowflake(log, rows):
+    conn, error = get_snowflake_connection()
+    if error:
+        raise RuntimeError(error)
+    try:
+        success, error = initialize_snowflake_table(conn)
+        if not success:
+            raise RuntimeError(error)
+        cursor = conn.cursor()
+        _snowflake_executemany(cursor, INSERT_AUDIT_SQL, rows)
+        cursor.close()
+    finally:
+        conn.close()
+
+def flush_audit_log(log=None):
+    """Write every buffered event to the store in one batch; returns the number of events written.
+
+    Runs on the flush thread every AUDIT_FLUSH_SECONDS (sooner once AUDIT_FLUSH_EVENTS are
+    buffered) and before queries. Events that fail to write are kept for the next attempt.
+    """
+    log = log if log is not None else get_audit_log()
+    with log['flush_lock']:
+        with log['lock']:
+            batches, log['batches'], log['buffered'] = log['batches'], [], 0
+        if not batches:
+            return 0
+        rows = _audit_rows(batches)
+        try:
+            if log['store'] == 'snowflake':
+                _write_audit_snowflake(log, rows)
+            else:
+                _write_audit_local(rows)
+        except Exception as e:
+            perf_logger.warning("Could not write %d change event(s) to the %s change log: %s", len(rows), log['store'], e)
+            with log['lock']:
+                log['batches'] = batches + log['batches']
+                log['buffered'] += len(rows)
+            return 0
+        return len(rows)
+
+def audit_events_from_frames(old_df, new_df, changed_mask=None, renamed=None):
+    """Change events turning old_df into new_df.
+
+    renamed maps an axis (0 = functions, 1 = stakeholders) to {old name: new name}, so
+    renamed labels are logged as renames instead of a removal plus an addition.
+    """
+    if changed_mask is not None:
+        rows, cols = np.nonzero(changed_mask)
+        old_values = old_df.to_numpy(dtype=object)[rows, cols]
+        new_values = new_df.to_numpy(dtype=object)[rows, cols]
+        return [('set', str(new_df.index[r]), str(new_df.columns[c]), _audit_value(old), _audit_value(new))
+                for r, c, old, new in zip(rows, cols, old_values, new_values)]
+    
+    renamed = renamed or {}
+    old_labels = []
+    events = []
+    for axis, kind, old_axis, new_axis in ((0, 'function', old_df.index, new_df.index), (1, 'stakeholder', old_df.columns, new_df.columns)):
+        renames = {old: new for old, new in renamed.get(axis, {}).items() if old != new}
+        mapped = [renames.get(str(label), str(label)) for label in old_axis]
+        old_labels.append(mapped)
+        old_set, new_set = set(mapped), set(map(str, new_axis))
+        label_event = (lambda name: (name, '')) if axis == 0 else (lambda name: ('', name))
+        events += [(f'rename_{kind}', *label_event(new), old, new) for old, new in renames.items() if new in new_set]
+        events += [(f'add_{kind}', *label_event(name), '', '') for name in map(str, new_axis) if name not in old_set]
+        events += [(f'remove_{kind}', *label_event(name), '', '') for name in mapped if name not in new_set]
+    if new_df.empty:
+        return events
+    
+    old_aligned = old_df.fillna('').set_axis(old_labels[0], axis=0).set_axis(old_labels[1], axis=1)
+    new_aligned = new_df.fillna('').set_axis([str(f) for f in new_df.index], axis=0).set_axis([str(s) for s in new_df.columns], axis=1)
+    if old_aligned.index.is_unique and old_aligned.columns.is_unique and not old_aligned.empty:
+        old_aligned = old_aligned.reindex(index=new_aligned.index, columns=new_aligned.columns, fill_value='')
+    else:
+        old_aligned = pd.DataFrame('', index=new_aligned.index, columns=new_aligned.columns)
+    old_values, new_values = old_aligned.to_numpy(dtype=object), new_aligned.to_numpy(dtype=object)
+    rows, cols = np.nonzero(old_values != new_values)
+    events += [('set', new_aligned.index[r], new_aligned.columns[c], _audit_value(old_values[r, c]), _audit_value(new_values[r, c]))
+               for r, c in zip(rows, cols)]
+    return events
+
+def current_audit_user():
+    """Name recorded with this session's changes: the name entered in the app, else the signed-in user's email"""
+    name = str(st.session_state.get('audit_user_name') or '').strip()
+    if name:
+        return name
+    try:
+        email = st.user.get('email') if hasattr(st, 'user') else None
+    except Exception:
+        email = None
+    return email or 'anonymous'
+
+def session_audit_context(source):
+    """Change log fields for this session: the loaded Snowflake matrix, or the unsaved session matrix"""
+    loaded = st.session_state.get('loaded_matrix') or {}
+    session_id = st.session_state.get('snapshot_token') or ''
+    return {
+        'matrix_id': loaded.get('matrix_id') or f"session:{session_id or 'unsaved'}",
+        'matrix_name': loaded.get('matrix_name', ''),
+        'user_name': current_audit_user(),
+        'session_id': session_id,
+        'source': source
+    }
+
+def record_session_changes(old_df, new_df, changed_mask=None, source='editor', renamed=None):
+    """Log a committed session edit; failures are logged and never interrupt editing"""
+    try:
+        with timed_stage('audit_log'):
+            if source in AUDIT_WHOLE_MATRIX_SOURCES:
+                events = [('replace_matrix', '', '', f"{old_df.shape[0]} x {old_df.shape[1]}", f"{new_df.shape[0]} x {new_df.shape[1]}")]
+            else:
+                events = audit_events_from_frames(old_df, new_df, changed_mask, renamed)
+            record_audit_events(session_audit_context(source), events)
+    except Exception as e:
+        perf_logger.warning("Could not record change events: %s", e)
+
+def query_audit_log(matrix_id=None, user=None, start=None, end=None, limit=AUDIT_QUERY_LIMIT):
+    """Change events matching all given filters, newest first.
+
+    start and end are UTC datetimes (either may be None). Buffered events are flushed
+    first so a session sees its own latest edits. Returns (success, message, events).
+    """
+    log = get_audit_log()
+    if log['store'] == 'off':
+        return False, "The change log is turned off (RACI_AUDIT_STORE=off).", []
+    flush_audit_log(log)
+    from datetime import timezone
+    start, end = [value.astimezone(timezone.utc).replace(tzinfo=None) if value is not None and value.tzinfo else value
+                  for value in (start, end)]
+    start_text = start.isoformat(timespec='milliseconds') if start else ''
+    end_text = end.isoformat(timespec='milliseconds') if end else ''
+    
+    if log['store'] == 'snowflake':
+        try:
+            conn, error = get_snowflake_connection()
+            if error:
+                return False, error, []
+            conditions, params = [], []
+            for column, operator, value in (('matrix_id', '=', matrix_id), ('user_name', '=', user),
+                                            ('event_time', '>=', start_text), ('event_time', '<', end_text)):
+                if value:
+                    conditions.append(f"{column} {operator} %s")
+                    params.append(value)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            cursor = conn.cursor()
+            _snowflake_execute(cursor, f"SELECT {', '.join(AUDIT_COLUMNS)} FROM raci_change_log {where} "
+                                       f"ORDER BY event_time DESC LIMIT %s", params + [int(limit)])
+            rows = _snowflake_fetch(cursor, fetch_all=True)
+            cursor.close()
+            conn.close()
+        except Exception as e:
+            return False, f"Error reading the change log: {str(e)}", []
+        events = [dict(zip(AUDIT_COLUMNS, [str(value) if value is not None else '' for value in row])) for row in rows]
+        return True, f"{len(events)} change(s) found.", events
+    
+    # Local store: only the day partitions in range, and only the matrix's files when one is given
+    if not os.path.isdir(AUDIT_DIR):
+        return True, "0 change(s) found.", []
+    events = []
+    file_name = f"matrix={_audit_partition(matrix_id)}.jsonl" if matrix_id else None
+    try:
+        for day_entry in sorted(os.scandir(AUDIT_DIR), key=lambda entry: entry.name, reverse=True):
+            day = day_entry.name[len('date='):]
+            if not day_entry.name.startswith('date=') or (start_text and day < start_text[:10]) or (end_text and day > end_text[:10]):
+                continue
+            paths = [os.path.join(day_entry.path, file_name)] if file_name else \
+                    [entry.path for entry in os.scandir(day_entry.path) if entry.name.endswith('.jsonl')]
+            for path in paths:
+                if not os.path.exists(path):
+                    continue
+                with open(path, encoding='utf-8') as handle:
+                    for line in handle:
+                        event = json.loads(line)
+                        if (matrix_id and event['matrix_id'] != matrix_id) or (user and event['user_name'] != user) or \
+                           (start_text and event['event_time'] < start_text) or (end_text and event['event_time'] >= end_text):
+                            continue
+                        events.append(event)
+            # Days are read newest first, so older days cannot displace what was already found
+            if len(events) >= limit:
+                break
+    except Exception as e:
+        return False, f"Error reading the change log: {str(e)}", []
+    events.sort(key=lambda event: event['event_time'], reverse=True)
+    return True, f"{len(events)} change(s) found.", events[:limit]
+
+# ============================================================================
+# Snowflake Integration Functions
+# ============================================================================
+
+def get_snowflake_connection():
+    """Get Snowflake connection using Streamlit secrets (supports password or key pair auth)"""
+    try:
+        import snowflake.connector
+        from cryptography.hazmat.primitives import serialization
+        
+        # Get credentials from Streamlit secrets
+        # Supports both password and key pair authentication
+        if 'snowflake' not in st.secrets:
+            return None, "Snowflake credentials not found in Streamlit secrets. Please configure secrets.toml"
+        
+        snowflake_config = st.secrets['snowflake']
+        
+        # Build connection parameters
+        conn_params = {
+            'account': snowflake_config['account'],
+            'user': snowflake_config['user'],
+            'warehouse': snowflake_config.get('warehouse', ''),
+            'database': snowflake_config.get('database', ''),
+            'schema': snowflake_config.get('schema', ''),
+            'role': snowflake_config.get('role', '')
+        }
+        
+        # Check for key pair authentication (preferred)
+        if 'private_key' in snowflake_config or 'private_key_path' in snowflake_config:
+            # Key pair authentication
+            private_key = None
+            
+            if 'private_key_path' in snowflake_config:
+                # Read private key from file
+                with open(snowflake_config['private_key_path'], 'rb') as key_file:
+                    private_key = serialization.load_pem_private_key(
+                        key_file.read(),
+                        password=None,
+                    )
+            elif 'private_key' in snowflake_config:
+                # Read private key from string content
+                private_key_content = snowflake_config['private_key']
+                # Handle multi-line strings with triple quotes
+                if isinstance(private_key_content, str):
+                    private_key = serialization.load_pem_private_key(
+                        private_key_content.encode('utf-8'),
+                        password=None,
+                    )
+            
+            if private_key:
+                # Convert to PEM format for Snowflake connector
+                pkb = private_key.private_bytes(
+                    encoding=serialization.Encoding.PEM,
+                    format=serialization.PrivateFormat.PKCS8,
+                    encryption_algorithm=serialization.NoEncryption()
+                )
+                conn_params['private_key'] = pkb
+            else:
+                return None, "Failed to load private key for key pair authentication"
+        elif 'password' in snowflake_config:
+            # Password authentication (fallback)
+            conn_params['password'] = snowflake_config['password']
+        else:
+            return None, "Either 'password' or 'private_key'/'private_key_path' must be provided in Snowflake secrets"
+        
+        count_metric('snowflake_connections')
+        with timed_stage('snowflake_connect'):
+            conn = snowflake.connector.connect(**conn_params)
+        
+        return conn, None
+    except ImportError as e:
+        missing_module = str(e)
+        if 'cryptography' in missing_module:
+            return None, "cryptography package required for key pair auth. Install: pip install cryptography"
+        return None, "snowflake-connector-python not installed. Please install it: pip install snowflake-connector-python"
+    except Exception as e:
+        return None, f"Error connecting to Snowflake: {str(e)}"
+
+# Connection targets whose tables and columns are known to exist in this process
+_snowflake_schema_ready = set()
+_snowflake_schema_lock = threading.Lock()
+
+def initialize_snowflake_table(conn):
+    """Initialize/create the RACI matrices table in Snowflake.
+
+    The DDL runs once per process for each account/database/schema; later calls return at once.
+    """
+    schema_key = tuple(getattr(conn, attr, None) for attr in ('account', 'database', 'schema'))
+    if schema_key in _snowflake_schema_ready:
+        return True, None
+    with _snowflake_schema_lock:
+        if schema_key in _snowflake_schema_ready:
+            return True, None
+        success, error = _create_snowflake_tables(conn)
+        if success:
+            _snowflake_schema_ready.add(schema_key)
+        return success, error
+
+def _create_snowflake_tables(conn):
+    try:
+        cursor = conn.cursor()
+        
+        # Create table if it doesn't exist
+        # Use fully qualified name if database/schema are specified
+        create_table_sql = """
+        CREATE TABLE IF NOT EXISTS raci_matrices (
+            matrix_id VARCHAR(255),
+            matrix_name VARCHAR(500),
+            functions VARIANT,
+            stakeholders VARIANT,
+            raci_data VARIANT,
+            created_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+            updated_at TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+            created_by VARCHAR(255),
+            PRIMARY KEY (matrix_id)
+        )
+        """
+        
+        _snowflake_execute(cursor, create_table_sql)
+        
+        # Inverted index of every assigned cell, so cross-matrix searches never read the raci_data blobs
+        create_index_sql = """
+        CREATE TABLE IF NOT EXISTS raci_matrix_index (
+            matrix_id VARCHAR(255),
+            matrix_name VARCHAR(500),
+            function_name VARCHAR(1000),
+            stakeholder_name VARCHAR(500),
+            role VARCHAR(1)
+        )
+        CLUSTER BY (stakeholder_name, role)
+        """
+        _snowflake_execute(cursor, create_index_sql)
+        
+        # Matrices saved before the index existed have no indexed_at and get backfilled on demand
+        _snowflake_execute(cursor, "ALTER TABLE raci_matrices ADD COLUMN IF NOT EXISTS indexed_at TIMESTAMP_NTZ")
+        # Row version for optimistic concurrency: every update must name the version it started from
+        _snowflake_execute(cursor, "ALTER TABLE raci_matrices ADD COLUMN IF NOT EXISTS version NUMBER DEFAULT 1")
+        _snowflake_execute(cursor, "ALTER TABLE raci_matrices ADD COLUMN IF NOT EXISTS updated_by VARCHAR(255)")
+        
+        # Append-only change events, clustered so per-matrix and time-range queries prune well
+        create_change_log_sql = """
+        CREATE TABLE IF NOT EXISTS raci_change_log (
+            event_time TIMESTAMP_NTZ,
+            matrix_id VARCHAR(255),
+            matrix_name VARCHAR(500),
+            user_name VARCHAR(255),
+            session_id VARCHAR(64),
+            source VARCHAR(50),
+            action VARCHAR(50),
+            function_name VARCHAR(1000),
+            stakeholder_name VARCHAR(500),
+            old_value VARCHAR(1000),
+            new_value VARCHAR(1000)
+        )
+        CLUSTER BY (matrix_id, TO_DATE(event_time))
+        """
+        _snowflake_execute(cursor, create_change_log_sql)
+        cursor.close()
+        return True, None
+    except Exception as e:
+        return False, f"Error initializing Snowflake table: {str(e)}"
+
+INSERT_INDEX_SQL = """
+INSERT INTO raci_matrix_index (matrix_id, matrix_name, function_name, stakeholder_name, role)
+VALUES (%s, %s, %s, %s, %s)
+"""
+
+def build_matrix_index_rows(matrix_id, matrix_name, raci_data):
+    """Build (matrix, function, stakeholder, role) index rows for every assigned cell"""
+    codes = encode_raci_codes(raci_data)
+    row_positions, col_positions = np.nonzero(codes)
+    functions = [str(f) for f in raci_data.index]
+    stakeholders = [str(s) for s in raci_data.columns]
+    return [
+        (matrix_id, matrix_name, functions[row], stakeholders[col], RACI_CODES[code])
+        for row, col, code in zip(row_positions, col_positions, codes[row_positions, col_positions])
+    ]
+
+# raci_data holds a compact payload: the role code grid (one nibble per cell, in the order of
+# the functions and stakeholders columns) zlib-compressed and base64-encoded. Matrices saved
+# before it hold {function: {stakeholder: label}} and are still read.
+RACI_PAYLOAD_FORMAT = 'raci-codes-v1'
+
+def encode_raci_payload(raci_data, functions, stakeholders):
+    """Encode a matrix as a compact raci_data payload aligned with the functions/stakeholders lists"""
+    import base64
+    import zlib
+    
+    if [str(f) for f in raci_data.index] != [str(f) for f in functions] or \
+            [str(s) for s in raci_data.columns] != [str(s) for s in stakeholders]:
+        raci_data = raci_data.reindex(index=functions, columns=stakeholders)
+    codes = encode_raci_codes(raci_data).astype(np.uint8).ravel()
+    if codes.size % 2:
+        codes = np.append(codes, np.uint8(0))
+    packed = (codes[0::2] << 4) | codes[1::2]
+    return {
+        'format': RACI_PAYLOAD_FORMAT,
+        'shape': [len(functions), len(stakeholders)],
+        'codes': base64.b64encode(zlib.compress(packed.tobytes(), 6)).decode('ascii')
+    }
+
+# Legacy payloads are {function: {stakeholder: label}}, so a function named "format" must not
+# make a row look compact: the compact form has a string 'format' alongside 'codes' and 'shape'
+COMPACT_PAYLOAD_SQL = "COALESCE(IS_VARCHAR({column}:format) AND {column}:codes IS NOT NULL AND {column}:shape IS NOT NULL, FALSE)"
+
+def is_compact_payload(payload):
+    """True if a raci_data payload is in the compact form written by encode_raci_payload"""
+    return isinstance(payload, dict) and isinstance(payload.get('format'), str) and \
+        'codes' in payload and 'shape' in payload
+
+def decode_raci_payload(payload, functions, stakeholders):
+    """Decode a raci_data payload (compact or legacy) into a matrix indexed by functions x stakeholders"""
+    import base64
+    import zlib
+    
+    if is_compact_payload(payload) and payload['format'] == RACI_PAYLOAD_FORMAT:
+        n_rows, n_cols = payload['shape']
+        if n_rows != len(functions) or n_cols != len(stakeholders):
+            raise ValueError("Stored matrix payload does not match its functions and stakeholders.")
+        packed = np.frombuffer(zlib.decompress(base64.b64decode(payload['codes'])), dtype=np.uint8)
+        codes = np.empty(packed.size * 2, dtype=np.uint8)
+        codes[0::2], codes[1::2] = packed >> 4, packed & 0x0F
+        codes = codes[:n_rows * n_cols]
+        if codes.size != n_rows * n_cols or (codes.size and codes.max() >= len(RACI_CODES)):
+            raise ValueError("Stored matrix payload is corrupt.")
+        labels = np.array([RACI_OPTIONS[letter] for letter in RACI_CODES], dtype=object)
+        return pd.DataFrame(labels[codes].reshape(n_rows, n_cols), index=functions, columns=stakeholders)
+    if is_compact_payload(payload):
+        raise ValueError(f"Unsupported matrix payload format '{payload['format']}'.")
+    raci_data = pd.DataFrame.from_dict(payload or {}, orient='index')
+    # Older saves may hold the raw header text, so labels are matched on their stripped text
+    labeled = raci_data.set_axis([str(f).strip() for f in raci_data.index], axis=0).set_axis(
+        [str(s).strip() for s in raci_data.columns], axis=1
+    )
+    if not labeled.index.is_unique or not labeled.columns.is_unique:
+        return raci_data.fillna('')
+    aligned = labeled.reindex(index=[str(f).strip() for f in functions], columns=[str(s).strip() for s in stakeholders])
+    return aligned.set_axis(functions, axis=0).set_axis(stakeholders, axis=1).fillna('')
+
+def save_to_snowflake(matrix_name, functions, stakeholders, raci_data, created_by="user"):
+    """Save RACI matrix to Snowflake as a new matrix (version 1); returns (success, message, matrix_id)"""
+    try:
+        conn, error = get_snowflake_connection()
+        if error:
+            return False, error, None
+        
+        # Initialize table
+        success, error = initialize_snowflake_table(conn)
+        if not success:
+            conn.close()
+            return False, error, None
+        
+        # Generate unique matrix ID
+        import uuid
+        import json
+        from datetime import datetime
+        
+        matrix_id = str(uuid.uuid4())
+        
+        # Convert data to JSON for VARIANT storage
+        functions_json = json.dumps(functions)
+        stakeholders_json = json.dumps(stakeholders)
+        
+        # Store the role codes compactly; the labels are already in functions/stakeholders
+        raci_data_json = json.dumps(encode_raci_payload(raci_data, functions, stakeholders))
+        
+        cursor = conn.cursor()
+        
+        # Check if matrix with this name already exists (optional: allow updates by name)
+        # For now, always insert new (each save creates a new matrix_id)
+        # If you want to update by name, you'd need to query first
+        
+        # Insert new record and its index rows in one transaction so the index never drifts
+        insert_sql = """
+        INSERT INTO raci_matrices (matrix_id, matrix_name, functions, stakeholders, raci_data, created_by, indexed_at, version, updated_by)
+        VALUES (%s, %s, PARSE_JSON(%s), PARSE_JSON(%s), PARSE_JSON(%s), %s, CURRENT_TIMESTAMP(), 1, %s)
+        """
+        index_rows = build_matrix_index_rows(matrix_id, matrix_name, raci_data)
+        
+        _snowflake_execute(cursor, "BEGIN")
+        try:
+            _snowflake_execute(cursor, insert_sql, (
+                matrix_id, matrix_name, functions_json, stakeholders_json, raci_data_json, created_by, created_by
+            ))
+            if index_rows:
+                _snowflake_executemany(cursor, INSERT_INDEX_SQL, index_rows)
+            _snowflake_execute(cursor, "COMMIT")
+        except Exception:
+            _snowflake_execute(cursor, "ROLLBACK")
+            raise
+        
+        cursor.close()
+        conn.close()
+        
+        return True, f"Successfully saved '{matrix_name}' to Snowflake (ID: {matrix_id})", matrix_id
+    except Exception as e:
+        return False, f"Error saving to Snowflake: {str(e)}", None
+
+def _describe_version_conflict(cursor, matrix_id, expected_version, advice):
+    """Explain why a versioned write matched no row (reads only the row's metadata, never the blob)"""
+    _snowflake_execute(cursor, """
+        SELECT COALESCE(version, 1), updated_at, COALESCE(updated_by, created_by)
+        FROM raci_matrices
+        WHERE matrix_id = %s
+        """, (matrix_id,))
+    current = _snowflake_fetch(cursor)
+    if not current:
+        return "This matrix was deleted from Snowflake by someone else."
+    version, updated_at, updated_by = current
+    return (f"This matrix was changed by {updated_by} at {updated_at} (now version {version}; "
+            f"you loaded version {expected_version}). {advice}")
+
+def update_snowflake_matrix(matrix_id, expected_version, matrix_name, functions, stakeholders, raci_data, updated_by="user"):
+    """Overwrite a saved matrix only if it is still at expected_version (compare-and-swap).
+
+    The version check and the write are one conditional UPDATE, so concurrent
+    writers need no lock: exactly one of them matches the row and the others
+    see zero affected rows. Returns (success, message, new_version, conflict).
+    """
+    try:
+        conn, error = get_snowflake_connection()
+        if error:
+            return False, error, None, False
+        
+        success, error = initialize_snowflake_table(conn)
+        if not success:
+            conn.close()
+            return False, error, None, False
+        
+        update_sql = """
+        UPDATE raci_matrices
+        SET matrix_name = %s,
+            functions = PARSE_JSON(%s),
+            stakeholders = PARSE_JSON(%s),
+            raci_data = PARSE_JSON(%s),
+            version = COALESCE(version, 1) + 1,
+            updated_at = CURRENT_TIMESTAMP(),
+            updated_by = %s,
+            indexed_at = CURRENT_TIMESTAMP()
+        WHERE matrix_id = %s AND COALESCE(version, 1) = %s
+        """
+        index_rows = build_matrix_index_rows(matrix_id, matrix_name, raci_data)
+        
+        cursor = conn.cursor()
+        _snowflake_execute(cursor, "BEGIN")
+        try:
+            _snowflake_execute(cursor, update_sql, (
+                matrix_name, json.dumps(functions), json.dumps(stakeholders),
+                json.dumps(encode_raci_payload(raci_data, functions, stakeholders)), updated_by, matrix_id, expected_version
+            ))
+            if cursor.rowcount == 0:
+                _snowflake_execute(cursor, "ROLLBACK")
+                message = _describe_version_conflict(
+                    cursor, matrix_id, expected_version,
+                    "Reload it to see their changes, or save yours as a new matrix."
+                )
+                cursor.close()
+                conn.close()
+                count_metric('snowflake_version_conflicts')
+                return False, message, None, True
+            _snowflake_execute(cursor, "DELETE FROM raci_matrix_index WHERE matrix_id = %s", (matrix_id,))
+            if index_rows:
+                _snowflake_executemany(cursor, INSERT_INDEX_SQL, index_rows)
+            _snowflake_execute(cursor, "COMMIT")
+        except Exception:
+            _snowflake_execute(cursor, "ROLLBACK")
+            raise
+        
+        cursor.close()
+        conn.close()
+        
+        new_version = expected_version + 1
+        return True, f"Successfully updated '{matrix_name}' (version {new_version})", new_version, False
+    except Exception as e:
+        return False, f"Error saving to Snowflake: {str(e)}", None, False
+
+def load_matrix_record(matrix_id):
+    """Load a saved matrix with its metadata; returns (success, message, record).
+
+    The record is a dict with matrix_id, matrix_name, functions, stakeholders,
+    raci_data, version and updated_by.
+    """
+    try:
+        import json
+        
+        conn, error = get_snowflake_connection()
+        if error:
+            return False, error, None
+        
+        cursor = conn.cursor()
+        
+        select_sql = """
+        SELECT matrix_name, functions, stakeholders, raci_data, COALESCE(version, 1), COALESCE(updated_by, created_by)
+        FROM raci_matrices
+        WHERE matrix_id = %s
+        """
+        
+        _snowflake_execute(cursor, select_sql, (matrix_id,))
+        result = _snowflake_fetch(cursor)
+        
+        cursor.close()
+        conn.close()
+        
+        if not result:
+            return False, "Matrix not found", None
+        
+        matrix_name, functions_json, stakeholders_json, raci_data_json, version, updated_by = result
+        
+        # Parse JSON data
+        functions = json.loads(functions_json) if functions_json else []
+        stakeholders = json.loads(stakeholders_json) if stakeholders_json else []
+        raci_data = decode_raci_payload(json.loads(raci_data_json) if raci_data_json else {}, functions, stakeholders)
+        raci_data.index.name = 'Function'
+        
+        return True, f"Successfully loaded '{matrix_name}'", {
+            'matrix_id': matrix_id,
+            'matrix_name': matrix_name,
+            'functions': functions,
+            'stakeholders': stakeholders,
+            'raci_data': raci_data,
+            'version': int(version),
+            'updated_by': updated_by
+        }
+    except Exception as e:
+        return False, f"Error loading from Snowflake: {str(e)}", None
+
+def load_from_snowflake(matrix_id):
+    """Load RACI matrix from Snowflake; the last value returned is the row version to pass back when updating"""
+    success, message, record = load_matrix_record(matrix_id)
+    if not success:
+        return False, message, None, None, None, None
+    return True, message, record['functions'], record['stakeholders'], record['raci_data'], record['version']
+
+def load_matrices_from_snowflake(matrix_ids):
+    """Load several RACI matrices in one query; returns (success, message, [(matrix_id, matrix_name, DataFrame), ...])
+
+    Ids that are no longer saved are left out.
+    """
+    try:
+        if not matrix_ids:
+            return True, None, []
+        
+        conn, error = get_snowflake_connection()
+        if error:
+            return False, error, []
+        
+        cursor = conn.cursor()
+        
+        placeholders = ', '.join(['%s'] * len(matrix_ids))
+        select_sql = f"""
+        SELECT matrix_id, matrix_name, functions, stakeholders, raci_data
+        FROM raci_matrices
+        WHERE matrix_id IN ({placeholders})
+        """
+        
+        _snowflake_execute(cursor, select_sql, tuple(matrix_ids))
+        results = _snowflake_fetch(cursor, fetch_all=True)
+        
+        cursor.close()
+        conn.close()
+        
+        # Keep the caller's order, which decides priority when merging
+        rows_by_id = {row[0]: row for row in results}
+        matrices = []
+        for matrix_id in matrix_ids:
+            if matrix_id not in rows_by_id:
+                continue
+            _, matrix_name, functions_json, stakeholders_json, raci_data_json = rows_by_id[matrix_id]
+            functions = json.loads(functions_json) if functions_json else []
+            stakeholders = json.loads(stakeholders_json) if stakeholders_json else []
+            matrices.append((matrix_id, matrix_name, decode_raci_payload(json.loads(raci_data_json) if raci_data_json else {}, functions, stakeholders)))
+        
+        return True, None, matrices
+    except Exception as e:
+        return False, f"Error loading from Snowflake: {str(e)}", []
+
+def list_snowflake_matrices():
+    """List all saved RACI matrices from Snowflake"""
+    try:
+        conn, error = get_snowflake_connection()
+        if error:
+            return False, error, []
+        
+        cursor = conn.cursor()
+        
+        select_sql = """
+        SELECT matrix_id, matrix_name, created_at, updated_at, created_by, COALESCE(version, 1), COALESCE(updated_by, created_by)
+        FROM raci_matrices
+        ORDER BY updated_at DESC
+        """
+        
+        _snowflake_execute(cursor, select_sql)
+        results = _snowflake_fetch(cursor, fetch_all=True)
+        
+        cursor.close()
+        conn.close()
+        
+        # Format results as list of dicts
+        matrices = []
+        for row in results:
+            matrices.append({
+                'matrix_id': row[0],
+                'matrix_name': row[1],
+                'created_at': row[2],
+                'updated_at': row[3],
+                'created_by': row[4],
+                'version': int(row[5]) if len(row) > 5 else 1,
+                'updated_by': row[6] if len(row) > 6 else row[4]
+            })
+        
+        return True, None, matrices
+    except Exception as e:
+        return False, f"Error listing matrices: {str(e)}", []
+
+def delete_from_snowflake(matrix_id, expected_version=None):
+    """Delete a RACI matrix from Snowflake.
+
+    With expected_version the delete only happens if nobody saved the matrix
+    since that version was read.
+    """
+    try:
+        conn, error = get_snowflake_connection()
+        if error:
+            return False, error
+        
+        cursor = conn.cursor()
+        
+        _snowflake_execute(cursor, "BEGIN")
+        try:
+            if expected_version is None:
+                _snowflake_execute(cursor, "DELETE FROM raci_matrices WHERE matrix_id = %s", (matrix_id,))
+            else:
+                _snowflake_execute(
+                    cursor,
+                    "DELETE FROM raci_matrices WHERE matrix_id = %s AND COALESCE(version, 1) = %s",
+                    (matrix_id, expected_version)
+                )
+                if cursor.rowcount == 0:
+                    _snowflake_execute(cursor, "ROLLBACK")
+                    message = _describe_version_conflict(cursor, matrix_id, expected_version, "Refresh the list before deleting.")
+                    cursor.close()
+                    conn.close()
+                    count_metric('snowflake_version_conflicts')
+                    return False, message
+            _snowflake_execute(cursor, "DELETE FROM raci_matrix_index WHERE matrix_id = %s", (matrix_id,))
+            _snowflake_execute(cursor, "COMMIT")
+        except Exception:
+            _snowflake_execute(cursor, "ROLLBACK")
+            raise
+        
+        cursor.close()
+        conn.close()
+        
+        return True, "Matrix deleted successfully"
+    except Exception as e:
+        return False, f"Error deleting matrix: {str(e)}"
+
+def backfill_matrix_index():
+    """Index saved matrices that predate the index (or whose indexing failed).
+
+    Legacy payloads are flattened inside Snowflake, so no raci_data blob is
+    downloaded for them; compact payloads can only be decoded here.
+    """
+    try:
+        conn, error = get_snowflake_connection()
+        if error:
+            return False, error
+        
+        success, error = initialize_snowflake_table(conn)
+        if not success:
+            conn.close()
+            return False, error
+        
+        cursor = conn.cursor()
+        _snowflake_execute(cursor, f"SELECT matrix_id, NOT {COMPACT_PAYLOAD_SQL.format(column='raci_data')} FROM raci_matrices WHERE indexed_at IS NULL")
+        pending = _snowflake_fetch(cursor, fetch_all=True)
+        pending_ids = [row[0] for row in pending]
+        compact_ids = [row[0] for row in pending if not row[1]]
+        
+        if pending_ids:
+            # Only the matrices read above are indexed and marked; anything saved since indexes itself
+            pending_placeholders = ', '.join(['%s'] * len(pending_ids))
+            # FLATTEN only understands the legacy {function: {stakeholder: label}} payload
+            backfill_sql = f"""
+            INSERT INTO raci_matrix_index (matrix_id, matrix_name, function_name, stakeholder_name, role)
+            SELECT m.matrix_id, m.matrix_name, f.key, s.key, LEFT(TRIM(s.value::STRING), 1)
+            FROM raci_matrices m,
+                 LATERAL FLATTEN(input => m.raci_data) f,
+                 LATERAL FLATTEN(input => f.value) s
+            WHERE m.matrix_id IN ({pending_placeholders})
+              AND NOT {COMPACT_PAYLOAD_SQL.format(column='m.raci_data')}
+              AND LEFT(TRIM(s.value::STRING), 1) IN ('R', 'A', 'C', 'I')
+            """
+            compact_rows = []
+            if compact_ids:
+                success, error, matrices = load_matrices_from_snowflake(compact_ids)
+                if not success:
+                    conn.close()
+                    return False, error
+                for matrix_id, matrix_name, raci_data in matrices:
+                    compact_rows.extend(build_matrix_index_rows(matrix_id, matrix_name, raci_data))
+            _snowflake_execute(cursor, "BEGIN")
+            try:
+                # Clear partial rows from any earlier failed attempt before re-indexing
+                _snowflake_execute(cursor, f"DELETE FROM raci_matrix_index WHERE matrix_id IN ({pending_placeholders})", tuple(pending_ids))
+                _snowflake_execute(cursor, backfill_sql, tuple(pending_ids))
+                if compact_rows:
+                    _snowflake_executemany(cursor, INSERT_INDEX_SQL, compact_rows)
+                _snowflake_execute(cursor, f"UPDATE raci_matrices SET indexed_at = CURRENT_TIMESTAMP() WHERE matrix_id IN ({pending_placeholders})", tuple(pending_ids))
+                _snowflake_execute(cursor, "COMMIT")
+            except Exception:
+                _snowflake_execute(cursor, "ROLLBACK")
+                raise
+        
+        cursor.close()
+        conn.close()
+        
+        return True, f"Indexed {len(pending_ids)} matrices"
+    except Exception as e:
+        return False, f"Error building matrix index: {str(e)}"
+
+def compact_saved_matrices(batch_size=100):
+    """Rewrite matrices saved in the legacy raci_data format as compact payloads.
+
+    The matrix itself does not change, so its version is kept; a row is only
+    rewritten if nobody saved it since it was read.
+    """
+    try:
+        conn, error = get_snowflake_connection()
+        if error:
+            return False, error
+        
+        success, error = initialize_snowflake_table(conn)
+        if not success:
+            conn.close()
+            return False, error
+        
+        cursor = conn.cursor()
+        _snowflake_execute(cursor, f"SELECT matrix_id FROM raci_matrices WHERE NOT {COMPACT_PAYLOAD_SQL.format(column='raci_data')}")
+        legacy_ids = [row[0] for row in _snowflake_fetch(cursor, fetch_all=True)]
+        
+        update_sql = f"""
+        UPDATE raci_matrices
+        SET raci_data = PARSE_JSON(%s)
+        WHERE matrix_id = %s AND COALESCE(version, 1) = %s AND NOT {COMPACT_PAYLOAD_SQL.format(column='raci_data')}
+        """
+        compacted, bytes_before, bytes_after = 0, 0, 0
+        for start in range(0, len(legacy_ids), batch_size):
+            batch_ids = legacy_ids[start:start + batch_size]
+            placeholders = ', '.join(['%s'] * len(batch_ids))
+            _snowflake_execute(cursor, f"""
+                SELECT matrix_id, functions, stakeholders, raci_data, COALESCE(version, 1)
+                FROM raci_matrices
+                WHERE matrix_id IN ({placeholders}) AND NOT {COMPACT_PAYLOAD_SQL.format(column='raci_data')}
+                """, tuple(batch_ids))
+            for matrix_id, functions_json, stakeholders_json, raci_data_json, version in _snowflake_fetch(cursor, fetch_all=True):
+                functions = json.loads(functions_json) if functions_json else []
+                stakeholders = json.loads(stakeholders_json) if stakeholders_json else []
+                raci_data = decode_raci_payload(json.loads(raci_data_json) if raci_data_json else {}, functions, stakeholders)
+                payload_json = json.dumps(encode_raci_payload(raci_data, functions, stakeholders))
+                _snowflake_execute(cursor, update_sql, (payload_json, matrix_id, version))
+                if cursor.rowcount:
+                    compacted += 1
+                    bytes_before += len(raci_data_json or '')
+                    bytes_after += len(payload_json)
+        
+        cursor.close()
+        conn.close()
+        
+        if not compacted:
+            return True, "No matrices in the old format"
+        return True, (f"Compacted {compacted} matrices "
+                      f"({bytes_before / 1024:,.0f} KB -> {bytes_after / 1024:,.0f} KB of matrix data)")
+    except Exception as e:
+        return False, f"Error compacting matrices: {str(e)}"
+
+def search_matrix_index(name, field='stakeholder', role=None, limit=1000):
+    """Find cells across all saved matrices where a stakeholder or function (case-insensitive substring) has a role"""
+    try:
+        conn, error = get_snowflake_connection()
+        if error:
+            return False, error, []
+        
+        # On an account that never saved a matrix the search finds nothing rather than no table
+        success, error = initialize_snowflake_table(conn)
+        if not success:
+            conn.close()
+            return False, error, []
+        
+        cursor = conn.cursor()
+        
+        name_column = 'function_name' if field == 'function' else 'stakeholder_name'
+        search_sql = f"""
+        SELECT matrix_id, matrix_name, function_name, stakeholder_name, role
+        FROM raci_matrix_index
+        WHERE {name_column} ILIKE %s ESCAPE '\\\\'
+        """
+        # Match the text literally: % and _ in a name are not wildcards
+        pattern = re.sub(r'([\\%_])', r'\\\1', name.strip())
+        params = [f"%{pattern}%"]
+        if role:
+            search_sql += " AND role = %s"
+            params.append(role)
+        search_sql += f" ORDER BY matrix_name, function_name, stakeholder_name LIMIT {int(limit)}"
+        
+        _snowflake_execute(cursor, search_sql, tuple(params))
+        results = _snowflake_fetch(cursor, fetch_all=True)
+        
+        cursor.close()
+        conn.close()
+        
+        hits = [
+            {
+                'matrix_id': row[0],
+                'matrix_name': row[1],
+                'function': row[2],
+                'stakeholder': row[3],
+                'role': RACI_LABELS.get(row[4], row[4])
+            }
+            for row in results
+        ]
+        return True, None, hits
+    except Exception as e:
+        return False, f"Error searching matrices: {str(e)}", []
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Tests run without a Streamlit server; keep the change log and snapshots off disk
+os.environ.setdefault('RACI_AUDIT_STORE', 'off')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
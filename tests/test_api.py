@@ -0,0 +1,100 @@
+import pytest
+
+import raci_api
+
+
+@pytest.fixture(autouse=True)
+def local_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(raci_api, 'API_STORE_DIR', str(tmp_path))
+    monkeypatch.setattr(raci_api, '_use_snowflake', False)
+    raci_api._record_cache.clear()
+    raci_api._export_cache.clear()
+    yield tmp_path
+    raci_api._record_cache.clear()
+    raci_api._export_cache.clear()
+
+
+def create(assignments=None):
+    status, payload = raci_api.op_create({'name': 'Launch', 'functions': ['Plan', 'Build'],
+                                          'stakeholders': ['Ann', 'Bob'],
+                                          'assignments': assignments or {}}, 'tester')
+    assert status == 201
+    return payload['matrix_id']
+
+
+def fetch(matrix_id):
+    success, message, record = raci_api.get_matrix(matrix_id, fresh=True)
+    assert success, message
+    return raci_api.matrix_to_json(record)
+
+
+def test_create_and_read_back():
+    matrix_id = create({'Plan': {'Ann': 'A', 'Bob': 'R - Responsible'}})
+    matrix = fetch(matrix_id)
+    assert matrix['version'] == 1
+    assert matrix['functions'] == ['Plan', 'Build']
+    assert matrix['assignments'] == {'Plan': {'Ann': 'A', 'Bob': 'R'}}
+
+
+def test_patch_bumps_version_and_rejects_stale_version():
+    matrix_id = create()
+    status, payload = raci_api.op_patch(matrix_id, {'version': 1, 'cells': [['Build', 'Bob', 'R']]}, 'tester')
+    assert (status, payload['version'], payload['changed_cells']) == (200, 2, 1)
+    status, payload = raci_api.op_patch(matrix_id, {'version': 1, 'cells': [['Build', 'Ann', 'C']]}, 'tester')
+    assert status == 409 and payload['version'] == 2
+    assert fetch(matrix_id)['assignments'] == {'Build': {'Bob': 'R'}}
+
+
+def test_patch_reports_unknown_cells():
+    matrix_id = create()
+    status, payload = raci_api.op_patch(matrix_id, {'cells': [['Ship', 'Ann', 'R']]}, 'tester')
+    assert status == 422 and payload['unknown'] == [['Ship', 'Ann']]
+
+
+def test_delete():
+    matrix_id = create()
+    assert raci_api.op_delete(matrix_id, 1, 'tester')[0] == 200
+    assert raci_api.get_matrix(matrix_id, fresh=True)[:2] == (False, "Matrix not found")
+    assert raci_api.op_delete(matrix_id, None, 'tester')[0] == 404
+
+
+def test_batch_applies_same_matrix_operations_in_order():
+    first, second = create(), create()
+    operations = [{'op': 'patch', 'matrix_id': first, 'version': version, 'cells': [['Plan', 'Ann', role]]}
+                  for version, role in enumerate('RACI', start=1)]
+    operations.insert(2, {'op': 'patch', 'matrix_id': second, 'version': 1, 'cells': [['Build', 'Bob', 'A']]})
+    status, payload = raci_api.op_batch({'operations': operations}, 'tester')
+    assert status == 200 and payload['failed'] == 0
+    assert [result['version'] for result in payload['results']] == [2, 3, 2, 4, 5]
+    assert fetch(first)['assignments'] == {'Plan': {'Ann': 'I'}}
+    assert fetch(second)['assignments'] == {'Build': {'Bob': 'A'}}
+
+
+def test_batch_operations_fail_independently():
+    matrix_id = create()
+    status, payload = raci_api.op_batch({'operations': [
+        {'op': 'patch', 'matrix_id': matrix_id, 'cells': [['Plan', 'Ann', 'R']]},
+        {'op': 'patch', 'matrix_id': 'not/valid', 'cells': []},
+        {'op': 'rename', 'matrix_id': matrix_id},
+    ]}, 'tester')
+    assert [result['status'] for result in payload['results']] == [200, 400, 400]
+    assert payload['failed'] == 2
+
+
+def test_patch_accepts_letters_and_exact_labels_only():
+    matrix_id = create({'Plan': {'Ann': 'R'}})
+    status, payload = raci_api.op_patch(matrix_id, {'cells': [['Plan', 'Ann', None], ['Plan', 'Bob', 'A - Accountable'],
+                                                              ['Build', 'Ann', 'C']]}, 'tester')
+    assert status == 200
+    assert fetch(matrix_id)['assignments'] == {'Plan': {'Bob': 'A'}, 'Build': {'Ann': 'C'}}
+    status, payload = raci_api.op_patch(matrix_id, {'cells': [['Build', 'Bob', 'Cat'], ['Build', 'Ann', 'I'],
+                                                              ['Plan', 'Ann', 'Responsible'], ['Plan', 'Bob', 1]]}, 'tester')
+    assert status == 422
+    assert payload['invalid'] == [['Build', 'Bob', 'Cat'], ['Plan', 'Ann', 'Responsible'], ['Plan', 'Bob', 1]]
+    assert fetch(matrix_id)['version'] == 2
+
+
+def test_create_rejects_unknown_roles():
+    status, payload = raci_api.op_create({'functions': ['Plan'], 'stakeholders': ['Ann'],
+                                          'assignments': {'Plan': {'Ann': 'x'}}}, 'tester')
+    assert status == 400 and "['Plan', 'Ann', 'x']" in payload['error']
@@ -0,0 +1,90 @@
+import uuid
+
+import pytest
+
+import raci_core
+
+
+@pytest.fixture
+def room():
+    name = f"test-{uuid.uuid4().hex}"
+    yield name
+    hub = raci_core.get_collab_hub()
+    with hub['lock']:
+        hub['rooms'].pop(name, None)
+
+
+def publish(room, site, changes, clock=0):
+    return raci_core.publish_collab_ops(room, site, clock, {}, changes)
+
+
+def seed(room):
+    publish(room, 'a', [('function', 'F1', True), ('function', 'F2', True),
+                        ('stakeholder', 'S1', True), ('stakeholder', 'S2', True)])
+    return raci_core.pull_collab_changes(room, 'b', -1)['seq']
+
+
+def test_join_from_start_gets_snapshot(room):
+    publish(room, 'a', [('function', 'F1', True), ('stakeholder', 'S1', True), ('cell', ('F1', 'S1'), 'R - Responsible')])
+    update = raci_core.pull_collab_changes(room, 'b', -1)
+    assert update['snapshot'] == (['F1'], ['S1'], {('F1', 'S1'): 'R - Responsible'})
+
+
+def test_pull_returns_only_touched_cells(room):
+    seq = seed(room)
+    publish(room, 'a', [('cell', ('F1', 'S1'), 'A - Accountable')], clock=1)
+    update = raci_core.pull_collab_changes(room, 'b', seq)
+    assert update['cells'] == {('F1', 'S1'): 'A - Accountable'}
+    assert 'structure' not in update
+
+
+def test_later_lamport_clock_wins_everywhere(room):
+    seq = seed(room)
+    publish(room, 'b', [('cell', ('F1', 'S1'), 'C - Consulted')], clock=5)
+    publish(room, 'a', [('cell', ('F1', 'S1'), 'I - Informed')], clock=1)
+    update = raci_core.pull_collab_changes(room, 'c', seq)
+    assert update['cells'] == {('F1', 'S1'): 'C - Consulted'}
+    assert update['conflicts'] == 1
+
+
+def test_edit_then_delete_between_polls(room):
+    seq = seed(room)
+    publish(room, 'a', [('cell', ('F1', 'S1'), 'R - Responsible')], clock=1)
+    publish(room, 'a', [('function', 'F1', False)], clock=2)
+    update = raci_core.pull_collab_changes(room, 'b', seq)
+    assert update['cells'] == {('F1', 'S1'): ''}
+    assert update['structure'] == (['F2'], ['S1', 'S2'])
+    assert update['removed'] == {'function': ['F1'], 'stakeholder': []}
+
+
+def test_removed_and_re_added_name_comes_back_blank(room):
+    publish(room, 'a', [('function', 'F1', True), ('stakeholder', 'S1', True), ('cell', ('F1', 'S1'), 'R - Responsible')])
+    seq = raci_core.pull_collab_changes(room, 'b', -1)['seq']
+    publish(room, 'a', [('stakeholder', 'S1', False)], clock=2)
+    publish(room, 'a', [('stakeholder', 'S1', True)], clock=3)
+    update = raci_core.pull_collab_changes(room, 'b', seq)
+    assert update['structure'] == (['F1'], ['S1'])
+    assert update['removed'] == {'function': [], 'stakeholder': ['S1']}
+    assert raci_core.pull_collab_changes(room, 'c', -1)['snapshot'][2] == {}
+
+
+def test_changes_from_frames_round_trip():
+    import pandas as pd
+    old = pd.DataFrame([['R - Responsible', '']], index=['F1'], columns=['S1', 'S2'], dtype=object)
+    new = pd.DataFrame([['R - Responsible', 'A - Accountable'], ['', '']], index=['F1', 'F2'], columns=['S1', 'S2'], dtype=object)
+    changes = raci_core.collab_changes_from_frames(old, new)
+    assert ('function', 'F2', True) in changes
+    assert ('cell', ('F1', 'S2'), 'A - Accountable') in changes
+    assert not any(change[0] == 'cell' and change[1] == ('F1', 'S1') for change in changes)
+
+
+def test_removal_drops_only_that_names_cells(room):
+    publish(room, 'a', [('function', 'F1', True), ('function', 'F2', True), ('stakeholder', 'S1', True),
+                        ('cell', ('F1', 'S1'), 'R - Responsible'), ('cell', ('F2', 'S1'), 'C - Consulted')])
+    publish(room, 'a', [('function', 'F1', False)], clock=2)
+    hub = raci_core.get_collab_hub()
+    state = hub['rooms'][room]
+    assert state['cells'].keys() == {('F2', 'S1')}
+    assert state['cell_keys'] == {'function': {'F2': {('F2', 'S1')}}, 'stakeholder': {'S1': {('F2', 'S1')}}}
+    publish(room, 'a', [('stakeholder', 'S1', False)], clock=3)
+    assert state['cells'] == {} and state['cell_keys'] == {'function': {}, 'stakeholder': {}}
@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import raci_core
+
+LABELS = list(raci_core.RACI_OPTIONS.values())
+
+
+def random_matrix(n_functions, n_stakeholders, seed=0):
+    rng = np.random.default_rng(seed)
+    functions = [f"Function {i}" for i in range(n_functions)]
+    stakeholders = [f"Person {i}" for i in range(n_stakeholders)]
+    values = np.array(LABELS, dtype=object)[rng.integers(0, len(LABELS), (n_functions, n_stakeholders))]
+    return functions, stakeholders, pd.DataFrame(values, index=functions, columns=stakeholders)
+
+
+def stored(payload):
+    """The payload as it comes back from a VARIANT column"""
+    return json.loads(json.dumps(payload))
+
+
+@pytest.mark.parametrize('shape', [(1, 1), (3, 5), (40, 7), (0, 4)])
+def test_compact_round_trip(shape):
+    functions, stakeholders, df = random_matrix(*shape)
+    payload = raci_core.encode_raci_payload(df, functions, stakeholders)
+    assert raci_core.is_compact_payload(payload)
+    decoded = raci_core.decode_raci_payload(stored(payload), functions, stakeholders)
+    pd.testing.assert_frame_equal(decoded, df, check_dtype=False)
+
+
+def test_encode_normalizes_letters_and_follows_the_given_order():
+    df = pd.DataFrame([['R', ''], ['A - Accountable', 'i']], index=['Plan', 'Build'], columns=['Ann', 'Bob'])
+    payload = raci_core.encode_raci_payload(df, ['Build', 'Plan'], ['Bob', 'Ann'])
+    decoded = raci_core.decode_raci_payload(stored(payload), ['Build', 'Plan'], ['Bob', 'Ann'])
+    assert decoded.loc['Plan', 'Ann'] == 'R - Responsible'
+    assert decoded.loc['Build', 'Ann'] == 'A - Accountable'
+    assert decoded.loc['Plan', 'Bob'] == ''
+    assert list(decoded.index) == ['Build', 'Plan']
+
+
+def test_legacy_payload_decodes_to_the_stored_labels():
+    payload = {'Plan': {'Ann': 'A - Accountable', 'Bob': 'R - Responsible'}, 'Build': {'Bob': 'C - Consulted'}}
+    decoded = raci_core.decode_raci_payload(stored(payload), ['Plan', 'Build', 'Ship'], ['Ann', 'Bob'])
+    assert decoded.loc['Plan'].tolist() == ['A - Accountable', 'R - Responsible']
+    assert decoded.loc['Build'].tolist() == ['', 'C - Consulted']
+    assert decoded.loc['Ship'].tolist() == ['', '']
+
+
+def test_legacy_payload_with_padded_names_matches_stripped_labels():
+    payload = {' Plan ': {'Ann  ': 'I - Informed'}}
+    decoded = raci_core.decode_raci_payload(payload, ['Plan'], ['Ann'])
+    assert decoded.loc['Plan', 'Ann'] == 'I - Informed'
+
+
+def test_legacy_payload_with_a_function_named_format_is_not_compact():
+    payload = {'format': {'Ann': 'A - Accountable'}, 'codes': {'Ann': ''}, 'shape': {'Ann': 'R - Responsible'}}
+    assert not raci_core.is_compact_payload(payload)
+    decoded = raci_core.decode_raci_payload(payload, ['format', 'codes', 'shape'], ['Ann'])
+    assert decoded['Ann'].tolist() == ['A - Accountable', '', 'R - Responsible']
+
+
+def test_legacy_payload_re_encoded_compact_keeps_the_matrix():
+    functions, stakeholders, df = random_matrix(12, 5, seed=3)
+    legacy = {f: {s: df.loc[f, s] for s in stakeholders if df.loc[f, s]} for f in functions}
+    decoded = raci_core.decode_raci_payload(stored(legacy), functions, stakeholders)
+    payload = raci_core.encode_raci_payload(decoded, functions, stakeholders)
+    pd.testing.assert_frame_equal(raci_core.decode_raci_payload(stored(payload), functions, stakeholders), df,
+                                  check_dtype=False)
+
+
+def test_compact_payload_rejects_a_mismatched_shape_and_unknown_formats():
+    functions, stakeholders, df = random_matrix(3, 3)
+    payload = raci_core.encode_raci_payload(df, functions, stakeholders)
+    with pytest.raises(ValueError):
+        raci_core.decode_raci_payload(payload, functions[:2], stakeholders)
+    with pytest.raises(ValueError):
+        raci_core.decode_raci_payload(dict(payload, format='raci-codes-v9'), functions, stakeholders)
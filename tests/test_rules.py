@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import raci_core
+
+FUNCTIONS = ['Finance > Budget', 'Finance > Audit', 'Ops > Deploy', 'Ops > Release']
+STAKEHOLDERS = ['Ann', 'Bob', 'Legal']
+
+
+def compile_rules(text):
+    success, message, rules = raci_core.compile_raci_rules(text)
+    assert success, message
+    return rules
+
+
+def matrix(cells):
+    df = pd.DataFrame('', index=FUNCTIONS, columns=STAKEHOLDERS, dtype=object)
+    for (function, stakeholder), letter in cells.items():
+        df.loc[function, stakeholder] = raci_core.RACI_OPTIONS[letter]
+    return df
+
+
+def violations(text, df):
+    return raci_core.validate_raci_matrix(df, compile_rules(text))
+
+
+def test_readme_examples_compile():
+    rules = compile_rules('''
+        # one rule per line
+        exactly 1 A per function
+        at most 5 R per stakeholder
+        at most 8 R/A per stakeholder
+        stakeholder "Legal" never A
+        function "Payroll" never C/I
+        in group "Finance": at least 1 R per function
+        in functions matching "deploy|release": at least 1 C per function
+    ''')
+    assert len(rules) == 7
+    assert [rule['line'] for rule in rules] == [3, 4, 5, 6, 7, 8, 9]
+
+
+def test_problems_name_their_line():
+    success, message, _ = raci_core.compile_raci_rules('at most 1 A per function\nevery function needs love\n'
+                                                      'in functions matching "(": at least 1 R per function')
+    assert not success
+    assert 'Line 2' in message and 'Line 3' in message
+
+
+def test_default_rule_allows_at_most_one_accountable():
+    df = matrix({('Finance > Budget', 'Ann'): 'A', ('Finance > Budget', 'Bob'): 'A'})
+    assert raci_core.validate_raci_matrix(df) == [
+        "Function 'Finance > Budget' has 2 Accountable stakeholders. Only 1 is allowed."]
+
+
+def test_exactly_counts_every_function():
+    df = matrix({('Finance > Budget', 'Ann'): 'A'})
+    assert len(violations('exactly 1 A per function', df)) == 3
+
+
+def test_combined_roles_count_together_per_stakeholder():
+    df = matrix({('Finance > Budget', 'Ann'): 'R', ('Finance > Audit', 'Ann'): 'A', ('Ops > Deploy', 'Bob'): 'R'})
+    assert violations('at most 1 R/A per stakeholder', df) == [
+        "Stakeholder 'Ann' is Responsible or Accountable for 2 functions. Only 1 is allowed."]
+
+
+def test_never_rules_work_in_both_directions():
+    df = matrix({('Ops > Deploy', 'Legal'): 'A', ('Finance > Audit', 'Bob'): 'C'})
+    assert violations('stakeholder "Legal" never A', df) == [
+        "Function 'Ops > Deploy': stakeholder 'Legal' must never be Accountable."]
+    assert violations('function "Finance > Audit" never C/I', df) == [
+        "Function 'Finance > Audit': stakeholder 'Bob' must never be Consulted or Informed."]
+
+
+def test_scopes_limit_the_functions_checked():
+    df = matrix({('Finance > Budget', 'Ann'): 'R', ('Ops > Deploy', 'Ann'): 'C'})
+    assert violations('in group "Finance": at least 1 R per function', df) == [
+        "Function 'Finance > Audit' has 0 Responsible stakeholders. At least 1 is required."]
+    assert violations('in functions matching "deploy|release": at least 1 C per function', df) == [
+        "Function 'Ops > Release' has 0 Consulted stakeholders. At least 1 is required."]
+
+
+def test_validation_only_counts_strict_role_values():
+    df = matrix({('Finance > Budget', 'Ann'): 'A'})
+    df.loc['Finance > Budget', 'Bob'] = 'Admin'
+    assert raci_core.validate_raci_matrix(df) == []
+
+
+def test_function_errors_collect_messages_per_function():
+    rules = compile_rules('at least 1 R per function\nstakeholder "Legal" never A')
+    df = matrix({('Finance > Budget', 'Ann'): 'R', ('Finance > Audit', 'Ann'): 'R', ('Ops > Deploy', 'Ann'): 'R',
+                 ('Ops > Release', 'Legal'): 'A'})
+    codes = raci_core.encode_raci_codes(df, strict=True)
+    function_errors = {}
+    errors = raci_core.rule_violations(rules, raci_core.build_rule_tables(rules, codes, df.index, df.columns),
+                                       df.index, df.columns, function_errors)
+    assert list(function_errors) == ['Ops > Release']
+    assert sorted(function_errors['Ops > Release']) == sorted(errors)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_updates_match_a_rebuild(seed):
+    rng = np.random.default_rng(seed)
+    rules = compile_rules('exactly 1 A per function\nat most 2 R per stakeholder\nstakeholder "Legal" never A\n'
+                          'in group "Ops": at least 1 C per function\nin group "Finance": at most 1 R/A per stakeholder')
+    codes = rng.integers(0, len(raci_core.RACI_CODES), (len(FUNCTIONS), len(STAKEHOLDERS))).astype(np.int8)
+    index, columns = pd.Index(FUNCTIONS), pd.Index(STAKEHOLDERS)
+    tables = raci_core.build_rule_tables(rules, codes, index, columns)
+    for _ in range(20):
+        new_codes = codes.copy()
+        for _ in range(rng.integers(1, 4)):
+            new_codes[rng.integers(len(FUNCTIONS)), rng.integers(len(STAKEHOLDERS))] = rng.integers(len(raci_core.RACI_CODES))
+        rows, cols = np.nonzero(codes != new_codes)
+        raci_core.update_rule_tables(tables, rows, cols, codes[rows, cols], new_codes[rows, cols])
+        codes = new_codes
+        rebuilt = raci_core.build_rule_tables(rules, codes, index, columns)
+        assert raci_core.rule_violations(rules, tables, index, columns) == \
+            raci_core.rule_violations(rules, rebuilt, index, columns)
@@ -0,0 +1,635 @@
+"""Differential equivalence check between the original and the optimized code paths.
+
+The cell-by-cell implementations the app started with are kept below, verbatim apart
+from session-state writes, as reference oracles. Randomized and adversarial inputs
+(legend rows, "Unnamed" headers, NaN/None, blank and padded strings, lowercase
+letters, full role words, numbers, duplicate Accountables, empty rows and columns)
+are run through both versions of:
+
+  - parse_raci_value, as applied by the importer to every cell
+  - the importer's legend/unnamed/empty row and column filters (CSV and XLSX)
+  - validate_raci_matrix
+  - the per-cell labels, fills and fonts written by export_to_excel
+  - the Visual Matrix cell colors (style_raci vs raci_cell_styles)
+
+Any difference is a failure (exit code 1) and is printed with the case seed so it can
+be replayed with --seed/--cases 1. Speedup ratios are measured on one large matrix.
+
+    python tools/differential_check.py --cases 200 --seed 7 --size 1500x80
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+import traceback
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import openpyxl
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import raci_core  # noqa: E402
+from raci_core import RACI_LABELS, RACI_COLORS  # noqa: E402
+
+# Cached helpers warn once per call when there is no Streamlit runtime
+logging.getLogger('streamlit.runtime.caching.cache_data_api').setLevel(logging.ERROR)
+
+# ============================================================================
+# Reference implementations (original cell-by-cell code)
+# ============================================================================
+
+def legacy_validate_raci_matrix(df):
+    """Validate the entire RACI matrix for correctness"""
+    errors = []
+    for function in df.index:
+        row_data = df.loc[function].values
+        # Extract letter from value (could be 'A' or 'A - Accountable')
+        accountable_count = 0
+        for val in row_data:
+            val_str = str(val).strip()
+            # Check if it starts with 'A' (could be 'A' or 'A - Accountable')
+            if val_str and (val_str == 'A' or val_str.startswith('A -')):
+                accountable_count += 1
+        if accountable_count > 1:
+            errors.append(f"Function '{function}' has {accountable_count} Accountable stakeholders. Only 1 is allowed.")
+    return errors
+
+def legacy_parse_raci_value(value):
+    """Parse RACI value from imported file - handles both formats"""
+    if pd.isna(value) or value == '':
+        return ''
+
+    val_str = str(value).strip().upper()
+
+    # If it's just a single letter, return it
+    if len(val_str) == 1 and val_str in ['R', 'A', 'C', 'I']:
+        return RACI_LABELS.get(val_str, val_str)
+
+    # If it starts with a RACI letter, extract it
+    if val_str and val_str[0] in ['R', 'A', 'C', 'I']:
+        letter = val_str[0]
+        return RACI_LABELS.get(letter, letter)
+
+    # Try to match full labels
+    val_lower = val_str.lower()
+    if 'responsible' in val_lower:
+        return RACI_LABELS['R']
+    elif 'accountable' in val_lower:
+        return RACI_LABELS['A']
+    elif 'consulted' in val_lower:
+        return RACI_LABELS['C']
+    elif 'informed' in val_lower:
+        return RACI_LABELS['I']
+
+    return ''
+
+def legacy_normalize_frame(df):
+    """Original import_from_spreadsheet filtering and parsing, after the file is read.
+
+    Returns (success, message, functions, stakeholders, raci_df) instead of writing
+    session state.
+    """
+    try:
+        # Check if DataFrame is empty
+        if df.empty:
+            return False, "The uploaded file appears to be empty.", None, None, None
+
+        # Drop rows where the index is NaN or empty
+        df = df[df.index.notna()]
+        df = df[df.index.astype(str).str.strip() != '']
+
+        legend_patterns = ['legend', 'r =', 'a =', 'c =', 'i =', 'responsible', 'accountable', 'consulted', 'informed']
+
+        def is_legend_row(idx):
+            """Check if a row index looks like a legend row"""
+            idx_str = str(idx).strip().lower()
+            # Check if index contains legend patterns
+            if any(pattern in idx_str for pattern in legend_patterns):
+                return True
+            # Check if index contains "=" (common in legends like "R = Responsible")
+            if '=' in idx_str:
+                return True
+            return False
+
+        def is_unnamed_row(idx):
+            """Check if a row index is an unnamed/empty row"""
+            idx_str = str(idx).strip()
+            # Check for "Unnamed" pattern (case-insensitive) - handles "Unnamed: 3", "Unnamed: 4", etc.
+            if 'unnamed' in idx_str.lower():
+                return True
+            # Check for empty or NaN values
+            if not idx_str or idx_str.lower() in ['nan', 'none', '']:
+                return True
+            return False
+
+        # Filter out legend rows and unnamed rows from the DataFrame
+        df_filtered = df[~df.index.map(lambda idx: is_legend_row(idx) or is_unnamed_row(idx))]
+
+        def row_looks_like_legend(row):
+            """Check if a row looks like a legend row based on cell content"""
+            row_str = ' '.join([str(val).strip().lower() for val in row.values if pd.notna(val)])
+            # If row contains legend patterns, it's likely a legend
+            if any(pattern in row_str for pattern in ['r =', 'a =', 'c =', 'i =', 'responsible', 'accountable', 'consulted', 'informed']):
+                return True
+            return False
+
+        def row_is_empty_or_unnamed(row, row_idx):
+            """Check if a row is mostly empty or has no meaningful data"""
+            # First check if the index itself is unnamed
+            if is_unnamed_row(row_idx):
+                return True
+
+            # Count non-empty, non-NaN values
+            non_empty_values = [val for val in row.values if pd.notna(val) and str(val).strip() != '']
+            non_empty_count = len(non_empty_values)
+
+            # If row has no non-empty values, it's empty
+            if non_empty_count == 0:
+                return True
+
+            # Check if all values in the row are empty strings or NaN
+            all_empty = all(pd.isna(val) or str(val).strip() == '' for val in row.values)
+            if all_empty:
+                return True
+
+            idx_str = str(row_idx).strip()
+            if 'unnamed' in idx_str.lower() and non_empty_count <= 1:
+                return True
+
+            return False
+
+        # Additional filter: remove rows that look like legends or are empty/unnamed
+        mask = ~df_filtered.apply(lambda row: row_looks_like_legend(row) or row_is_empty_or_unnamed(row, row.name), axis=1)
+        df_filtered = df_filtered[mask]
+
+        if df_filtered.empty:
+            return False, "No valid data rows found after filtering legend. Please ensure your file contains function names in the first column.", None, None, None
+
+        # Extract functions from index (first column) - now filtered
+        functions = [str(idx).strip() for idx in df_filtered.index if str(idx).strip() and str(idx).strip().lower() not in ['nan', 'none', '']]
+
+        def is_valid_stakeholder(col):
+            """Check if a column header is a valid stakeholder name"""
+            col_str = str(col).strip()
+            # Check for empty or NaN
+            if not col_str or col_str.lower() in ['nan', 'none', '']:
+                return False
+            # Check for "Unnamed" pattern
+            if 'unnamed' in col_str.lower():
+                return False
+            return True
+
+        # Filter columns by header name (removes blank/unnamed columns)
+        valid_cols = [col for col in df_filtered.columns if is_valid_stakeholder(col)]
+        df_filtered = df_filtered[valid_cols]
+
+        # Also filter out columns that are completely empty (all NaN or empty values)
+        cols_with_data = []
+        for col in df_filtered.columns:
+            col_data = df_filtered[col]
+            # Check if column has any non-empty, non-NaN values
+            has_values = any(pd.notna(val) and str(val).strip() != '' for val in col_data.values)
+            if has_values:
+                cols_with_data.append(col)
+
+        # Use columns with data (or at least valid headers)
+        df_filtered = df_filtered[cols_with_data] if cols_with_data else df_filtered[valid_cols]
+
+        # Extract stakeholders from remaining valid columns
+        stakeholders = [str(col).strip() for col in df_filtered.columns if is_valid_stakeholder(col)]
+
+        if not functions:
+            return False, "No functions found in the file. Please ensure the first column contains function names.", None, None, None
+
+        if not stakeholders:
+            return False, "No stakeholders found in the file. Please ensure the first row contains stakeholder names.", None, None, None
+
+        # Parse RACI values - convert to full label format. Older pandas upcast numeric
+        # columns on the first string assignment; pandas 3 raises, so upcast up front
+        raci_df = df_filtered.astype(object)
+        for col in raci_df.columns:
+            for idx in raci_df.index:
+                original_value = raci_df.loc[idx, col]
+                parsed_value = legacy_parse_raci_value(original_value)
+                raci_df.loc[idx, col] = parsed_value
+
+        return True, f"Successfully imported {len(functions)} functions and {len(stakeholders)} stakeholders!", functions, stakeholders, raci_df.fillna('')
+
+    except Exception as e:
+        return False, f"Error importing file: {str(e)}", None, None, None
+
+def legacy_export_to_excel(df):
+    """Export RACI matrix to Excel with formatting"""
+    output = BytesIO()
+
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='RACI Matrix', index=True)
+        worksheet = writer.sheets['RACI Matrix']
+
+        # Set column widths
+        worksheet.column_dimensions['A'].width = 25
+        for col in range(2, len(df.columns) + 2):
+            worksheet.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 15
+
+        # Style header row
+        header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+        header_font = Font(color='FFFFFF', bold=True, size=11)
+        border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+
+        # Format header
+        for cell in worksheet[1]:
+            cell.fill = header_fill
+            cell.font = header_font
+            cell.alignment = Alignment(horizontal='center', vertical='center')
+            cell.border = border
+
+        # Format index column
+        index_fill = PatternFill(start_color='D9E1F2', end_color='D9E1F2', fill_type='solid')
+        index_font = Font(bold=True, size=11)
+
+        for row in range(2, len(df) + 2):
+            cell = worksheet[f'A{row}']
+            cell.fill = index_fill
+            cell.font = index_font
+            cell.alignment = Alignment(horizontal='left', vertical='center')
+            cell.border = border
+
+        # Format data cells with RACI colors
+        for row_idx, row in enumerate(df.index, start=2):
+            for col_idx, col in enumerate(df.columns, start=2):
+                cell = worksheet.cell(row=row_idx, column=col_idx)
+                value = str(df.loc[row, col]).strip()
+
+                # Extract letter and convert to label for display
+                raci_letter = ''
+                display_value = value
+                if value:
+                    if value.startswith('R -') or value == 'R':
+                        raci_letter = 'R'
+                        display_value = 'R - Responsible'
+                    elif value.startswith('A -') or value == 'A':
+                        raci_letter = 'A'
+                        display_value = 'A - Accountable'
+                    elif value.startswith('C -') or value == 'C':
+                        raci_letter = 'C'
+                        display_value = 'C - Consulted'
+                    elif value.startswith('I -') or value == 'I':
+                        raci_letter = 'I'
+                        display_value = 'I - Informed'
+                    elif len(value) == 1 and value in ['R', 'A', 'C', 'I']:
+                        raci_letter = value
+                        display_value = RACI_LABELS.get(value, value)
+                    else:
+                        raci_letter = value[0] if len(value) > 0 else ''
+                        if raci_letter in RACI_LABELS:
+                            display_value = RACI_LABELS[raci_letter]
+
+                cell.value = display_value
+
+                if raci_letter in RACI_COLORS:
+                    hex_color = RACI_COLORS[raci_letter].replace('#', '')
+                    cell.fill = PatternFill(
+                        start_color=hex_color,
+                        end_color=hex_color,
+                        fill_type='solid'
+                    )
+
+                cell.alignment = Alignment(horizontal='center', vertical='center')
+                cell.border = border
+                cell.font = Font(size=11, bold=(raci_letter in ['R', 'A']))
+
+        # Add legend
+        legend_row = len(df) + 3
+        worksheet.cell(row=legend_row, column=1, value='Legend:')
+        worksheet.cell(row=legend_row, column=1).font = Font(bold=True, size=11)
+
+        legend_items = ['R = Responsible', 'A = Accountable', 'C = Consulted', 'I = Informed']
+        for idx, item in enumerate(legend_items, start=2):
+            cell = worksheet.cell(row=legend_row, column=idx, value=item)
+            cell.font = Font(size=10)
+
+    output.seek(0)
+    return output
+
+def legacy_style_raci(val):
+    """Visual Matrix cell color"""
+    # Extract letter from value (could be 'R' or 'R - Responsible')
+    val_str = str(val).strip()
+    raci_letter = ''
+    if val_str:
+        if val_str.startswith('R -') or val_str == 'R':
+            raci_letter = 'R'
+        elif val_str.startswith('A -') or val_str == 'A':
+            raci_letter = 'A'
+        elif val_str.startswith('C -') or val_str == 'C':
+            raci_letter = 'C'
+        elif val_str.startswith('I -') or val_str == 'I':
+            raci_letter = 'I'
+        elif len(val_str) == 1 and val_str in ['R', 'A', 'C', 'I']:
+            raci_letter = val_str
+        else:
+            raci_letter = val_str[0] if len(val_str) > 0 else ''
+
+    if raci_letter in RACI_COLORS:
+        return f'background-color: {RACI_COLORS[raci_letter]}'
+    return ''
+
+# ============================================================================
+# Optimized implementations, called the way the app calls them
+# ============================================================================
+
+def optimized_normalize_frame(df):
+    return raci_core.normalize_raci_frame(df)
+
+def optimized_style(df):
+    return raci_core.raci_cell_styles(df, raci_core.encode_raci_codes(df))
+
+def legacy_style(df):
+    return df.map(legacy_style_raci)
+
+# ============================================================================
+# Input generators
+# ============================================================================
+
+# Cell values a hand-edited or app-exported matrix can contain, valid and otherwise
+ROLE_VALUES = ['R', 'A', 'C', 'I'] + list(RACI_LABELS.values())
+ADVERSARIAL_VALUES = [
+    '', ' ', '  A  ', '\tR\n', 'r', 'a', 'c', 'i', 'A -', 'A-', 'A - ', 'A -Accountable', 'a - accountable',
+    'Accountable', 'accountable', 'Responsible', 'CONSULTED', 'informed', 'Informed party', 'Resp.',
+    'X', 'x', 'Y', 'N/A', 'n/a', '-', '?', 'RA', 'AR', 'Ra', 'AC', 'Admin', 'Cc', 'Info', 'IT',
+    '=', 'R =', 'r = responsible', '= Responsible', 'legend', 'nan', 'None', 'none', 'NaN',
+    '0', '1', 'TRUE', 'é', 'Ã', '✓', '★ A',
+    None, np.nan, 0, 1, 2, 1.5, -3, 0.0, True, False
+]
+FUNCTION_WORDS = ['Plan', 'Build', 'Review', 'Approve', 'Deploy', 'Budget', 'Hiring', 'Audit', 'Release', 'Support']
+ADVERSARIAL_FUNCTIONS = [
+    'Legend:', 'Legend', 'R = Responsible', 'a = accountable', 'Informed parties', 'Unnamed: 7',
+    'unnamed', '', '  ', 'nan', 'None', 'Budget = cost', 'Accountability', 'Consulting', '  Padded  '
+]
+ADVERSARIAL_HEADERS = ['', ' ', 'nan', 'None', 'Unnamed: 3', 'unnamed col', '  Padded  ', 'Owner = PM']
+
+def random_cell(rng, adversarial_rate, roles=ROLE_VALUES):
+    if rng.random() < adversarial_rate:
+        return rng.choice(ADVERSARIAL_VALUES)
+    return rng.choice(roles) if rng.random() < 0.6 else ''
+
+def random_matrix(rng, num_functions, num_stakeholders, adversarial_rate=0.3):
+    """Matrix as held in session state: unique labels, any cell values (object dtype)"""
+    functions = [f"{rng.choice(FUNCTION_WORDS)} {idx}" for idx in range(num_functions)]
+    stakeholders = [f"Stakeholder {idx}" for idx in range(num_stakeholders)]
+    cells = [[random_cell(rng, adversarial_rate) for _ in stakeholders] for _ in functions]
+    # Rows that deliberately break the one-Accountable rule
+    for row in rng.sample(range(num_functions), k=min(num_functions, rng.randint(0, 3))):
+        for col in rng.sample(range(num_stakeholders), k=min(num_stakeholders, rng.randint(2, 4))):
+            cells[row][col] = rng.choice(['A', 'A - Accountable', ' A ', 'A -x'])
+    return pd.DataFrame(cells, index=functions, columns=stakeholders, dtype=object)
+
+def random_spreadsheet(rng, num_functions, num_stakeholders, adversarial_rate=None, roles=None):
+    """Raw sheet rows (header first) with legends, blank/unnamed labels and empty rows/columns.
+
+    Full labels ("R - Responsible") only appear in some sheets: the importer drops any
+    row mentioning a role word as legend content.
+    """
+    headers = [f"Stakeholder {idx}" for idx in range(num_stakeholders)]
+    for col in rng.sample(range(num_stakeholders), k=rng.randint(0, max(1, num_stakeholders // 4))):
+        headers[col] = rng.choice(ADVERSARIAL_HEADERS)
+    if adversarial_rate is None:
+        adversarial_rate = rng.choice([0.0, 0.1, 0.4])
+    if roles is None:
+        roles = ROLE_VALUES if rng.random() < 0.3 else ['R', 'A', 'C', 'I']
+    empty_cols = set(rng.sample(range(num_stakeholders), k=rng.randint(0, max(1, num_stakeholders // 5))))
+    rows = []
+    used_labels = set()
+    for idx in range(num_functions):
+        label = f"{rng.choice(FUNCTION_WORDS)} {idx}"
+        roll = rng.random()
+        if roll < 0.08:
+            candidate = rng.choice(ADVERSARIAL_FUNCTIONS)
+            # Repeated function names are left out: the original importer raised on them
+            if candidate not in used_labels:
+                label = candidate
+        used_labels.add(label)
+        cells = ['' if col in empty_cols else random_cell(rng, adversarial_rate, roles) for col in range(num_stakeholders)]
+        if roll > 0.95:
+            cells = [''] * num_stakeholders
+        rows.append([label] + cells)
+    if rng.random() < 0.5:
+        # Legend block as the app's own export writes it, sometimes split across cells
+        rows.append([''] * (num_stakeholders + 1))
+        if rng.random() < 0.5:
+            rows.append(['Legend:', 'R = Responsible', 'A = Accountable', 'C = Consulted', 'I = Informed'][:num_stakeholders + 1])
+        else:
+            rows.append(['', 'R', '= Responsible', 'A', '= Accountable'][:num_stakeholders + 1])
+    width = num_stakeholders + 1
+    return [['Function'] + headers] + [(row + [''] * width)[:width] for row in rows]
+
+def sheet_to_csv(rows):
+    """CSV bytes for sheet rows (None/NaN written as empty, numbers as written by Excel)"""
+    frame = pd.DataFrame(rows[1:], columns=range(len(rows[0])))
+    header = pd.DataFrame([rows[0]], columns=range(len(rows[0])))
+    output = BytesIO()
+    pd.concat([header, frame]).to_csv(output, header=False, index=False)
+    return output.getvalue()
+
+def sheet_to_xlsx(rows):
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    for row in rows:
+        worksheet.append([None if isinstance(val, float) and np.isnan(val) else (None if val == '' else val) for val in row])
+    output = BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+def read_sheet(data, file_name):
+    """Read uploaded bytes exactly the way the importer does"""
+    if file_name.endswith('.csv'):
+        return pd.read_csv(BytesIO(data), index_col=0)
+    return pd.read_excel(BytesIO(data), index_col=0, sheet_name=0)
+
+# ============================================================================
+# Comparisons
+# ============================================================================
+
+def describe_frame_difference(expected, actual):
+    """First differing cell between two frames, or None when they are identical"""
+    if expected.shape != actual.shape:
+        return f"shape {expected.shape} != {actual.shape}"
+    if list(expected.index) != list(actual.index):
+        return f"index {list(expected.index)[:10]} != {list(actual.index)[:10]}"
+    if list(expected.columns) != list(actual.columns):
+        return f"columns {list(expected.columns)[:10]} != {list(actual.columns)[:10]}"
+    for row_idx in range(expected.shape[0]):
+        for col_idx in range(expected.shape[1]):
+            exp_val, act_val = expected.iat[row_idx, col_idx], actual.iat[row_idx, col_idx]
+            if type(exp_val) is not type(act_val) or exp_val != act_val:
+                return f"cell ({expected.index[row_idx]!r}, {expected.columns[col_idx]!r}): {exp_val!r} != {act_val!r}"
+    return None
+
+def compare_parse_values(values):
+    mismatches = []
+    for value in values:
+        expected, actual = legacy_parse_raci_value(value), raci_core.parse_raci_value(value)
+        if expected != actual:
+            mismatches.append(f"parse_raci_value({value!r}): {expected!r} != {actual!r}")
+    # The importer parses each distinct value once per column; check the mapping it applies
+    column = pd.Series(values, dtype=object)
+    frame = pd.DataFrame({'Stakeholder': column, 'Other': ['R'] * len(values)}, index=[f"Function {idx}" for idx in range(len(values))])
+    success, _, _, _, parsed = optimized_normalize_frame(frame)
+    if success and 'Stakeholder' in parsed.columns:
+        # Rows holding legend text are dropped by the importer, so look kept rows up by label
+        for label, actual in parsed['Stakeholder'].items():
+            value = values[frame.index.get_loc(label)]
+            if legacy_parse_raci_value(value) != actual:
+                mismatches.append(f"importer parsed {value!r} as {actual!r}, expected {legacy_parse_raci_value(value)!r}")
+                break
+    return mismatches
+
+def compare_import(df):
+    expected = legacy_normalize_frame(df.copy())
+    actual = optimized_normalize_frame(df.copy())
+    if expected[0] != actual[0] or expected[1] != actual[1]:
+        return [f"import result {expected[:2]!r} != {actual[:2]!r}"]
+    if not expected[0]:
+        return []
+    mismatches = []
+    if expected[2] != actual[2]:
+        mismatches.append(f"import functions {expected[2][:10]} != {actual[2][:10]}")
+    if expected[3] != actual[3]:
+        mismatches.append(f"import stakeholders {expected[3][:10]} != {actual[3][:10]}")
+    difference = describe_frame_difference(expected[4].astype(object), actual[4].astype(object))
+    if difference:
+        mismatches.append(f"import matrix {difference}")
+    return mismatches
+
+def compare_validate(df):
+    expected, actual = legacy_validate_raci_matrix(df), raci_core.validate_raci_matrix(df)
+    if expected != actual:
+        return [f"validate_raci_matrix {expected[:3]} != {actual[:3]}"]
+    return []
+
+def cell_signature(cell):
+    return (
+        cell.value, cell.fill.fill_type, cell.fill.fgColor.rgb, cell.font.bold, cell.font.size,
+        cell.font.color.rgb if cell.font.color is not None else None,
+        cell.alignment.horizontal, cell.alignment.vertical, cell.border.left.style
+    )
+
+def compare_excel(df):
+    expected = openpyxl.load_workbook(legacy_export_to_excel(df)).active
+    actual = openpyxl.load_workbook(raci_core.export_to_excel(df)).active
+    if (expected.max_row, expected.max_column) != (actual.max_row, actual.max_column):
+        return [f"export_to_excel sheet size {(expected.max_row, expected.max_column)} != {(actual.max_row, actual.max_column)}"]
+    for expected_row, actual_row in zip(expected.iter_rows(), actual.iter_rows()):
+        for expected_cell, actual_cell in zip(expected_row, actual_row):
+            if cell_signature(expected_cell) != cell_signature(actual_cell):
+                return [f"export_to_excel {expected_cell.coordinate}: {cell_signature(expected_cell)} != {cell_signature(actual_cell)}"]
+    for column, dimension in expected.column_dimensions.items():
+        if actual.column_dimensions[column].width != dimension.width:
+            return [f"export_to_excel column {column} width {dimension.width} != {actual.column_dimensions[column].width}"]
+    return []
+
+def compare_style(df):
+    difference = describe_frame_difference(legacy_style(df), optimized_style(df))
+    return [f"Visual Matrix style {difference}"] if difference else []
+
+def run_case(case_seed, max_functions, max_stakeholders):
+    """All comparisons for one seeded case; returns a list of mismatch descriptions"""
+    rng = random.Random(case_seed)
+    num_functions = rng.randint(1, max_functions)
+    num_stakeholders = rng.randint(1, max_stakeholders)
+    mismatches = []
+
+    matrix = random_matrix(rng, num_functions, num_stakeholders, adversarial_rate=rng.choice([0.0, 0.2, 0.6]))
+    mismatches += compare_parse_values(list(matrix.to_numpy().ravel()) + ADVERSARIAL_VALUES)
+    mismatches += compare_validate(matrix)
+    mismatches += compare_style(matrix)
+    mismatches += compare_excel(matrix)
+
+    rows = random_spreadsheet(rng, num_functions, num_stakeholders)
+    for file_name, data in (('case.csv', sheet_to_csv(rows)), ('case.xlsx', sheet_to_xlsx(rows))):
+        try:
+            sheet = read_sheet(data, file_name)
+        except Exception:
+            continue  # unreadable by pandas either way, nothing to compare
+        mismatches += [f"{file_name}: {mismatch}" for mismatch in compare_import(sheet)]
+    return mismatches
+
+# ============================================================================
+# Speedup measurement
+# ============================================================================
+
+def best_time(func, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def measure_speedups(num_functions, num_stakeholders, seed, repeats):
+    rng = random.Random(seed)
+    matrix = random_matrix(rng, num_functions, num_stakeholders, adversarial_rate=0.1)
+    sheet = read_sheet(sheet_to_csv(random_spreadsheet(rng, num_functions, num_stakeholders, adversarial_rate=0.0, roles=['R', 'A', 'C', 'I'])), 'case.csv')
+    paths = [
+        ('import filters + parse_raci_value', lambda: legacy_normalize_frame(sheet.copy()), lambda: optimized_normalize_frame(sheet.copy())),
+        ('validate_raci_matrix', lambda: legacy_validate_raci_matrix(matrix), lambda: raci_core.validate_raci_matrix(matrix)),
+        ('export_to_excel', lambda: legacy_export_to_excel(matrix), lambda: raci_core.export_to_excel(matrix)),
+        ('Visual Matrix style', lambda: legacy_style(matrix), lambda: optimized_style(matrix)),
+    ]
+    results = []
+    for name, legacy, optimized in paths:
+        legacy_seconds = best_time(legacy, repeats)
+        optimized_seconds = best_time(optimized, repeats)
+        results.append((name, legacy_seconds, optimized_seconds))
+    return results
+
+def parse_size(text):
+    num_functions, num_stakeholders = text.lower().split('x')
+    return int(num_functions), int(num_stakeholders)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--cases', type=int, default=200, help='randomized cases to compare')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first case')
+    parser.add_argument('--max-shape', default='40x12', help='largest FUNCTIONSxSTAKEHOLDERS of a random case')
+    parser.add_argument('--size', default='1000x60', help='FUNCTIONSxSTAKEHOLDERS of the speedup benchmark')
+    parser.add_argument('--repeats', type=int, default=3, help='timing repeats (best is kept)')
+    parser.add_argument('--max-reports', type=int, default=20, help='mismatches to print')
+    parser.add_argument('--skip-speedup', action='store_true')
+    args = parser.parse_args()
+
+    max_functions, max_stakeholders = parse_size(args.max_shape)
+    failures = []
+    for case_seed in range(args.seed, args.seed + args.cases):
+        try:
+            mismatches = run_case(case_seed, max_functions, max_stakeholders)
+        except Exception:
+            mismatches = [f"exception: {traceback.format_exc(limit=3)}"]
+        failures += [(case_seed, mismatch) for mismatch in mismatches]
+
+    print(f"Compared {args.cases} cases (seeds {args.seed}..{args.seed + args.cases - 1}): {len(failures)} mismatches")
+    for case_seed, mismatch in failures[:args.max_reports]:
+        print(f"  seed {case_seed}: {mismatch}")
+
+    if not args.skip_speedup:
+        num_functions, num_stakeholders = parse_size(args.size)
+        print(f"\nSpeedup on a {num_functions}x{num_stakeholders} matrix (best of {args.repeats}):")
+        print(f"  {'path':<36} {'original':>10} {'optimized':>10} {'speedup':>8}")
+        for name, legacy_seconds, optimized_seconds in measure_speedups(num_functions, num_stakeholders, args.seed, args.repeats):
+            print(f"  {name:<36} {legacy_seconds:>9.3f}s {optimized_seconds:>9.3f}s {legacy_seconds / optimized_seconds:>7.1f}x")
+
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
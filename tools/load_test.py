@@ -0,0 +1,366 @@
+"""Concurrent-session load test for raci_app.py.
+
+Drives N simulated browser sessions (Streamlit AppTest instances in one process,
+the way the server runs them) through a scripted workflow: open the page, import a
+CSV, bulk-edit cells, add and delete a function, save to and load from Snowflake.
+Snowflake is replaced by an in-memory connector with a configurable round-trip delay.
+
+AppTest swaps process-wide state (the runtime, st.secrets) on every run, so reruns
+from different sessions execute one at a time, like requests queued on a busy
+single-process server. Latency is reported both with the queueing ("latency") and
+without it ("service"); script execution is mostly GIL-bound in the real server too.
+
+    python tools/load_test.py --sessions 20 --functions 500 --stakeholders 40
+
+Reports p50/p99 rerun latency per workflow step, CPU time and utilization, memory
+per session, and the app's own per-stage timings (from its rerun metrics).
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROLE_LETTERS = ['', '', '', 'R', 'A', 'C', 'I']
+
+# AppTest runs are not safe to overlap (see above)
+RERUN_LOCK = threading.Lock()
+
+# ============================================================================
+# In-memory Snowflake connector
+# ============================================================================
+
+class FakeSnowflakeStore:
+    """Shared tables for every fake connection, with a simulated round-trip delay per statement"""
+
+    def __init__(self, latency_seconds):
+        self.latency_seconds = latency_seconds
+        self.lock = threading.Lock()
+        self.matrices = {}
+        self.statements = 0
+
+    def connect(self, **kwargs):
+        time.sleep(self.latency_seconds)
+        return FakeSnowflakeConnection(self)
+
+
+class FakeSnowflakeConnection:
+    def __init__(self, store):
+        self.store = store
+
+    def cursor(self):
+        return FakeSnowflakeCursor(self.store)
+
+    def close(self):
+        pass
+
+
+class FakeSnowflakeCursor:
+    """Understands the statements raci_core sends; anything else succeeds with no rows"""
+
+    def __init__(self, store):
+        self.store = store
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        time.sleep(self.store.latency_seconds)
+        statement = ' '.join(sql.split())
+        self.rows, self.rowcount = [], 0
+        with self.store.lock:
+            self.store.statements += 1
+            matrices = self.store.matrices
+            if statement.startswith('INSERT INTO raci_matrices'):
+                matrix_id, name, functions, stakeholders, raci_data, created_by, updated_by = params
+                now = time.strftime('%Y-%m-%d %H:%M:%S')
+                matrices[matrix_id] = {'name': name, 'functions': functions, 'stakeholders': stakeholders,
+                                       'raci_data': raci_data, 'created_by': created_by, 'updated_by': updated_by,
+                                       'created_at': now, 'updated_at': now, 'version': 1}
+                self.rowcount = 1
+            elif statement.startswith('UPDATE raci_matrices SET matrix_name'):
+                name, functions, stakeholders, raci_data, updated_by, matrix_id, version = params
+                row = matrices.get(matrix_id)
+                if row and row['version'] == version:
+                    row.update(name=name, functions=functions, stakeholders=stakeholders, raci_data=raci_data,
+                               updated_by=updated_by, updated_at=time.strftime('%Y-%m-%d %H:%M:%S'), version=version + 1)
+                    self.rowcount = 1
+            elif statement.startswith('DELETE FROM raci_matrices'):
+                row = matrices.get(params[0])
+                if row and (len(params) < 2 or row['version'] == params[1]):
+                    del matrices[params[0]]
+                    self.rowcount = 1
+            elif statement.startswith('SELECT matrix_id, matrix_name, created_at'):
+                self.rows = [(matrix_id, row['name'], row['created_at'], row['updated_at'], row['created_by'],
+                              row['version'], row['updated_by'])
+                             for matrix_id, row in sorted(matrices.items(), key=lambda item: item[1]['updated_at'], reverse=True)]
+            elif statement.startswith('SELECT matrix_name, functions'):
+                row = matrices.get(params[0])
+                if row:
+                    self.rows = [(row['name'], row['functions'], row['stakeholders'], row['raci_data'],
+                                  row['version'], row['updated_by'])]
+            elif statement.startswith('SELECT matrix_id, matrix_name, functions') and params:
+                self.rows = [(matrix_id, matrices[matrix_id]['name'], matrices[matrix_id]['functions'],
+                              matrices[matrix_id]['stakeholders'], matrices[matrix_id]['raci_data'])
+                             for matrix_id in params if matrix_id in matrices]
+            elif statement.startswith('SELECT COALESCE(version, 1), updated_at'):
+                row = matrices.get(params[0])
+                if row:
+                    self.rows = [(row['version'], row['updated_at'], row['updated_by'])]
+
+    def executemany(self, sql, rows):
+        time.sleep(self.store.latency_seconds)
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+def install_fake_snowflake(store):
+    """Make `import snowflake.connector` inside the app return the fake connector"""
+    connector = types.ModuleType('snowflake.connector')
+    connector.connect = store.connect
+    package = types.ModuleType('snowflake')
+    package.connector = connector
+    package.__path__ = []
+    sys.modules['snowflake'] = package
+    sys.modules['snowflake.connector'] = connector
+
+# ============================================================================
+# Workflow
+# ============================================================================
+
+def make_csv(n_functions, n_stakeholders, rng):
+    """A spreadsheet export with random roles and at most one A per function"""
+    stakeholders = [f"Stakeholder {j}" for j in range(n_stakeholders)]
+    lines = [',' + ','.join(stakeholders)]
+    for i in range(n_functions):
+        roles = [rng.choice(ROLE_LETTERS) for _ in stakeholders]
+        accountable = [j for j, role in enumerate(roles) if role == 'A']
+        for j in accountable[1:]:
+            roles[j] = 'C'
+        lines.append(f"Function {i}," + ','.join(roles))
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def button(at, label):
+    return next(b for b in at.button if b.label == label)
+
+
+class Session:
+    """One simulated user; every rerun is timed under the name of the step that caused it"""
+
+    def __init__(self, index, args, csv_bytes, timings):
+        from streamlit.testing.v1 import AppTest
+
+        self.index = index
+        self.args = args
+        self.csv_bytes = csv_bytes
+        self.timings = timings
+        self.rng = random.Random(args.seed + index)
+        self.errors = []
+        self.at = AppTest.from_file(args.app, default_timeout=args.timeout)
+        self.at.secrets['snowflake'] = {'account': 'load-test', 'user': 'load-test', 'password': 'load-test'}
+
+    def run(self, step, action=None):
+        # Users pause between interactions; without it every session would queue constantly
+        time.sleep(self.rng.uniform(0.5, 1.5) * self.args.think_seconds)
+        queued = time.perf_counter()
+        with RERUN_LOCK:
+            start = time.perf_counter()
+            if action is None:
+                self.at.run()
+            else:
+                action().run()
+            end = time.perf_counter()
+        self.timings.append((step, end - queued, end - start))
+        if self.at.exception:
+            self.errors.append(f"{step}: {self.at.exception[0].message}")
+        return self.at
+
+    def workflow(self):
+        at = self.run('open')
+        at.file_uploader[0].set_value(('team.csv', self.csv_bytes, 'text/csv'))
+        self.run('upload')
+        self.run('import', lambda: button(self.at, '🔄 Import Data').click())
+
+        stakeholders = list(self.at.session_state.stakeholders)
+        for _ in range(self.args.edits):
+            self.at.multiselect(key='bulk_assign_stakeholders').set_value(self.rng.sample(stakeholders, 2))
+            self.at.text_input(key='bulk_assign_pattern').input(f"function {self.rng.randrange(10)}")
+            self.at.selectbox(key='bulk_assign_role').set_value(self.rng.choice(['R', 'C', 'I']))
+            self.run('edit_cells', lambda: button(self.at, '🎯 Assign Role').click())
+
+        function_input = next(t for t in self.at.text_input if t.key and t.key.startswith('function_input_'))
+        function_input.input(f"Added function {self.index}-{uuid.uuid4().hex[:6]}")
+        self.run('add_function', lambda: button(self.at, '➕ Add Function').click())
+        function_select = next(m for m in self.at.multiselect if m.label == 'Select functions')
+        self.run('select_function', lambda: function_select.set_value([self.at.session_state.functions[0]]))
+        self.run('delete_function', lambda: self.at.button(key='functions_delete').click())
+
+        self.at.text_input(key='snowflake_matrix_name').input(f"Load test {self.index}")
+        self.run('save_snowflake', lambda: button(self.at, '💾 Save to Snowflake').click())
+        self.run('load_snowflake', lambda: button(self.at, '📥 Load Selected Matrix').click())
+
+def serialize_script_compilation():
+    """Compile the app script one session at a time.
+
+    Each AppTest compiles the script itself (the server compiles it once), and
+    concurrent ast.parse calls can fail on some CPython versions.
+    """
+    from streamlit.runtime.scriptrunner import magic
+
+    lock = threading.Lock()
+    add_magic = magic.add_magic
+
+    def locked_add_magic(*args, **kwargs):
+        with lock:
+            return add_magic(*args, **kwargs)
+
+    magic.add_magic = locked_add_magic
+
+# ============================================================================
+# Measurement
+# ============================================================================
+
+def rss_bytes():
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def summarize(timings):
+    """p50/p99/max latency (queueing included) and service time per step, in ms"""
+    rows = []
+    steps = list(dict.fromkeys(step for step, _, _ in timings))
+    for step in steps + ['ALL']:
+        selected = np.array([(latency, service) for name, latency, service in timings if step in ('ALL', name)]) * 1000
+        latency, service = selected[:, 0], selected[:, 1]
+        rows.append({'step': step, 'reruns': len(selected),
+                     'p50_ms': float(np.percentile(latency, 50)), 'p99_ms': float(np.percentile(latency, 99)),
+                     'max_ms': float(latency.max()),
+                     'service_p50_ms': float(np.percentile(service, 50)), 'service_p99_ms': float(np.percentile(service, 99))})
+    return rows
+
+
+def app_stage_totals(metrics_path):
+    """Total seconds per app stage across all reruns, from the app's RACI_METRICS_JSONL output"""
+    totals = {}
+    if not os.path.exists(metrics_path):
+        return totals
+    with open(metrics_path) as f:
+        for line in f:
+            for name, stage in json.loads(line).get('stages', {}).items():
+                totals[name] = totals.get(name, 0.0) + stage['seconds']
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sessions', type=int, default=10, help="Concurrent sessions")
+    parser.add_argument('--iterations', type=int, default=1, help="Workflow repetitions per session")
+    parser.add_argument('--functions', type=int, default=200, help="Functions in the imported spreadsheet")
+    parser.add_argument('--stakeholders', type=int, default=30, help="Stakeholders in the imported spreadsheet")
+    parser.add_argument('--edits', type=int, default=5, help="Bulk edits per workflow")
+    parser.add_argument('--think-seconds', type=float, default=0.5, help="Average pause before each interaction")
+    parser.add_argument('--snowflake-latency-ms', type=float, default=20.0, help="Simulated delay per Snowflake round trip")
+    parser.add_argument('--timeout', type=float, default=120.0, help="Seconds allowed per rerun")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--app', default=os.path.join(ROOT, 'raci_app.py'))
+    parser.add_argument('--json', help="Also write the report to this file")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    workdir = tempfile.mkdtemp(prefix='raci-load-')
+    metrics_path = os.path.join(workdir, 'metrics.jsonl')
+    # Keep autosaves and metrics out of the working tree; the app reads these when each session starts
+    os.environ.setdefault('RACI_SNAPSHOT_DIR', os.path.join(workdir, 'snapshots'))
+    os.environ['RACI_METRICS_JSONL'] = metrics_path
+
+    store = FakeSnowflakeStore(args.snowflake_latency_ms / 1000)
+    install_fake_snowflake(store)
+    serialize_script_compilation()
+    csv_bytes = make_csv(args.functions, args.stakeholders, random.Random(args.seed))
+
+    timings, errors = [], []
+    rss_before = rss_bytes()
+    cpu_before, wall_before = time.process_time(), time.perf_counter()
+    sessions = [Session(index, args, csv_bytes, timings) for index in range(args.sessions)]
+
+    def drive(session):
+        for _ in range(args.iterations):
+            try:
+                session.workflow()
+            except Exception as e:
+                session.errors.append(f"workflow: {type(e).__name__}: {e}")
+        return session.errors
+
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        for session_errors in executor.map(drive, sessions):
+            errors.extend(session_errors)
+
+    wall = time.perf_counter() - wall_before
+    cpu = time.process_time() - cpu_before
+    rss_after = rss_bytes()
+    report = {
+        'config': {key: value for key, value in vars(args).items() if key != 'json'},
+        'steps': summarize(timings) if timings else [],
+        'wall_seconds': wall,
+        'cpu_seconds': cpu,
+        'cpu_utilization': cpu / wall if wall else 0.0,
+        'rss_before_mb': rss_before / 2 ** 20,
+        'rss_after_mb': rss_after / 2 ** 20,
+        'memory_per_session_mb': (rss_after - rss_before) / 2 ** 20 / max(args.sessions, 1),
+        'snowflake_statements': store.statements,
+        'app_stage_seconds': app_stage_totals(metrics_path),
+        'errors': errors,
+    }
+    # Sessions stay referenced until here so their memory is counted above
+    del sessions
+
+    print(f"{args.sessions} sessions x {args.iterations} workflow(s), {args.functions} x {args.stakeholders} matrix, "
+          f"{args.snowflake_latency_ms:g} ms Snowflake latency")
+    print(f"{'':<18}{'':>8}{'latency':>30}{'service':>20}")
+    print(f"{'step':<18}{'reruns':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for row in report['steps']:
+        print(f"{row['step']:<18}{row['reruns']:>8}{row['p50_ms']:>10.1f}{row['p99_ms']:>10.1f}{row['max_ms']:>10.1f}"
+              f"{row['service_p50_ms']:>10.1f}{row['service_p99_ms']:>10.1f}")
+    print(f"\nwall {wall:.1f} s, CPU {cpu:.1f} s ({report['cpu_utilization']:.0%} of one core)")
+    print(f"RSS {report['rss_before_mb']:.0f} MB -> {report['rss_after_mb']:.0f} MB "
+          f"(~{report['memory_per_session_mb']:.1f} MB per session), {store.statements} Snowflake statements")
+    top_stages = list(report['app_stage_seconds'].items())[:8]
+    if top_stages:
+        print("slowest app stages (total s): " + ', '.join(f"{name} {seconds:.2f}" for name, seconds in top_stages))
+    if errors:
+        print(f"\n{len(errors)} error(s):")
+        for error in errors[:20]:
+            print(f"  {error}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()